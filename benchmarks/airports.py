@@ -0,0 +1,160 @@
+"""
+Parse time and peak memory of the OurAirports csv.
+
+A synthetic csv with the size of the OurAirports csv (~85k airports) is
+parsed by the former in-memory parsing (read, decode, StringIO, default
+engine, where) and by the streamed pyarrow parsing of parse_airport_csv.
+Each variant runs in its own process, so the peak RSS is its own.
+
+Run with `python -m benchmarks.airports [nr_of_airports]`, or parse a
+downloaded csv with `python -m benchmarks.airports airports.csv`.
+"""
+
+import csv
+import os
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import timeit
+from io import StringIO
+
+from ivao_tracker.model.constants import (
+    AirportType,
+    Continent,
+    airport_csv_dtypes,
+    pandas_na_values,
+)
+
+NR_OF_AIRPORTS = 85_000
+VARIANTS = ("legacy", "pyarrow")
+
+
+def write_synthetic_csv(path, n, seed=42):
+    rng = random.Random(seed)
+    countries = ["US", "DE", "FR", "BR", "AU", "CA", "GB", "RU", "JP", "ZA"]
+    with open(path, "w", newline="") as csv_file:
+        writer = csv.writer(csv_file, quoting=csv.QUOTE_NONNUMERIC)
+        writer.writerow(list(airport_csv_dtypes))
+        for i in range(n):
+            country = rng.choice(countries)
+            ident = "{:s}-{:04d}".format(country, i)
+            writer.writerow(
+                [
+                    i,
+                    ident,
+                    rng.choice(list(AirportType)).value,
+                    "Synthetic Airport {:d}".format(i),
+                    rng.uniform(-90, 90),
+                    rng.uniform(-180, 180),
+                    rng.choice([rng.randrange(-100, 10_000), ""]),
+                    rng.choice(list(Continent)).value,
+                    "Country " + country,
+                    country,
+                    "Region {:d}".format(i % 50),
+                    "{:s}-{:d}".format(country, i % 50),
+                    str(i % 50),
+                    rng.choice(["Municipality {:d}".format(i), ""]),
+                    rng.choice(["yes", "no"]),
+                    rng.choice([ident, ""]),
+                    rng.choice([ident, ""]),
+                    rng.choice(["ABC", ""]),
+                    rng.choice([ident, ""]),
+                    rng.choice(["https://example.com/" + ident, ""]),
+                    rng.choice(["https://en.wikipedia.org/wiki/" + ident, ""]),
+                    rng.choice(["Keyword {:d}, Other".format(i), ""]),
+                    rng.randrange(0, 1_000_000),
+                    "2024-01-{:02d}T12:00:00+00:00".format(i % 28 + 1),
+                ]
+            )
+
+
+def parse_legacy(path):
+    import pandas
+
+    # the former parse_airport_csv, with the download read from the file
+    with open(path, "rb") as response:
+        csv_data = response.read().decode("utf-8")
+    full_csv = pandas.read_csv(
+        StringIO(csv_data), keep_default_na=False, na_values=pandas_na_values
+    )
+    full_csv["scheduled_service"] = full_csv["scheduled_service"].astype(bool)
+    full_csv["last_updated"] = pandas.to_datetime(
+        full_csv["last_updated"], errors="coerce", utc=True
+    )
+    return full_csv.where(pandas.notna(full_csv), None)
+
+
+def parse_pyarrow(path):
+    from ivao_tracker.service.airport import read_airport_csv
+
+    with open(path, "rb") as response, tempfile.TemporaryFile() as csv_file:
+        shutil.copyfileobj(response, csv_file, 1 << 20)
+        csv_file.seek(0)
+        return read_airport_csv(csv_file)
+
+
+def max_rss_mb():
+    # ru_maxrss is in KB on linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_variant(variant, path):
+    # both variants start with the same modules imported
+    import pandas  # noqa: F401
+
+    import ivao_tracker.service.airport  # noqa: F401
+
+    parse = parse_legacy if variant == "legacy" else parse_pyarrow
+    baseline = max_rss_mb()
+    start = timeit.default_timer()
+    frame = parse(path)
+    seconds = timeit.default_timer() - start
+    print(
+        "{:<10s} {:>8.2f} s {:>10.0f} MB {:>10.0f} MB {:>10.0f} MB".format(
+            variant,
+            seconds,
+            max_rss_mb(),
+            max_rss_mb() - baseline,
+            frame.memory_usage(deep=True).sum() / 1024 / 1024,
+        ),
+        flush=True,
+    )
+
+
+def main():
+    if len(sys.argv) == 4 and sys.argv[1] == "--variant":
+        run_variant(sys.argv[2], sys.argv[3])
+        return
+
+    with tempfile.TemporaryDirectory() as directory:
+        if len(sys.argv) > 1 and not sys.argv[1].isdigit():
+            path = sys.argv[1]
+        else:
+            n = int(sys.argv[1]) if len(sys.argv) > 1 else NR_OF_AIRPORTS
+            path = os.path.join(directory, "airports.csv")
+            write_synthetic_csv(path, n)
+        print("{:s}: {:.1f} MB".format(path, os.path.getsize(path) / 1024**2))
+        print(
+            "{:<10s} {:>10s} {:>13s} {:>13s} {:>13s}".format(
+                "variant", "parse", "peak RSS", "parse RSS", "frame"
+            )
+        )
+        for variant in VARIANTS:
+            subprocess.run(
+                [
+                    sys.executable,
+                    "-m",
+                    "benchmarks.airports",
+                    "--variant",
+                    variant,
+                    path,
+                ],
+                check=True,
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Benchmark of the FIR lookup of 5k pilots against the in-process part of the
+import (conversion of the pilots to the SQL models), which is a lower bound
+of the whole import cycle.
+
+Run with `python -m benchmarks.fir`.
+"""
+
+import timeit
+
+import msgspec
+import numpy
+import shapely
+
+from benchmarks.spatial import synthetic_positions
+from ivao_tracker.model.json import JsonSnapshot
+from ivao_tracker.service.fir import FirLocator
+from ivao_tracker.util.model import json2sqlPilotSession
+
+NR_OF_PILOTS = 5_000
+NR_OF_FIRS = 400
+NR_OF_SECTORS = 200
+
+
+def synthetic_firs(seed=42):
+    # voronoi cells cover the world like FIRs, boxes nested in them are
+    # the sectors
+    rng = numpy.random.default_rng(seed)
+    world = shapely.box(-180, -90, 180, 90)
+    centers = shapely.multipoints(
+        numpy.column_stack(
+            (
+                rng.uniform(-180, 180, NR_OF_FIRS),
+                rng.uniform(-90, 90, NR_OF_FIRS),
+            )
+        )
+    )
+    cells = shapely.get_parts(
+        shapely.voronoi_polygons(centers, extend_to=world)
+    )
+    cells = shapely.intersection(cells, world)
+    lons = rng.uniform(-175, 175, NR_OF_SECTORS)
+    lats = rng.uniform(-85, 85, NR_OF_SECTORS)
+    sectors = shapely.box(lons - 2, lats - 2, lons + 2, lats + 2)
+    geometries = numpy.concatenate([cells, sectors])
+    ids = numpy.arange(1, len(geometries) + 1)
+    return ids, [f"F{i:04d}" for i in ids], geometries
+
+
+def synthetic_pilots(n):
+    with open("tests/mock_data/snapshot.json", "rb") as snapshot_json:
+        template = msgspec.json.decode(
+            snapshot_json.read(), type=JsonSnapshot
+        ).clients.pilots[0]
+    _, lats, lons = synthetic_positions(n)
+    return [
+        msgspec.structs.replace(
+            template,
+            id=i,
+            lastTrack=msgspec.structs.replace(
+                template.lastTrack, latitude=lat, longitude=lon
+            ),
+        )
+        for i, lat, lon in zip(range(n), lats.tolist(), lons.tolist())
+    ]
+
+
+def bench(statement, number):
+    return min(timeit.repeat(statement, number=number, repeat=5)) / number
+
+
+def main():
+    locator = FirLocator(*synthetic_firs())
+    pilots = synthetic_pilots(NR_OF_PILOTS)
+
+    convert = bench(lambda: [json2sqlPilotSession(p) for p in pilots], 3)
+    locate = bench(lambda: locator.locate_pilots(pilots), 20)
+
+    print(f"{NR_OF_PILOTS} pilots, {len(locator)} FIRs/sectors")
+    print("{:<40s} {:>10.2f} ms".format("convert pilots", convert * 1000))
+    print("{:<40s} {:>10.2f} ms".format("locate FIRs", locate * 1000))
+    print("{:<40s} {:>10.1f} %".format("overhead", locate / convert * 100))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Latency of the point-in-time position lookups on the configured database.
+
+Picks sessions with tracks in the latest pilottrack partition and times
+single lookups as well as batched lookups of up to 1000 sessions at random
+times within the partition.
+
+Run with `python -m benchmarks.history [repeat]` (default: 50).
+"""
+
+import random
+import statistics
+import sys
+import timeit
+from datetime import timedelta
+
+from sqlmodel import Session, text
+
+from ivao_tracker.service.history import position_at, positions_at
+from ivao_tracker.service.sql import get_engine
+
+SAMPLE_QUERY = """
+SELECT "pilotSessionId", min("timestamp"), max("timestamp")
+FROM pilottrack
+WHERE "timestamp" >= (SELECT max("timestamp") FROM pilottrack)
+    - interval '6 hours'
+GROUP BY "pilotSessionId"
+LIMIT 1000
+"""
+
+
+def median_ms(samples) -> float:
+    return statistics.median(samples) * 1000
+
+
+def main():
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    rng = random.Random(42)
+    with Session(get_engine()) as session:
+        sessions = session.exec(text(SAMPLE_QUERY)).all()  # type: ignore
+    if not sessions:
+        print("No tracks found")
+        return
+    print("{:d} sessions".format(len(sessions)))
+
+    def random_time(first, last):
+        return first + timedelta(
+            seconds=rng.uniform(0, (last - first).total_seconds())
+        )
+
+    single = []
+    for _ in range(repeat):
+        session_id, first, last = rng.choice(sessions)
+        time = random_time(first, last)
+        start = timeit.default_timer()
+        position_at(session_id, time)
+        single.append(timeit.default_timer() - start)
+    print("single {:>8.2f} ms".format(median_ms(single)))
+
+    ids = [s[0] for s in sessions]
+    first = max(s[1] for s in sessions)
+    last = min(s[2] for s in sessions)
+    if first > last:
+        first, last = last, first
+    for size in [10, 100, len(ids)]:
+        batch = []
+        for _ in range(max(1, repeat // 5)):
+            time = random_time(first, last)
+            start = timeit.default_timer()
+            positions_at(rng.sample(ids, size), time)
+            batch.append(timeit.default_timer() - start)
+        print(
+            "batch {:>5d} {:>8.2f} ms {:>8.3f} ms/session".format(
+                size, median_ms(batch), median_ms(batch) / size
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,271 @@
+"""
+Read/write benchmark of the index profiles of pilottrack and pilotsession.
+
+For each profile, scratch copies of the tables (`bench_pilottrack` with a
+sealed and a current partition and `bench_pilotsession`) get the indexes of
+the profile. Synthetic tracks are inserted in snapshot sized batches (the
+write throughput is measured on the current partition) and the typical
+queries are timed:
+
+- track: the positions of one session ordered by time
+- window: the positions of a 10 minute window
+- active: the ids of the active sessions
+- bbox: the positions in a 10x10 degree box in the sealed partition
+
+Needs the configured database, the scratch tables are dropped afterwards.
+Run with `python -m benchmarks.indexes [nr_of_snapshots]` (default: 100).
+"""
+
+import random
+import statistics
+import sys
+import timeit
+from datetime import datetime, timedelta
+
+from sqlalchemy import text
+
+from ivao_tracker.service.indexes import (
+    INDEXES,
+    create_index_sql,
+    profile_indexes,
+)
+from ivao_tracker.service.sql import get_engine
+
+NR_OF_SESSIONS = 10_000
+NR_OF_PILOTS = 2_000
+ACTIVE_RATIO = 0.1
+START = datetime(2024, 2, 10)
+SEALED_END = START + timedelta(hours=12)
+SNAPSHOT_INTERVAL = timedelta(seconds=15)
+
+PROFILES = [
+    ("legacy", "all"),
+    ("lean", "all"),
+    ("lean", "sealed"),
+    ("lean", "none"),
+]
+
+INSERT_TRACK = text(
+    """
+    INSERT INTO bench_pilottrack
+        ("timestamp", "pilotSessionId", altitude, heading, geometry)
+    VALUES
+        (:timestamp, :session, :altitude, :heading,
+         ST_SetSRID(ST_MakePoint(:lon, :lat), 4326))
+    """
+)
+
+QUERIES = {
+    "track": (
+        'SELECT "timestamp", geometry FROM bench_pilottrack '
+        'WHERE "pilotSessionId" = :session ORDER BY "timestamp"'
+    ),
+    "window": (
+        "SELECT count(*) FROM bench_pilottrack "
+        'WHERE "timestamp" >= :start AND "timestamp" < :end'
+    ),
+    "active": 'SELECT id FROM bench_pilotsession WHERE "isActive"',
+    "bbox": (
+        "SELECT count(*) FROM bench_pilottrack "
+        "WHERE geometry && ST_MakeEnvelope(:lon, :lat, :lon + 10, :lat + 10, "
+        '4326) AND "timestamp" < :sealed_end'
+    ),
+}
+
+
+def create_tables(connection):
+    drop_tables(connection)
+    connection.execute(
+        text(
+            """
+            CREATE TABLE bench_pilotsession (
+                id integer PRIMARY KEY,
+                "isActive" boolean NOT NULL,
+                callsign varchar NOT NULL,
+                "createdAt" timestamp NOT NULL
+            )
+            """
+        )
+    )
+    connection.execute(
+        text(
+            """
+            CREATE TABLE bench_pilottrack (
+                id serial,
+                "timestamp" timestamp NOT NULL,
+                "pilotSessionId" integer NOT NULL,
+                altitude integer,
+                heading smallint,
+                geometry geometry(POINT, 4326),
+                PRIMARY KEY (id, "timestamp")
+            ) PARTITION BY RANGE ("timestamp")
+            """
+        )
+    )
+    for name, start, end in [
+        ("sealed", START, SEALED_END),
+        ("current", SEALED_END, SEALED_END + timedelta(days=1)),
+    ]:
+        connection.execute(
+            text(
+                "CREATE TABLE bench_pilottrack_{:s} PARTITION OF "
+                "bench_pilottrack FOR VALUES FROM ('{}') TO ('{}')".format(
+                    name, start, end
+                )
+            )
+        )
+    connection.execute(
+        text(
+            "INSERT INTO bench_pilotsession "
+            "SELECT i, random() < :ratio, 'CS' || i, "
+            ":start + i * interval '1 second' "
+            "FROM generate_series(1, :n) i"
+        ),
+        {"ratio": ACTIVE_RATIO, "n": NR_OF_SESSIONS, "start": START},
+    )
+
+
+def drop_tables(connection):
+    connection.execute(text("DROP TABLE IF EXISTS bench_pilottrack"))
+    connection.execute(text("DROP TABLE IF EXISTS bench_pilotsession"))
+
+
+def create_indexes(connection, profile, gist):
+    for name in profile_indexes(profile, gist):
+        spec = INDEXES[name]
+        connection.execute(
+            text(
+                create_index_sql(
+                    "bench_" + name, "bench_" + spec.table, spec.definition
+                )
+            )
+        )
+
+
+def synthetic_snapshots(start, nr_of_snapshots, rng):
+    """
+    Yields the track rows of the snapshots, the pilots move slowly.
+    """
+    sessions = rng.sample(range(1, NR_OF_SESSIONS + 1), NR_OF_PILOTS)
+    positions = [
+        (rng.uniform(-180, 170), rng.uniform(-80, 70)) for _ in sessions
+    ]
+    for i in range(nr_of_snapshots):
+        timestamp = start + i * SNAPSHOT_INTERVAL
+        yield [
+            {
+                "timestamp": timestamp,
+                "session": session,
+                "altitude": rng.randrange(0, 40_000),
+                "heading": rng.randrange(0, 360),
+                "lon": lon + i * 0.01,
+                "lat": lat,
+            }
+            for session, (lon, lat) in zip(sessions, positions)
+        ]
+
+
+def insert_snapshots(engine, start, nr_of_snapshots, rng) -> float:
+    """
+    Inserts the snapshots, one transaction each. Returns the rows/s.
+    """
+    rows = 0
+    seconds = 0.0
+    for snapshot in synthetic_snapshots(start, nr_of_snapshots, rng):
+        begin = timeit.default_timer()
+        with engine.begin() as connection:
+            connection.execute(INSERT_TRACK, snapshot)
+        seconds += timeit.default_timer() - begin
+        rows += len(snapshot)
+    return rows / seconds
+
+
+def query_latencies(engine, rng, repeat=20) -> dict[str, float]:
+    """
+    Returns the median latency of each query in milliseconds.
+    """
+    latencies = {}
+    with engine.connect() as connection:
+        for name, query in QUERIES.items():
+            samples = []
+            for _ in range(repeat):
+                window_start = SEALED_END + rng.randrange(60) * timedelta(
+                    minutes=1
+                )
+                params = {
+                    "session": rng.randrange(1, NR_OF_SESSIONS + 1),
+                    "start": window_start,
+                    "end": window_start + timedelta(minutes=10),
+                    "lon": rng.uniform(-180, 160),
+                    "lat": rng.uniform(-80, 60),
+                    "sealed_end": SEALED_END,
+                }
+                begin = timeit.default_timer()
+                connection.execute(text(query), params).all()
+                samples.append(timeit.default_timer() - begin)
+            latencies[name] = statistics.median(samples) * 1000
+    return latencies
+
+
+def run(engine, profile, gist, nr_of_snapshots):
+    rng = random.Random(42)
+    with engine.begin() as connection:
+        create_tables(connection)
+        create_indexes(connection, profile, gist)
+
+    # the sealed partition is filled before the measured writes
+    insert_snapshots(engine, START, nr_of_snapshots, rng)
+    seal_seconds = 0.0
+    if gist == "sealed":
+        begin = timeit.default_timer()
+        with engine.begin() as connection:
+            connection.execute(
+                text(
+                    create_index_sql(
+                        "bench_pilottrack_sealed_geometry_idx",
+                        "bench_pilottrack_sealed",
+                        "USING gist (geometry)",
+                    )
+                )
+            )
+        seal_seconds = timeit.default_timer() - begin
+
+    rows_per_second = insert_snapshots(
+        engine, SEALED_END, nr_of_snapshots, rng
+    )
+    with engine.begin() as connection:
+        connection.execute(text("ANALYZE bench_pilottrack"))
+        connection.execute(text("ANALYZE bench_pilotsession"))
+    latencies = query_latencies(engine, rng)
+
+    with engine.begin() as connection:
+        drop_tables(connection)
+    return rows_per_second, seal_seconds, latencies
+
+
+def main():
+    nr_of_snapshots = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    print(
+        "{:d} snapshots of {:d} pilots per partition".format(
+            nr_of_snapshots, NR_OF_PILOTS
+        )
+    )
+    engine = get_engine()
+    print(
+        "{:<16s} {:>10s} {:>8s} ".format("profile", "rows/s", "seal s")
+        + " ".join("{:>9s}".format(name + " ms") for name in QUERIES)
+    )
+    for profile, gist in PROFILES:
+        rows_per_second, seal_seconds, latencies = run(
+            engine, profile, gist, nr_of_snapshots
+        )
+        print(
+            "{:<16s} {:>10.0f} {:>8.2f} ".format(
+                profile + "/" + gist, rows_per_second, seal_seconds
+            )
+            + " ".join("{:>9.2f}".format(latencies[name]) for name in QUERIES)
+        )
+
+
+if __name__ == "__main__":
+    main()
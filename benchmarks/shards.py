@@ -0,0 +1,61 @@
+"""
+Benchmark of the sharded import over 10k synthetic pilots.
+
+The shard workers decode their msgpack payload and convert the pilots to
+the SQL models, which is the CPU bound part of the reconciliation. The
+database is not involved.
+
+Run with `python -m benchmarks.shards [max_shards]` (default: CPU count).
+"""
+
+import os
+import sys
+import timeit
+
+from msgspec import msgpack
+
+from benchmarks.fir import synthetic_pilots
+from ivao_tracker.model.json import JsonPilot
+from ivao_tracker.service.shards import ShardedImporter
+from ivao_tracker.util.model import json2sqlPilotSession
+
+NR_OF_PILOTS = 10_000
+
+
+def convert_shard(payload: bytes) -> int:
+    pilots = msgpack.decode(payload, type=list[JsonPilot])
+    return len([json2sqlPilotSession(p) for p in pilots])
+
+
+def run(importer, pilots):
+    encoder = msgpack.Encoder()
+    jobs = [encoder.encode(shard) for shard in importer.split(pilots)]
+    return sum(importer.map(convert_shard, jobs))
+
+
+def main():
+    pilots = synthetic_pilots(NR_OF_PILOTS)
+    print(f"{NR_OF_PILOTS} pilots")
+
+    max_shards = int(sys.argv[1]) if len(sys.argv) > 1 else os.cpu_count()
+    baseline = None
+    nr_of_shards = 1
+    while nr_of_shards <= (max_shards or 1):
+        importer = ShardedImporter(nr_of_shards)
+        # warm up the worker processes
+        run(importer, pilots[:100])
+        seconds = min(
+            timeit.repeat(lambda: run(importer, pilots), number=1, repeat=3)
+        )
+        importer.shutdown()
+        baseline = baseline or seconds
+        print(
+            "{:>2d} shards {:>10.0f} pilots/s {:>6.2f}x".format(
+                nr_of_shards, NR_OF_PILOTS / seconds, baseline / seconds
+            )
+        )
+        nr_of_shards *= 2
+
+
+if __name__ == "__main__":
+    main()
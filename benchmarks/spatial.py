@@ -0,0 +1,57 @@
+"""
+Benchmark of the grid index over 10k synthetic aircraft.
+
+Run with `python -m benchmarks.spatial`.
+"""
+
+import timeit
+
+import numpy
+
+from ivao_tracker.util.spatial import GridIndex
+
+NR_OF_AIRCRAFT = 10_000
+
+
+def synthetic_positions(n, seed=42):
+    # most traffic is clustered around a few hubs, the rest is en route
+    rng = numpy.random.default_rng(seed)
+    hubs = numpy.array(
+        [[50.0, 8.6], [51.5, -0.5], [40.6, -73.8], [25.3, 55.4], [1.4, 104]]
+    )
+    clustered = n * 2 // 3
+    hub = hubs[rng.integers(0, len(hubs), clustered)]
+    lats = numpy.concatenate(
+        [hub[:, 0] + rng.normal(0, 3, clustered), rng.uniform(-60, 70, n)]
+    )[:n]
+    lons = numpy.concatenate(
+        [hub[:, 1] + rng.normal(0, 5, clustered), rng.uniform(-180, 180, n)]
+    )[:n]
+    return numpy.arange(n), numpy.clip(lats, -89.9, 89.9), lons
+
+
+def bench(name, statement, number):
+    seconds = min(timeit.repeat(statement, number=number, repeat=5)) / number
+    print("{:<40s} {:>10.1f} µs".format(name, seconds * 1_000_000))
+
+
+def main():
+    ids, lats, lons = synthetic_positions(NR_OF_AIRCRAFT)
+    index = GridIndex(ids, lats, lons)
+
+    print(f"{NR_OF_AIRCRAFT} aircraft")
+    bench("build", lambda: GridIndex(ids, lats, lons), 20)
+    bench("bbox (central Europe)", lambda: index.bbox(5, 45, 15, 55), 2000)
+    bench("bbox (world)", lambda: index.bbox(-180, -90, 180, 90), 200)
+    bench("radius 50nm (EDDF)", lambda: index.radius(50.03, 8.56, 50), 2000)
+    bench("radius 250nm (EDDF)", lambda: index.radius(50.03, 8.56, 250), 2000)
+    bench("nearest k=1 (EDDF)", lambda: index.nearest(50.03, 8.56, 1), 2000)
+    bench(
+        "nearest k=10 (mid-atlantic)",
+        lambda: index.nearest(45.0, -30.0, 10),
+        2000,
+    )
+
+
+if __name__ == "__main__":
+    main()
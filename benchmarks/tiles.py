@@ -0,0 +1,100 @@
+"""
+Benchmark of the live vector tiles over 10k synthetic aircraft.
+
+Renders the tiles of a viewport over central Europe at a few zoom levels,
+uncached and then from the tile cache.
+
+Run with `python -m benchmarks.tiles`.
+"""
+
+import math
+import timeit
+from datetime import UTC, datetime
+
+from benchmarks.spatial import NR_OF_AIRCRAFT, synthetic_positions
+from ivao_tracker.service.http import Request
+from ivao_tracker.service.live import LivePilot, LiveTraffic, live_state
+from ivao_tracker.service.tiles import (
+    get_tile_cache,
+    live_tile,
+    tiles_endpoint,
+)
+
+# lon/lat of the viewport
+VIEWPORT = (0.0, 45.0, 20.0, 55.0)
+
+
+def synthetic_traffic(n) -> LiveTraffic:
+    ids, lats, lons = synthetic_positions(n)
+    return LiveTraffic(
+        updatedAt=datetime.now(UTC),
+        pilots=[
+            LivePilot(
+                id=int(i),
+                userId=int(i),
+                callsign="CS{:d}".format(i),
+                latitude=float(lat),
+                longitude=float(lon),
+                altitude=35000,
+                groundSpeed=450,
+                heading=int(i) % 360,
+                onGround=False,
+                state="En Route",
+                transponder=2000,
+                timestamp=None,
+                aircraftId="A320",
+                departureId=None,
+                arrivalId=None,
+            )
+            for i, lat, lon in zip(ids, lats, lons)
+        ],
+        atcs=[],
+    )
+
+
+def viewport_tiles(z):
+    n = 2**z
+    min_lon, min_lat, max_lon, max_lat = VIEWPORT
+
+    def tile_y(lat):
+        lat = math.radians(lat)
+        return int((1 - math.asinh(math.tan(lat)) / math.pi) / 2 * n)
+
+    return [
+        (z, x, y)
+        for x in range(
+            int((min_lon + 180) / 360 * n), int((max_lon + 180) / 360 * n) + 1
+        )
+        for y in range(tile_y(max_lat), tile_y(min_lat) + 1)
+    ]
+
+
+def bench(name, statement, number):
+    seconds = min(timeit.repeat(statement, number=number, repeat=5)) / number
+    print("{:<40s} {:>10.2f} ms".format(name, seconds * 1000))
+
+
+def main():
+    live_state.replace(synthetic_traffic(NR_OF_AIRCRAFT))
+    print(f"{NR_OF_AIRCRAFT} aircraft")
+    for z in (0, 3, 5, 7):
+        tiles = viewport_tiles(z)
+        requests = [
+            Request("/tiles/live/{:d}/{:d}/{:d}.mvt".format(*t), {}, {})
+            for t in tiles
+        ]
+        bench(
+            "z{:d} viewport ({:d} tiles) uncached".format(z, len(tiles)),
+            lambda: [live_tile(*t) for t in tiles],
+            5,
+        )
+        get_tile_cache().invalidate(())
+        bench(
+            "z{:d} viewport ({:d} tiles) cached".format(z, len(tiles)),
+            lambda: [tiles_endpoint(r) for r in requests],
+            20,
+        )
+
+
+if __name__ == "__main__":
+    main()
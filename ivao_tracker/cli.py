@@ -1,40 +1,242 @@
 """
 CLI interface for ivao_tracker project.
+
+The services are imported by the commands, so `--help` and the parsing of
+the arguments do not load pandas, the ORM or the configuration.
 """
 
+import argparse
 import logging
+from datetime import datetime
 
 from ivao_tracker.config.loader import config
 from ivao_tracker.config.logging import setup_logging
-from ivao_tracker.core import (
-    import_ivao_snapshot,
-    scheduled_sync_airports,
-    sync_airports,
-    track_snapshots,
-)
-from ivao_tracker.service.sql import create_schema
-
-setup_logging()
+from ivao_tracker.service.context import AppContext, use_context
+
 logger = logging.getLogger(__name__)
 
 
-def main():
+def add_time_range_arguments(parser):
+    parser.add_argument(
+        "--start",
+        type=datetime.fromisoformat,
+        default=datetime(1970, 1, 1),
+        help="ISO timestamp (UTC) to start from",
+    )
+    parser.add_argument(
+        "--end",
+        type=datetime.fromisoformat,
+        default=datetime(9999, 1, 1),
+        help="ISO timestamp (UTC) to end at (exclusive)",
+    )
+
+
+def main(argv=None):
     """
     The main function executes on commands:
     `python -m ivao_tracker` and `$ ivao_tracker `.
 
     This is the program's entry point.
     """
+    parser = argparse.ArgumentParser(prog="ivao_tracker")
+    parser.add_argument(
+        "--config",
+        default="config.toml",
+        help="path of the configuration file (default: %(default)s)",
+    )
+    subparsers = parser.add_subparsers(dest="command")
+
+    subparsers.add_parser(
+        "run",
+        help="sync the airports and import the snapshots on schedule "
+        "(default)",
+    )
+    subparsers.add_parser(
+        "import-once",
+        help="import the current whazzup snapshot and exit",
+    )
+    subparsers.add_parser(
+        "sync-airports",
+        help="sync the airports from ourairports.com and exit",
+    )
+    subparsers.add_parser(
+        "create-schema",
+        help="create the database schema, apply the index profile, "
+        "index the sealed partitions and exit",
+    )
+
+    replay_parser = subparsers.add_parser(
+        "replay",
+        help="import archived whazzup snapshots as fast as possible",
+    )
+    replay_parser.add_argument(
+        "source",
+        help="a whazzup json file, a directory of whazzup json files "
+        "or a snapshot archive directory",
+    )
+    replay_parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="number of decoding processes (default: number of cpus)",
+    )
+    replay_parser.add_argument(
+        "--checkpoint",
+        default="replay.checkpoint",
+        help="file to resume the replay from (default: %(default)s)",
+    )
+
+    backfill_parser = subparsers.add_parser(
+        "backfill-traffic",
+        help="recompute the hourly airport traffic from the pilot sessions",
+    )
+    add_time_range_arguments(backfill_parser)
+
+    airports_parser = subparsers.add_parser(
+        "backfill-airports",
+        help="resolve the actual departure and arrival airports of sessions",
+    )
+    add_time_range_arguments(airports_parser)
+
+    args = parser.parse_args(argv)
+
+    setup_logging()
+    config.load(args.config)
+    # the resources of the command are created in the context on first use
+    context = use_context(AppContext())
+    if args.command in (None, "run"):
+        # the scheduled tasks keep using the context after run returns, it
+        # lives as long as the process
+        run()
+        return
+    try:
+        run_command(args)
+    finally:
+        # the one-shot commands are done with their resources
+        context.close()
+
+
+def run_command(args):
+    if args.command == "import-once":
+        import_once()
+    elif args.command == "sync-airports":
+        sync_airports_once()
+    elif args.command == "create-schema":
+        from ivao_tracker.service.sql import (
+            create_schema,
+            seal_pilottrack_partitions,
+        )
+
+        create_schema(apply_indexes=True)
+        seal_pilottrack_partitions()
+    elif args.command == "replay":
+        replay_snapshots(args)
+    elif args.command == "backfill-traffic":
+        from ivao_tracker.service.sql import create_schema
+        from ivao_tracker.service.traffic import backfill_airport_traffic
+
+        create_schema()
+        backfill_airport_traffic(args.start, args.end)
+    elif args.command == "backfill-airports":
+        from ivao_tracker.service.locator import backfill_actual_airports
+        from ivao_tracker.service.sql import create_schema
+
+        create_schema()
+        backfill_actual_airports(args.start, args.end)
+
+
+def run():
+    from ivao_tracker.core import (
+        import_ivao_snapshot,
+        scheduled_seal_partitions,
+        scheduled_sync_airports,
+        sync_airports,
+        track_snapshots,
+    )
+    from ivao_tracker.service.airport import refresh_airport_caches
+    from ivao_tracker.service.fir import build_fir_locator
+    from ivao_tracker.service.geofence import build_geofence
+    from ivao_tracker.service.http import start_http_server
+    from ivao_tracker.service.ivao import follow_ivao_snapshot, warm_restart
+    from ivao_tracker.service.leader import lead_or_follow
+    from ivao_tracker.service.locator import build_airport_locator
+    from ivao_tracker.service.sql import (
+        create_schema,
+        seal_pilottrack_partitions,
+    )
+
     create_schema()
+    # the airport sync rebuilds them, but it may be skipped or fail
+    build_airport_locator()
+    build_geofence()
+    build_fir_locator()
+    warm_restart()
+    start_http_server()
 
     airports_interval = config.config["airports"]["interval"]
     snapshot_interval = config.config["ivao"]["interval"]
+    # replicas only sync and import while they hold the task's lock
+    sync_task = lead_or_follow(
+        "airport-sync", sync_airports, refresh_airport_caches
+    )
+    import_task = lead_or_follow(
+        "importer", import_ivao_snapshot, follow_ivao_snapshot
+    )
+
     # sync once
-    sync_airports()
+    sync_task()
     # and then scheduled
-    scheduled_sync_airports(airports_interval)
+    scheduled_sync_airports(airports_interval, sync_task)
+
+    index_cfg = config.config.get("indexes", {})
+    if index_cfg.get("gist", "all") == "sealed":
+        seal_task = lead_or_follow(
+            "partition-seal", seal_pilottrack_partitions, lambda: 0
+        )
+        scheduled_seal_partitions(
+            index_cfg.get("seal_interval", 600), seal_task
+        )
 
     # start the import once
-    import_ivao_snapshot()
+    import_task()
     # and then scheduled
-    track_snapshots(snapshot_interval)
+    track_snapshots(snapshot_interval, import_task)
+
+
+def import_once():
+    from ivao_tracker.core import import_ivao_snapshot
+    from ivao_tracker.service.fir import build_fir_locator
+    from ivao_tracker.service.geofence import build_geofence
+    from ivao_tracker.service.ivao import warm_restart
+    from ivao_tracker.service.locator import build_airport_locator
+    from ivao_tracker.service.sql import create_schema
+
+    create_schema()
+    build_airport_locator()
+    build_geofence()
+    build_fir_locator()
+    warm_restart()
+    import_ivao_snapshot()
+
+
+def sync_airports_once():
+    from ivao_tracker.core import sync_airports
+    from ivao_tracker.service.sql import create_schema
+
+    create_schema()
+    sync_airports()
+
+
+def replay_snapshots(args):
+    from ivao_tracker.service.fir import build_fir_locator
+    from ivao_tracker.service.geofence import build_geofence
+    from ivao_tracker.service.locator import build_airport_locator
+    from ivao_tracker.service.replay import replay
+    from ivao_tracker.service.sql import create_schema
+
+    create_schema()
+    build_airport_locator()
+    build_geofence()
+    build_fir_locator()
+    if not replay(args.source, args.workers, args.checkpoint):
+        raise SystemExit(1)
@@ -1,17 +1,32 @@
 import logging
 import tomllib
 
-from ivao_tracker.config.logging import setup_logging
-
-setup_logging()
 logger = logging.getLogger(__name__)
 
 
 class _Config:
-    def __init__(self):
+    """
+    The configuration, which is read from `path` on first access unless
+    load has been called before.
+    """
+
+    def __init__(self, path="config.toml"):
+        self.path = path
+        self._config = None
+
+    def load(self, path=None):
+        if path is not None:
+            self.path = path
         logger.info("Loading config")
-        with open("config.toml", mode="rb") as cfg:
-            self.config = tomllib.load(cfg)
+        with open(self.path, mode="rb") as cfg:
+            self._config = tomllib.load(cfg)
+        return self._config
+
+    @property
+    def config(self) -> dict:
+        if self._config is None:
+            return self.load()
+        return self._config
 
     def __getattr__(self, name):
         try:
@@ -9,11 +9,12 @@ import threading
 import time
 import traceback
 
-from ivao_tracker.config.logging import setup_logging
+from ivao_tracker.config.loader import config
+from ivao_tracker.service import metrics
 from ivao_tracker.service.airport import sync_airports
 from ivao_tracker.service.ivao import import_ivao_snapshot
+from ivao_tracker.util.cadence import CadenceEstimator
 
-setup_logging()
 logger = logging.getLogger(__name__)
 
 
@@ -29,23 +30,70 @@ def every(delay, task):
             traceback.print_exc()
             logger.exception("Problem while executing repetitive task.")
             # skip tasks if we are behind schedule:
-        next_time += (time.time() - next_time) // delay * delay + delay
+        missed = (time.time() - next_time) // delay
+        if missed > 0:
+            metrics.missed_ticks.inc(missed, task=task.__name__)
+        next_time += missed * delay + delay
 
 
-def track_snapshots(interval):
+def adaptive_every(estimator, task):
+    """
+    Runs the task whenever the estimator expects a new upstream update.
+    The task has to return the updatedAt value of the fetched snapshot.
+    """
+    while True:
+        time.sleep(max(0, estimator.next_fetch(time.time()) - time.time()))
+        updated_at = None
+        try:
+            updated_at = task()
+        except Exception:
+            traceback.print_exc()
+            logger.exception("Problem while executing adaptive task.")
+        fetched_at = time.time()
+        estimator.observe(
+            updated_at.timestamp() if updated_at else None, fetched_at
+        )
+        metrics.upstream_period.set(estimator.period())
+
+
+def track_snapshots(interval, task=import_ivao_snapshot):
+    ivao_cfg = config.config["ivao"]
+    if ivao_cfg.get("adaptive", False):
+        logger.info(
+            "Starting to import IVAO snapshots adaptively "
+            "(initial period {:d} seconds)".format(interval)
+        )
+        estimator = CadenceEstimator(
+            interval,
+            publish_delay=ivao_cfg.get("publish_delay", 1.0),
+            jitter=ivao_cfg.get("jitter", 0.5),
+            backoff=ivao_cfg.get("backoff", 1.0),
+        )
+        threading.Thread(
+            target=lambda: adaptive_every(estimator, task)
+        ).start()
+        return
+
     logger.info(
         "Starting to import a IVAO snapshot every {:d} seconds".format(
             interval
         )
     )
-    threading.Thread(
-        target=lambda: every(interval, import_ivao_snapshot)
-    ).start()
+    threading.Thread(target=lambda: every(interval, task)).start()
 
 
-def scheduled_sync_airports(interval):
+def scheduled_sync_airports(interval, task=sync_airports):
     interval_minutes = round(interval / 60)
     logger.info(
         "Starting to sync airports every {:d} minutes".format(interval_minutes)
     )
-    threading.Thread(target=lambda: every(interval, sync_airports)).start()
+    threading.Thread(target=lambda: every(interval, task)).start()
+
+
+def scheduled_seal_partitions(interval, task):
+    logger.info(
+        "Starting to seal partitions every {:d} minutes".format(
+            round(interval / 60)
+        )
+    )
+    threading.Thread(target=lambda: every(interval, task)).start()
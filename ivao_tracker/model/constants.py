@@ -82,6 +82,36 @@ pandas_na_values = [
     "",
 ]
 
+# the columns of the OurAirports csv that are imported, the low cardinality
+# columns are categorical
+airport_csv_dtypes = {
+    "id": "int64",
+    "ident": "string[pyarrow]",
+    "type": "category",
+    "name": "string[pyarrow]",
+    "latitude_deg": "float64",
+    "longitude_deg": "float64",
+    "elevation_ft": "Int32",
+    "continent": "category",
+    "country_name": "string[pyarrow]",
+    "iso_country": "category",
+    "region_name": "string[pyarrow]",
+    "iso_region": "string[pyarrow]",
+    "local_region": "string[pyarrow]",
+    "municipality": "string[pyarrow]",
+    "scheduled_service": "boolean",
+    "gps_code": "string[pyarrow]",
+    "icao_code": "string[pyarrow]",
+    "iata_code": "string[pyarrow]",
+    "local_code": "string[pyarrow]",
+    "home_link": "string[pyarrow]",
+    "wikipedia_link": "string[pyarrow]",
+    "keywords": "string[pyarrow]",
+    "score": "Int64",
+    # parsed as timestamp by pyarrow
+    "last_updated": None,
+}
+
 
 airport_fix_map = {
     "EG22": "GB-0367",
@@ -97,7 +127,4 @@ airport_fix_map = {
     "VHHX": "HK-0099",
 }
 
-correct_airport_codes = [
-    "LEPA",
-    "LOWL"
-]
+correct_airport_codes = ["LEPA", "LOWL"]
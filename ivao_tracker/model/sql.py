@@ -2,7 +2,8 @@ from datetime import datetime
 from typing import Any, List, Optional
 
 from geoalchemy2 import Geometry
-from sqlalchemy.dialects.postgresql import TIMESTAMP
+from sqlalchemy import LargeBinary
+from sqlalchemy.dialects.postgresql import JSONB, TIMESTAMP
 from sqlalchemy.orm import RelationshipProperty
 from sqlmodel import (
     ARRAY,
@@ -103,9 +104,10 @@ class Snapshot(SQLModel, table=True):
 
 class UserSessionBase(SQLModel):
     id: Optional[int] = Field(default=None, primary_key=True)
-    isActive: bool = Field(default=True, nullable=False, index=True)
+    # the session indexes are part of the index profile
+    isActive: bool = Field(default=True, nullable=False)
     userId: int
-    callsign: str = Field(index=True)
+    callsign: str
     serverId: str
     softwareTypeId: str
     softwareVersion: str
@@ -210,6 +212,13 @@ class PilotSession(UserSessionBase, table=True):
     landingTime: Optional[datetime]
     onBlocksTime: Optional[datetime]
     disconnectTime: Optional[datetime]
+    # airports nearest to the takeoff and landing positions
+    actualDepartureId: Optional[str] = Field(
+        default=None, foreign_key="airport.code"
+    )
+    actualArrivalId: Optional[str] = Field(
+        default=None, foreign_key="airport.code"
+    )
     simulatorId: Optional[str]
     textureId: Optional[int]
     rating: int = Field(sa_column=Column(SmallInteger))
@@ -232,6 +241,17 @@ class AtcSession(UserSessionBase, table=True):
     tracks: List["AtcTrack"] = Relationship(back_populates="atcSession")
 
 
+class Fir(SQLModel, table=True):
+    id: int = Field(
+        sa_column=Column(SmallInteger, primary_key=True, autoincrement=False)
+    )
+    code: str = Field(unique=True)
+    name: Optional[str]
+    geometry: Any = Field(
+        sa_column=Column(Geometry("GEOMETRY", srid=4326, spatial_index=True))
+    )
+
+
 class PilotTrack(SQLModel, table=True):
     __table_args__ = {"postgresql_partition_by": "RANGE (timestamp)"}
     id: int = Field(
@@ -239,7 +259,8 @@ class PilotTrack(SQLModel, table=True):
         sa_column=Column(Integer, primary_key=True, autoincrement=True),
     )
     timestamp: datetime = Field(sa_column=Column(TIMESTAMP, primary_key=True))
-    pilotSessionId: int = Field(foreign_key="pilotsession.id", index=True)
+    # the track indexes are part of the index profile
+    pilotSessionId: int = Field(foreign_key="pilotsession.id")
     pilotSession: PilotSession = Relationship(back_populates="tracks")
     altitude: int
     groundSpeed: int
@@ -257,7 +278,11 @@ class PilotTrack(SQLModel, table=True):
         )
     )
     geometry: Any = Field(
-        sa_column=Column(Geometry("POINT", srid=4326, spatial_index=True))
+        sa_column=Column(Geometry("POINT", srid=4326, spatial_index=False))
+    )
+    # FIR/sector the position lies in
+    firId: Optional[int] = Field(
+        default=None, sa_type=SmallInteger, foreign_key="fir.id"
     )
 
 
@@ -268,3 +293,73 @@ class AtcTrack(SQLModel, table=True):
     geometry: Any = Field(
         sa_column=Column(Geometry("POINT", srid=4326, spatial_index=True))
     )
+
+
+class FlightSummary(SQLModel, table=True):
+    pilotSessionId: int = Field(
+        foreign_key="pilotsession.id", primary_key=True
+    )
+    callsign: str
+    originId: Optional[str]
+    destinationId: Optional[str]
+    firstTimestamp: datetime
+    lastTimestamp: datetime
+    isFinal: bool = Field(default=False, nullable=False)
+    trackCount: int = Field(default=0)
+    distance: float = Field(default=0.0)  # nautical miles
+    minAltitude: int
+    maxAltitude: int
+    minGroundSpeed: int
+    maxGroundSpeed: int
+    lastLatitude: float
+    lastLongitude: float
+    lastState: State = Field(
+        sa_column=Column(Enum(State, name="state_enum", create_type=True))
+    )
+    # seconds per state
+    boardingTime: int = Field(default=0)
+    departingTime: int = Field(default=0)
+    initialClimbTime: int = Field(default=0)
+    enRouteTime: int = Field(default=0)
+    approachTime: int = Field(default=0)
+    landedTime: int = Field(default=0)
+    onBlocksTime: int = Field(default=0)
+
+
+class AirportTrafficHourly(SQLModel, table=True):
+    airportCode: str = Field(foreign_key="airport.code", primary_key=True)
+    hour: datetime = Field(primary_key=True, index=True)
+    continent: Optional[Continent] = Field(
+        sa_column=Column(
+            Enum(Continent, name="continent_enum", create_type=True)
+        )
+    )
+    isoCountry: Optional[str] = Field(index=True)
+    departures: int = Field(default=0)
+    arrivals: int = Field(default=0)
+
+
+class QuarantinedPilot(SQLModel, table=True):
+    """
+    Dead-letter table of pilots that could not be imported.
+    """
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    snapshotUpdatedAt: datetime = Field(index=True)
+    pilotSessionId: int = Field(index=True)
+    callsign: Optional[str]
+    error: str
+    payload: Any = Field(sa_column=Column(JSONB))
+
+
+class Keyframe(SQLModel, table=True):
+    """
+    The active pilots of a snapshot, written every few minutes to
+    reconstruct the traffic at any time.
+    """
+
+    snapshotId: int = Field(foreign_key="snapshot.id", primary_key=True)
+    updatedAt: datetime = Field(index=True)
+    pilots: int
+    # zstd compressed array of keyframes.KEYFRAME_DTYPE records
+    data: bytes = Field(sa_column=Column(LargeBinary))
@@ -1,40 +1,54 @@
 import logging
 import re
+import shutil
 import ssl
+import tempfile
 from datetime import UTC, datetime
-from io import StringIO
 from timeit import default_timer as timer
+from typing import TYPE_CHECKING
 from urllib.request import urlopen
 
-import pandas
 from sqlmodel import Session, func, select
 
 from ivao_tracker.config.loader import config
-from ivao_tracker.config.logging import setup_logging
 from ivao_tracker.model.constants import (
     AirportType,
     Continent,
     FixOrigin,
+    airport_field_map,
+    airport_csv_dtypes,
     airport_fix_map,
     correct_airport_codes,
     pandas_na_values,
 )
-from ivao_tracker.model.sql import Airport
-from ivao_tracker.service.sql import engine
+from ivao_tracker.model.sql import Airport, FlightPlan, PilotSession
+from ivao_tracker.service import metrics
+from ivao_tracker.service.geofence import build_geofence
+from ivao_tracker.service.locator import build_airport_locator
+from ivao_tracker.service.profiler import profiled
+from ivao_tracker.service.sql import get_engine
+
+if TYPE_CHECKING:
+    import pandas
 
-setup_logging()
 logger = logging.getLogger(__name__)
 
 known_airports = {}
 
+DOWNLOAD_CHUNK_SIZE = 1 << 20
+
 
+@profiled
 def sync_airports():
+    # pandas is only needed (and imported) for the sync
+    import pandas
+
     start = timer()
     logger.info("Syncing airports")
 
     full_csv = parse_airport_csv()
 
-    session = Session(engine)
+    session = Session(get_engine())
     with session.no_autoflush:
 
         # get latest last_updated date from db
@@ -68,8 +82,12 @@ def sync_airports():
         session.commit()
         session.close()
 
+    build_airport_locator()
+    build_geofence()
+
     end = timer()
     duration = end - start
+    metrics.airport_sync_duration.observe(duration)
     msgTpl = (
         "Synced airports in {:.2f}s. Added {:d} new airports and "
         "updated {:d} existing airports."
@@ -79,37 +97,72 @@ def sync_airports():
     )
 
 
-def parse_airport_csv() -> pandas.DataFrame:
-    url = config.config["airports"]["url"]
+def download_airport_csv(url: str, csv_file):
+    """
+    Streams the csv at the url to the binary file.
+    """
     with urlopen(url, context=ssl._create_unverified_context()) as response:
-        csv_data = response.read().decode("utf-8")
-        logger.debug("Downloaded airport csv data")
+        shutil.copyfileobj(response, csv_file, DOWNLOAD_CHUNK_SIZE)
+    logger.debug("Downloaded airport csv data")
+
+
+def read_airport_csv(csv_file) -> "pandas.DataFrame":
+    """
+    Parses the airport csv with the pyarrow engine. Only the imported
+    columns are read, missing values are kept as NA (see airport_rows).
+    """
+    import pandas
 
+    usecols = list(airport_csv_dtypes)
     full_csv = pandas.read_csv(
-        StringIO(csv_data), keep_default_na=False, na_values=pandas_na_values
+        csv_file,
+        engine="pyarrow",
+        usecols=usecols,
+        dtype={k: v for k, v in airport_csv_dtypes.items() if v is not None},
+        keep_default_na=False,
+        na_values=pandas_na_values,
+        true_values=["yes"],
+        false_values=["no"],
     )
-
-    # convert columns to correct types
-    full_csv["scheduled_service"] = full_csv["scheduled_service"].astype(bool)
     full_csv["last_updated"] = pandas.to_datetime(
         full_csv["last_updated"], errors="coerce", utc=True
     )
+    logger.debug("Parsed airport csv data")
+    return full_csv
 
-    full_csv = full_csv.where(pandas.notna(full_csv), None)
 
-    logger.debug("Parsed airport csv data")
+def parse_airport_csv() -> "pandas.DataFrame":
+    url = config.config["airports"]["url"]
+    with tempfile.TemporaryFile() as csv_file:
+        download_airport_csv(url, csv_file)
+        csv_file.seek(0)
+        return read_airport_csv(csv_file)
 
-    return full_csv
+
+def airport_rows(csv):
+    """
+    Yields the rows of the airport csv with None for the missing values,
+    only the rows that are imported are converted.
+    """
+    import pandas
+
+    for row in csv.itertuples(index=False):
+        missing = {
+            name: None
+            for name, value in zip(row._fields, row)
+            if pandas.isna(value)
+        }
+        yield row._replace(**missing) if missing else row
+
+
+def optional_int(value) -> int | None:
+    return int(value) if value is not None else None
 
 
 def create_new_airports(csv) -> list[Airport]:
     new_airports = []
-    for row in csv.itertuples(index=False):
+    for row in airport_rows(csv):
         ident = row.ident
-        elevation_ft = row.elevation_ft
-        elevation_ft = (
-            int(elevation_ft) if pandas.notna(elevation_ft) else None
-        )
 
         airport = Airport(
             id=int(row.id),
@@ -117,7 +170,7 @@ def create_new_airports(csv) -> list[Airport]:
             ident=ident,
             type=AirportType(row.type),
             name=row.name,
-            elevation_ft=elevation_ft,
+            elevation_ft=optional_int(row.elevation_ft),
             continent=Continent(row.continent),
             country_name=row.country_name,
             iso_country=row.iso_country,
@@ -133,7 +186,7 @@ def create_new_airports(csv) -> list[Airport]:
             home_link=row.home_link,
             wikipedia_link=row.wikipedia_link,
             keywords=row.keywords,
-            score=row.score,
+            score=optional_int(row.score),
             last_updated=row.last_updated,
             geom=f"SRID=4326;POINT({row.longitude_deg} {row.latitude_deg})",
         )
@@ -145,16 +198,12 @@ def create_new_airports(csv) -> list[Airport]:
 
 
 def update_airports(last_updated_csv, session):
-    for row in last_updated_csv.itertuples(index=False):
+    for row in airport_rows(last_updated_csv):
         # get existing airport from db
         id = int(row.id)
         airport = session.exec(
             select(Airport).where(Airport.id is not None and Airport.id == id)
         ).first()
-        elevation_ft = row.elevation_ft
-        elevation_ft = (
-            int(elevation_ft) if pandas.notna(elevation_ft) else None
-        )
 
         if airport is None:
             logger.error("Could not find airport with id %d", id)
@@ -166,7 +215,7 @@ def update_airports(last_updated_csv, session):
         airport.ident = row.ident
         airport.type = AirportType(row.type)
         airport.name = row.name
-        airport.elevation_ft = elevation_ft
+        airport.elevation_ft = optional_int(row.elevation_ft)
         airport.continent = Continent(row.continent)
         airport.country_name = row.country_name
         airport.iso_country = row.iso_country
@@ -182,7 +231,7 @@ def update_airports(last_updated_csv, session):
         airport.home_link = row.home_link
         airport.wikipedia_link = row.wikipedia_link
         airport.keywords = row.keywords
-        airport.score = row.score
+        airport.score = optional_int(row.score)
         airport.last_updated = row.last_updated
         airport.geom = (
             f"SRID=4326;POINT({row.longitude_deg} {row.latitude_deg})"
@@ -192,13 +241,52 @@ def update_airports(last_updated_csv, session):
         session.merge(airport)
 
 
+def refresh_airport_caches():
+    """
+    Standby variant of sync_airports: rebuilds the caches from the airports
+    synced by the leader.
+    """
+    build_airport_locator()
+    build_geofence()
+
+
+def warm_known_airports(session) -> int:
+    """
+    Adds the airports of the active flight plans to the known airports
+    cache. Returns the number of added airports.
+    """
+    codes = set()
+    for airport_id_field in airport_field_map:
+        column = getattr(FlightPlan, airport_id_field)
+        codes.update(
+            session.exec(
+                select(column)
+                .join(PilotSession)
+                .where(PilotSession.isActive, column.is_not(None))
+                .distinct()
+            ).all()
+        )
+    missing = codes - known_airports.keys()
+    if not missing:
+        return 0
+    airports = session.exec(
+        select(Airport).where(Airport.code.in_(missing))  # type: ignore
+    ).all()
+    for airport in airports:
+        known_airports[airport.code] = airport
+    return len(airports)
+
+
 def create_or_find_and_update_airport(airport_id, session) -> Airport:
     global known_airports
 
     # try to use a previously processed airport
     if airport_id in known_airports:
+        metrics.airport_cache.inc(result="hit")
         return known_airports[airport_id]
 
+    metrics.airport_cache.inc(result="miss")
+
     # try to find existing airport in db by pk attribute "code"
     airport = session.get(Airport, airport_id)
 
@@ -0,0 +1,254 @@
+"""
+Rolling archive of the raw whazzup snapshots.
+
+The archive is split into segments of `segment` seconds. Each segment
+consists of three files:
+
+- `whazzup-<start>.dict`: the first snapshot of the segment, which is used
+  as zstd (raw content) dictionary for all snapshots of the segment
+- `whazzup-<start>.zst`: the concatenated zstd frames of all snapshots
+- `whazzup-<start>.idx`: fixed size records mapping `updatedAt` (in
+  microseconds since epoch) to the offset and length of its frame
+"""
+
+import glob
+import logging
+import os
+import struct
+import threading
+from bisect import bisect_left
+from datetime import UTC, datetime, timedelta
+
+import zstandard
+
+from ivao_tracker.config.loader import config
+from ivao_tracker.service.context import app_context
+
+logger = logging.getLogger(__name__)
+
+INDEX_RECORD = struct.Struct("<qQI")
+SEGMENT_PREFIX = "whazzup-"
+SEGMENT_FORMAT = "%Y%m%dT%H%M%S"
+
+
+def to_micros(updated_at: datetime) -> int:
+    delta = updated_at - datetime(1970, 1, 1, tzinfo=UTC)
+    return (delta.days * 86400 + delta.seconds) * 1_000_000 + (
+        delta.microseconds
+    )
+
+
+def from_micros(micros: int) -> datetime:
+    return datetime(1970, 1, 1, tzinfo=UTC) + timedelta(microseconds=micros)
+
+
+class _Segment:
+    def __init__(self, base: str):
+        self.base = base
+        self.keys: list[int] = []
+        self.offsets: list[int] = []
+        self.lengths: list[int] = []
+        self._dictionary = None
+        self._compressor = None
+        self._decompressor = None
+        if os.path.exists(base + ".idx"):
+            with open(base + ".idx", "rb") as index:
+                data = index.read()
+            usable = len(data) - len(data) % INDEX_RECORD.size
+            for key, offset, length in INDEX_RECORD.iter_unpack(data[:usable]):
+                self.keys.append(key)
+                self.offsets.append(offset)
+                self.lengths.append(length)
+
+    def dictionary(self):
+        if self._dictionary is None and os.path.exists(self.base + ".dict"):
+            with open(self.base + ".dict", "rb") as dict_file:
+                content = zstandard.ZstdDecompressor().decompress(
+                    dict_file.read()
+                )
+            self._dictionary = zstandard.ZstdCompressionDict(
+                content, dict_type=zstandard.DICT_TYPE_RAWCONTENT
+            )
+        return self._dictionary
+
+    def create_dictionary(self, raw: bytes, level: int):
+        with open(self.base + ".dict", "wb") as dict_file:
+            dict_file.write(
+                zstandard.ZstdCompressor(level=level).compress(raw)
+            )
+        self._dictionary = zstandard.ZstdCompressionDict(
+            raw, dict_type=zstandard.DICT_TYPE_RAWCONTENT
+        )
+
+    def compress(self, raw: bytes, level: int) -> bytes:
+        if self._compressor is None:
+            params = zstandard.ZstdCompressionParameters.from_level(
+                level, window_log=24
+            )
+            self._compressor = zstandard.ZstdCompressor(
+                dict_data=self.dictionary(), compression_params=params
+            )
+        return self._compressor.compress(raw)
+
+    def decompress(self, frame: bytes) -> bytes:
+        if self._decompressor is None:
+            self._decompressor = zstandard.ZstdDecompressor(
+                dict_data=self.dictionary()
+            )
+        return self._decompressor.decompress(frame)
+
+    def append(self, key: int, raw: bytes, level: int):
+        if self.dictionary() is None:
+            self.create_dictionary(raw, level)
+        frame = self.compress(raw, level)
+        with open(self.base + ".zst", "ab") as data:
+            offset = data.seek(0, os.SEEK_END)
+            data.write(frame)
+        with open(self.base + ".idx", "ab") as index:
+            index.write(INDEX_RECORD.pack(key, offset, len(frame)))
+        self.keys.append(key)
+        self.offsets.append(offset)
+        self.lengths.append(len(frame))
+        return len(frame)
+
+    def read(self, position: int) -> bytes:
+        with open(self.base + ".zst", "rb") as data:
+            data.seek(self.offsets[position])
+            frame = data.read(self.lengths[position])
+        return self.decompress(frame)
+
+
+class SnapshotArchive:
+    def __init__(self, directory: str, segment: int = 3600, level: int = 10):
+        self.directory = directory
+        self.segment = segment
+        self.level = level
+        self._segments: dict[str, _Segment] = {}
+        self._lock = threading.Lock()
+
+    def _segment_base(self, key: int) -> str:
+        segment_micros = self.segment * 1_000_000
+        start = from_micros(key // segment_micros * segment_micros)
+        name = SEGMENT_PREFIX + start.strftime(SEGMENT_FORMAT)
+        return os.path.join(self.directory, name)
+
+    def _get_segment(self, base: str) -> _Segment:
+        if base not in self._segments:
+            self._segments[base] = _Segment(base)
+        return self._segments[base]
+
+    def segment_bases(self) -> list[str]:
+        pattern = os.path.join(self.directory, SEGMENT_PREFIX + "*.idx")
+        return sorted(path[: -len(".idx")] for path in glob.glob(pattern))
+
+    def append(self, updated_at: datetime, raw: bytes) -> bool:
+        """
+        Archives the raw snapshot. Returns False if a snapshot with the
+        same (or a later) updatedAt has already been archived.
+        """
+        key = to_micros(updated_at)
+        with self._lock:
+            os.makedirs(self.directory, exist_ok=True)
+            segment = self._get_segment(self._segment_base(key))
+            if segment.keys and key <= segment.keys[-1]:
+                return False
+            if not segment.keys:
+                # a new segment has been started, forget about older ones
+                self._segments = {segment.base: segment}
+            size = segment.append(key, raw, self.level)
+        logger.debug(
+            "Archived snapshot %s (%d of %d bytes)", updated_at, size, len(raw)
+        )
+        return True
+
+    def read(self, updated_at: datetime) -> bytes | None:
+        key = to_micros(updated_at)
+        with self._lock:
+            segment = self._get_segment(self._segment_base(key))
+            position = bisect_left(segment.keys, key)
+            if position < len(segment.keys) and segment.keys[position] == key:
+                return segment.read(position)
+        return None
+
+    def updated_ats(self, start: datetime | None = None):
+        """
+        Yields the updatedAt values of all archived snapshots in order.
+        """
+        for _, key, _ in self._iter_positions(start):
+            yield from_micros(key)
+
+    def __iter__(self):
+        return self.iter()
+
+    def iter(self, start: datetime | None = None):
+        """
+        Yields (updatedAt, raw json) of all archived snapshots in order,
+        optionally starting after the given updatedAt.
+        """
+        for segment, key, position in self._iter_positions(start):
+            with self._lock:
+                raw = segment.read(position)
+            yield from_micros(key), raw
+
+    def _iter_positions(self, start):
+        start_key = to_micros(start) if start else None
+        for base in self.segment_bases():
+            with self._lock:
+                segment = self._get_segment(base)
+                keys = list(segment.keys)
+            for position, key in enumerate(keys):
+                if start_key is None or key > start_key:
+                    yield segment, key, position
+
+    def prune(self, keep_days: int):
+        """
+        Removes all segments that are older than keep_days.
+        """
+        limit = datetime.now(UTC) - timedelta(days=keep_days)
+        limit_name = SEGMENT_PREFIX + limit.strftime(SEGMENT_FORMAT)
+        for base in self.segment_bases():
+            if os.path.basename(base) < limit_name:
+                for extension in (".idx", ".zst", ".dict"):
+                    if os.path.exists(base + extension):
+                        os.remove(base + extension)
+                with self._lock:
+                    self._segments.pop(base, None)
+                logger.info("Removed archive segment %s", base)
+
+
+_last_prune: datetime | None = None
+
+
+def get_archive() -> SnapshotArchive | None:
+    """
+    Returns the archive of the app context or None if archiving is
+    disabled.
+    """
+    archive_cfg = config.config.get("archive", {})
+    if not archive_cfg.get("enabled", False):
+        return None
+    return app_context().resource(
+        "archive",
+        lambda: SnapshotArchive(
+            archive_cfg.get("directory", "archive"),
+            archive_cfg.get("segment", 3600),
+            archive_cfg.get("level", 10),
+        ),
+    )
+
+
+def archive_snapshot(updated_at: datetime, raw: bytes):
+    global _last_prune
+    archive = get_archive()
+    if archive is None:
+        return
+
+    try:
+        archive.append(updated_at, raw)
+
+        now = datetime.now(UTC)
+        if _last_prune is None or now - _last_prune > timedelta(hours=1):
+            archive.prune(config.config["archive"].get("keep_days", 30))
+            _last_prune = now
+    except OSError as e:
+        logger.error("Could not archive snapshot: %s", str(e))
@@ -0,0 +1,76 @@
+"""
+The shared resources of the process.
+
+`cli.main` builds an AppContext after loading the config and installs it
+with `use_context`; the shard workers build their own. The services get
+the database engine, the archive, the spool, the tile cache and the shard
+processes from `app_context()`. Each resource is created on first use, so
+a command only pays for the resources it uses, and `close` releases them.
+"""
+
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class AppContext:
+    def __init__(self):
+        self._resources = {}
+        self._closers = {}
+        # reentrant, a factory may need another resource
+        self._lock = threading.RLock()
+
+    def resource(self, name: str, factory, close=None):
+        """
+        Returns the resource name, which is created with factory() on first
+        use. close(resource) is called when the context is closed.
+        """
+        resource = self._resources.get(name)
+        if resource is not None:
+            return resource
+        with self._lock:
+            resource = self._resources.get(name)
+            if resource is None:
+                resource = factory()
+                self._resources[name] = resource
+                if close is not None:
+                    self._closers[name] = close
+        return resource
+
+    def close(self):
+        """
+        Releases the resources in the reverse order of their creation.
+        """
+        with self._lock:
+            for name in reversed(list(self._resources)):
+                resource = self._resources.pop(name)
+                close = self._closers.pop(name, None)
+                if close is None:
+                    continue
+                try:
+                    close(resource)
+                except Exception as e:
+                    logger.error("Could not close %s: %s", name, str(e))
+
+
+_context: AppContext | None = None
+
+
+def use_context(context: AppContext) -> AppContext:
+    """
+    Installs the context of the process.
+    """
+    global _context
+    _context = context
+    return context
+
+
+def app_context() -> AppContext:
+    """
+    Returns the installed context. Without one (e.g. in tests or when a
+    service is used as a library) a context is installed on first use.
+    """
+    if _context is None:
+        return use_context(AppContext())
+    return _context
@@ -0,0 +1,434 @@
+"""
+Diff of consecutive snapshots as a stream of typed events.
+
+The events are published to in-process subscribers, to the `/events`
+server-sent events endpoint and optionally via postgres `NOTIFY`.
+"""
+
+import logging
+import queue
+import threading
+from datetime import datetime
+from typing import NamedTuple, Optional, Union
+
+import numpy
+from msgspec import Struct, json
+from sqlalchemy import text
+
+from ivao_tracker.config.loader import config
+from ivao_tracker.model.constants import State
+from ivao_tracker.model.json import JsonSnapshot
+from ivao_tracker.service.http import StreamingResponse, route
+
+logger = logging.getLogger(__name__)
+
+# postgres limits NOTIFY payloads to 8000 bytes
+MAX_NOTIFY_PAYLOAD = 7900
+
+STATE_CODES = {state.value: code for code, state in enumerate(State)}
+STATE_VALUES = [state.value for state in State]
+
+
+class PilotEvent(Struct, frozen=True, tag_field="type"):
+    id: int
+    callsign: str
+    timestamp: datetime
+
+
+class Connected(PilotEvent, frozen=True, tag="connected"):
+    latitude: Optional[float]
+    longitude: Optional[float]
+
+
+class Disconnected(PilotEvent, frozen=True, tag="disconnected"):
+    pass
+
+
+class FlightPlanFiled(PilotEvent, frozen=True, tag="flightplan_filed"):
+    flightPlanId: int
+    revision: int
+    departureId: Optional[str]
+    arrivalId: Optional[str]
+
+
+class FlightPlanRevised(PilotEvent, frozen=True, tag="flightplan_revised"):
+    flightPlanId: int
+    revision: int
+    departureId: Optional[str]
+    arrivalId: Optional[str]
+
+
+class StateChanged(PilotEvent, frozen=True, tag="state_changed"):
+    previous: Optional[str]
+    current: Optional[str]
+
+
+class SquawkChanged(PilotEvent, frozen=True, tag="squawk_changed"):
+    previous: int
+    current: int
+
+
+Event = Union[
+    Connected,
+    Disconnected,
+    FlightPlanFiled,
+    FlightPlanRevised,
+    StateChanged,
+    SquawkChanged,
+]
+
+
+class _Frame(NamedTuple):
+    """
+    Columns of the pilots of a snapshot, sorted by pilot id.
+    """
+
+    updated_at: datetime
+    pilots: list
+    ids: numpy.ndarray
+    states: numpy.ndarray
+    squawks: numpy.ndarray
+    flightplans: numpy.ndarray
+    revisions: numpy.ndarray
+
+
+class _PilotRef(NamedTuple):
+    """
+    The fields of a pilot needed for its disconnect event.
+    """
+
+    id: int
+    callsign: str
+
+
+class FrameColumns(Struct, array_like=True):
+    """
+    The columns of a frame, e.g. to restore the baseline after a restart.
+    """
+
+    updated_at: datetime
+    ids: list[int]
+    callsigns: list[str]
+    states: list[int]
+    squawks: list[int]
+    flightplans: list[int]
+    revisions: list[int]
+
+
+def to_frame(json_snapshot: JsonSnapshot) -> _Frame:
+    pilots = sorted(json_snapshot.clients.pilots, key=lambda p: p.id)
+    n = len(pilots)
+    ids = numpy.fromiter((p.id for p in pilots), numpy.int64, n)
+    states = numpy.fromiter(
+        (
+            STATE_CODES.get(p.lastTrack.state, -1) if p.lastTrack else -1
+            for p in pilots
+        ),
+        numpy.int8,
+        n,
+    )
+    squawks = numpy.fromiter(
+        (p.lastTrack.transponder if p.lastTrack else -1 for p in pilots),
+        numpy.int32,
+        n,
+    )
+    flightplans = numpy.fromiter(
+        (p.flightPlan.id if p.flightPlan else -1 for p in pilots),
+        numpy.int64,
+        n,
+    )
+    revisions = numpy.fromiter(
+        (p.flightPlan.revision if p.flightPlan else -1 for p in pilots),
+        numpy.int32,
+        n,
+    )
+    return _Frame(
+        json_snapshot.updatedAt,
+        pilots,
+        ids,
+        states,
+        squawks,
+        flightplans,
+        revisions,
+    )
+
+
+def _state(code) -> str | None:
+    return STATE_VALUES[code] if code >= 0 else None
+
+
+def _flightplan_event(event_type, pilot, timestamp):
+    fp = pilot.flightPlan
+    return event_type(
+        id=pilot.id,
+        callsign=pilot.callsign,
+        timestamp=timestamp,
+        flightPlanId=fp.id,
+        revision=fp.revision,
+        departureId=fp.departureId,
+        arrivalId=fp.arrivalId,
+    )
+
+
+def diff_frames(previous: _Frame, current: _Frame) -> list[Event]:
+    timestamp = current.updated_at
+    events: list[Event] = []
+
+    _, prev_idx, curr_idx = numpy.intersect1d(
+        previous.ids, current.ids, assume_unique=True, return_indices=True
+    )
+    connected = numpy.setdiff1d(
+        numpy.arange(len(current.ids)), curr_idx, assume_unique=True
+    )
+    disconnected = numpy.setdiff1d(
+        numpy.arange(len(previous.ids)), prev_idx, assume_unique=True
+    )
+
+    for i in connected:
+        pilot = current.pilots[i]
+        lt = pilot.lastTrack
+        events.append(
+            Connected(
+                id=pilot.id,
+                callsign=pilot.callsign,
+                timestamp=timestamp,
+                latitude=lt.latitude if lt else None,
+                longitude=lt.longitude if lt else None,
+            )
+        )
+        if pilot.flightPlan:
+            events.append(_flightplan_event(FlightPlanFiled, pilot, timestamp))
+
+    for i in disconnected:
+        pilot = previous.pilots[i]
+        events.append(
+            Disconnected(
+                id=pilot.id, callsign=pilot.callsign, timestamp=timestamp
+            )
+        )
+
+    # compare the columns of all continued pilots at once
+    prev_fp = previous.flightplans[prev_idx]
+    curr_fp = current.flightplans[curr_idx]
+    filed = (curr_fp != prev_fp) & (curr_fp >= 0)
+    revised = (curr_fp == prev_fp) & (
+        current.revisions[curr_idx] != previous.revisions[prev_idx]
+    )
+    for j in numpy.flatnonzero(filed):
+        pilot = current.pilots[curr_idx[j]]
+        events.append(_flightplan_event(FlightPlanFiled, pilot, timestamp))
+    for j in numpy.flatnonzero(revised & (curr_fp >= 0)):
+        pilot = current.pilots[curr_idx[j]]
+        events.append(_flightplan_event(FlightPlanRevised, pilot, timestamp))
+
+    prev_states = previous.states[prev_idx]
+    curr_states = current.states[curr_idx]
+    for j in numpy.flatnonzero(prev_states != curr_states):
+        pilot = current.pilots[curr_idx[j]]
+        events.append(
+            StateChanged(
+                id=pilot.id,
+                callsign=pilot.callsign,
+                timestamp=timestamp,
+                previous=_state(prev_states[j]),
+                current=_state(curr_states[j]),
+            )
+        )
+
+    prev_squawks = previous.squawks[prev_idx]
+    curr_squawks = current.squawks[curr_idx]
+    changed = (prev_squawks != curr_squawks) & (prev_squawks >= 0)
+    for j in numpy.flatnonzero(changed & (curr_squawks >= 0)):
+        pilot = current.pilots[curr_idx[j]]
+        events.append(
+            SquawkChanged(
+                id=pilot.id,
+                callsign=pilot.callsign,
+                timestamp=timestamp,
+                previous=int(prev_squawks[j]),
+                current=int(curr_squawks[j]),
+            )
+        )
+
+    return events
+
+
+class SnapshotDiff:
+    """
+    Keeps the last snapshot and computes the events to the next one. The
+    first snapshot is only used as baseline.
+    """
+
+    def __init__(self):
+        self.previous: _Frame | None = None
+
+    def diff(self, json_snapshot: JsonSnapshot) -> list[Event]:
+        current = to_frame(json_snapshot)
+        previous = self.previous
+        self.previous = current
+        if previous is None:
+            return []
+        return diff_frames(previous, current)
+
+    def export(self) -> FrameColumns | None:
+        previous = self.previous
+        if previous is None:
+            return None
+        return FrameColumns(
+            previous.updated_at,
+            previous.ids.tolist(),
+            [p.callsign for p in previous.pilots],
+            previous.states.tolist(),
+            previous.squawks.tolist(),
+            previous.flightplans.tolist(),
+            previous.revisions.tolist(),
+        )
+
+    def restore(self, columns: FrameColumns):
+        self.previous = _Frame(
+            columns.updated_at,
+            [_PilotRef(*p) for p in zip(columns.ids, columns.callsigns)],
+            numpy.array(columns.ids, dtype=numpy.int64),
+            numpy.array(columns.states, dtype=numpy.int8),
+            numpy.array(columns.squawks, dtype=numpy.int32),
+            numpy.array(columns.flightplans, dtype=numpy.int64),
+            numpy.array(columns.revisions, dtype=numpy.int32),
+        )
+
+
+class EventPublisher:
+    def __init__(self):
+        self.subscribers = []
+        self._streams: list[queue.Queue] = []
+        self._lock = threading.Lock()
+        self._encoder = json.Encoder()
+
+    def subscribe(self, callback):
+        """
+        Registers a callback that receives the list of events of each
+        snapshot.
+        """
+        self.subscribers.append(callback)
+
+    def open_stream(self, maxsize=10_000) -> queue.Queue:
+        stream: queue.Queue = queue.Queue(maxsize)
+        with self._lock:
+            self._streams.append(stream)
+        return stream
+
+    def close_stream(self, stream):
+        with self._lock:
+            if stream in self._streams:
+                self._streams.remove(stream)
+
+    def publish(self, events: list[Event], engine=None, channel=None):
+        if not events:
+            return
+
+        for callback in self.subscribers:
+            try:
+                callback(events)
+            except Exception:
+                logger.exception("Problem while notifying a subscriber.")
+
+        lines = [self._encoder.encode(event) for event in events]
+
+        with self._lock:
+            streams = list(self._streams)
+        for stream in streams:
+            try:
+                for line in lines:
+                    stream.put_nowait(line)
+            except queue.Full:
+                logger.warning("Dropping slow event stream consumer")
+                self.close_stream(stream)
+                end_stream(stream)
+
+        if engine is not None and channel:
+            notify(engine, channel, lines)
+
+
+def end_stream(stream):
+    """
+    Ends the response of a dropped stream. Its pending events are discarded
+    to make room for the None marker, the client reconnects anyway.
+    """
+    try:
+        while True:
+            stream.get_nowait()
+    except queue.Empty:
+        pass
+    stream.put_nowait(None)
+
+
+def notify(engine, channel, lines):
+    """
+    Sends the encoded events via postgres NOTIFY. Events are joined by
+    newlines into as few payloads as possible.
+    """
+    payloads = []
+    payload = b""
+    for line in lines:
+        if payload and len(payload) + len(line) + 1 > MAX_NOTIFY_PAYLOAD:
+            payloads.append(payload)
+            payload = b""
+        payload = payload + b"\n" + line if payload else line
+    if payload:
+        payloads.append(payload)
+
+    with engine.connect() as connection:
+        for payload in payloads:
+            connection.execute(
+                text("SELECT pg_notify(:channel, :payload)"),
+                {"channel": channel, "payload": payload.decode()},
+            )
+        connection.commit()
+
+
+snapshot_diff = SnapshotDiff()
+event_publisher = EventPublisher()
+
+
+def events_config():
+    return config.config.get("events", {})
+
+
+def publish_snapshot_events(json_snapshot: JsonSnapshot, engine):
+    events_cfg = events_config()
+    if not events_cfg.get("enabled", False):
+        return
+    try:
+        events = snapshot_diff.diff(json_snapshot)
+        logger.debug("Publishing %d events", len(events))
+        event_publisher.publish(
+            events, engine, events_cfg.get("notify_channel")
+        )
+    except Exception as e:
+        logger.error("Could not publish events: %s", str(e))
+
+
+def _event_stream(stream):
+    try:
+        while True:
+            try:
+                line = stream.get(timeout=15)
+                if line is None:
+                    # dropped by the publisher
+                    return
+                yield b"data: " + line + b"\n\n"
+            except queue.Empty:
+                # keep the connection alive
+                yield b": keepalive\n\n"
+    finally:
+        event_publisher.close_stream(stream)
+
+
+@route("/events")
+def events_endpoint(request):
+    stream = event_publisher.open_stream()
+    return StreamingResponse(
+        200,
+        "text/event-stream",
+        _event_stream(stream),
+        {"Cache-Control": "no-cache"},
+    )
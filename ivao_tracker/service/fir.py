@@ -0,0 +1,148 @@
+"""
+FIR/sector lookups from positions.
+
+The boundaries are loaded from a GeoJSON file into an STR-tree and all
+positions of a snapshot are located in one batched query, so the tracks can
+be stored with a smallint `firId` without a per-row ST_Contains.
+"""
+
+import logging
+from collections import defaultdict
+from timeit import default_timer as timer
+
+import numpy
+import shapely
+from sqlmodel import Session, select
+
+from ivao_tracker.config.loader import config
+from ivao_tracker.model.sql import Fir
+from ivao_tracker.service.sql import get_engine
+from ivao_tracker.util.geo import read_geojson
+
+logger = logging.getLogger(__name__)
+
+
+class FirLocator:
+    def __init__(self, ids, codes, geometries):
+        # smaller polygons (sectors) win over the FIRs containing them
+        order = numpy.argsort(-shapely.area(geometries), kind="stable")
+        self.ids = numpy.asarray(ids, dtype=numpy.int16)[order]
+        self.codes = dict(zip(ids, codes))
+        self.tree = shapely.STRtree(numpy.asarray(geometries)[order])
+
+    def __len__(self):
+        return len(self.ids)
+
+    def locate(self, lons, lats) -> numpy.ndarray:
+        """
+        Returns the FIR ids of the positions, 0 for positions outside of all
+        FIRs or without coordinates.
+        """
+        points = shapely.points(lons, lats)
+        point_index, tree_index = self.tree.query(points, predicate="within")
+        best = numpy.full(len(points), -1, dtype=numpy.intp)
+        numpy.maximum.at(best, point_index, tree_index)
+        return numpy.where(best >= 0, self.ids[best], 0).astype(numpy.int16)
+
+    def locate_pilots(self, pilots) -> dict[int, int]:
+        """
+        Returns the FIR ids of the pilots with a position inside a FIR.
+        """
+        positioned = [p for p in pilots if p.lastTrack]
+        if not positioned:
+            return {}
+        lons = numpy.fromiter(
+            (p.lastTrack.longitude for p in positioned),
+            numpy.float64,
+            len(positioned),
+        )
+        lats = numpy.fromiter(
+            (p.lastTrack.latitude for p in positioned),
+            numpy.float64,
+            len(positioned),
+        )
+        fir_ids = self.locate(lons, lats).tolist()
+        return {
+            p.id: fir_id for p, fir_id in zip(positioned, fir_ids) if fir_id
+        }
+
+
+fir_locator: FirLocator | None = None
+
+
+def read_firs(path, code_property, name_property):
+    """
+    Returns (code, name, geometry) of all FIRs of the GeoJSON file. Features
+    with the same code (e.g. split at the antimeridian) are merged.
+    """
+    names = {}
+    geometries = defaultdict(list)
+    for properties, geometry in read_geojson(path):
+        code = properties.get(code_property)
+        if not code:
+            continue
+        names.setdefault(code, properties.get(name_property))
+        geometries[code].append(geometry)
+    return [
+        (code, names[code], shapely.union_all(parts))
+        for code, parts in geometries.items()
+    ]
+
+
+def build_fir_locator() -> FirLocator | None:
+    """
+    Loads the configured boundaries, stores them in the fir table (keeping
+    the ids of known codes) and builds the locator.
+    """
+    global fir_locator
+    fir_cfg = config.config.get("fir", {})
+    if not fir_cfg.get("enabled", False):
+        fir_locator = None
+        return None
+
+    start = timer()
+    firs = read_firs(
+        fir_cfg["geojson"],
+        fir_cfg.get("code_property", "id"),
+        fir_cfg.get("name_property", "name"),
+    )
+    with Session(get_engine()) as session:
+        known = {fir.code: fir for fir in session.exec(select(Fir)).all()}
+        next_id = max((fir.id for fir in known.values()), default=0) + 1
+        ids = []
+        for code, name, geometry in firs:
+            fir = known.get(code)
+            if fir is None:
+                fir = Fir(id=next_id, code=code)
+                next_id += 1
+            fir.name = name
+            fir.geometry = "SRID=4326;" + geometry.wkt
+            session.add(fir)
+            ids.append(fir.id)
+        session.commit()
+
+    fir_locator = FirLocator(ids, [f[0] for f in firs], [f[2] for f in firs])
+    logger.info(
+        "Built FIR locator with {:d} FIRs in {:.2f}s".format(
+            len(fir_locator), timer() - start
+        )
+    )
+    return fir_locator
+
+
+def locate_firs(pilots) -> dict[int, int]:
+    """
+    Returns the FIR ids by pilot id, empty if FIRs are disabled.
+    """
+    if fir_locator is None:
+        return {}
+    return fir_locator.locate_pilots(pilots)
+
+
+def fir_codes(firs: dict[int, int]) -> dict[int, str]:
+    if fir_locator is None:
+        return {}
+    return {
+        pilot_id: fir_locator.codes[fir_id]
+        for pilot_id, fir_id in firs.items()
+    }
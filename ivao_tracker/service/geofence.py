@@ -0,0 +1,216 @@
+"""
+Geo-fenced ingestion filter.
+
+Only pilots inside the configured region (GeoJSON polygons, bounding
+boxes and the surroundings of the configured airports and the airports of
+the configured countries) or with a flight plan from or to an airport of
+the region are imported into the database.
+"""
+
+import logging
+from timeit import default_timer as timer
+
+import numpy
+import shapely
+from sqlalchemy import text
+from sqlmodel import Session
+
+from ivao_tracker.config.loader import config
+from ivao_tracker.service.locator import nm_to_chord, to_unit_vectors
+from ivao_tracker.service.sql import get_engine
+from ivao_tracker.util.geo import read_geojson
+
+logger = logging.getLogger(__name__)
+
+REGION_AIRPORTS_QUERY = """
+SELECT code, ident, gps_code, iso_country, ST_X(geom), ST_Y(geom)
+FROM airport
+"""
+
+# positions within this distance of a configured airport or an airport of a
+# configured country are inside the region
+AIRPORT_RADIUS_NM = 25.0
+
+
+def load_region(geojson_path, bboxes):
+    """
+    Returns the union of all polygons of the GeoJSON file and the bounding
+    boxes or None if neither is configured.
+    """
+    geometries = [shapely.box(*bbox) for bbox in bboxes]
+    if geojson_path:
+        geometries.extend(g for _, g in read_geojson(geojson_path))
+    if not geometries:
+        return None
+    region = shapely.union_all(geometries)
+    shapely.prepare(region)
+    return region
+
+
+class Geofence:
+    def __init__(
+        self,
+        region=None,
+        airports=(),
+        countries=(),
+        keep_flightplans=True,
+        airport_radius_nm=AIRPORT_RADIUS_NM,
+    ):
+        self.region = region
+        self.airports = set(airports)
+        self.countries = set(countries)
+        self.keep_flightplans = keep_flightplans
+        self.airport_radius_nm = airport_radius_nm
+        # KD-tree of the configured airports and the airports of the
+        # configured countries, None until add_region_airports
+        self.anchors = None
+
+    def add_region_airports(self, rows):
+        """
+        Adds all codes of the airports (code, ident, gps_code, iso_country,
+        lon, lat) that are in a configured country or within the region.
+        The configured airports and the airports of the configured countries
+        extend the region by airport_radius_nm around them.
+        """
+        rows = list(rows)
+        if not rows:
+            return
+        lons = numpy.array([r[4] for r in rows], dtype=numpy.float64)
+        lats = numpy.array([r[5] for r in rows], dtype=numpy.float64)
+        valid = ~numpy.isnan(lons) & ~numpy.isnan(lats)
+        inside = numpy.zeros(len(rows), dtype=bool)
+        if self.region is not None:
+            inside[valid] = shapely.contains_xy(
+                self.region, lons[valid], lats[valid]
+            )
+        anchors = numpy.zeros(len(rows), dtype=bool)
+        for i, row in enumerate(rows):
+            anchors[i] = row[3] in self.countries or any(
+                code in self.airports for code in row[:3] if code
+            )
+        for row, row_inside, anchor in zip(rows, inside, anchors):
+            if row_inside or anchor:
+                self.airports.update(code for code in row[:3] if code)
+
+        anchors &= valid
+        if anchors.any():
+            # scipy is imported on first use to keep the startup fast
+            from scipy.spatial import cKDTree
+
+            self.anchors = cKDTree(
+                to_unit_vectors(lats[anchors], lons[anchors])
+            )
+
+    def positions_inside(self, pilots) -> numpy.ndarray:
+        inside = numpy.zeros(len(pilots), dtype=bool)
+        if (self.region is None and self.anchors is None) or not pilots:
+            return inside
+        lons = numpy.fromiter(
+            (
+                p.lastTrack.longitude if p.lastTrack else numpy.nan
+                for p in pilots
+            ),
+            numpy.float64,
+            len(pilots),
+        )
+        lats = numpy.fromiter(
+            (
+                p.lastTrack.latitude if p.lastTrack else numpy.nan
+                for p in pilots
+            ),
+            numpy.float64,
+            len(pilots),
+        )
+        valid = ~numpy.isnan(lons)
+        if self.region is not None:
+            inside[valid] = shapely.contains_xy(
+                self.region, lons[valid], lats[valid]
+            )
+        if self.anchors is not None:
+            _, positions = self.anchors.query(
+                to_unit_vectors(lats[valid], lons[valid]),
+                distance_upper_bound=nm_to_chord(self.airport_radius_nm),
+            )
+            inside[valid] |= positions < self.anchors.n
+        return inside
+
+    def touches_region(self, pilot) -> bool:
+        fp = pilot.flightPlan
+        return fp is not None and (
+            fp.departureId in self.airports or fp.arrivalId in self.airports
+        )
+
+    def filter(self, pilots, keep_ids=()) -> list:
+        """
+        Returns the pilots within the region, with a flight plan touching
+        the region or with an id in keep_ids (e.g. the active sessions).
+        """
+        inside = self.positions_inside(pilots)
+        return [
+            pilot
+            for pilot, pilot_inside in zip(pilots, inside)
+            if pilot_inside
+            or pilot.id in keep_ids
+            or (self.keep_flightplans and self.touches_region(pilot))
+        ]
+
+
+geofence: Geofence | None = None
+
+
+def geofence_config():
+    return config.config.get("geofence", {})
+
+
+def build_geofence() -> Geofence | None:
+    """
+    Builds the geofence from the config. Has to be called again after the
+    airports have been synced.
+    """
+    global geofence
+    geofence_cfg = geofence_config()
+    if not geofence_cfg.get("enabled", False):
+        geofence = None
+        return None
+
+    start = timer()
+    new_geofence = Geofence(
+        region=load_region(
+            geofence_cfg.get("geojson"), geofence_cfg.get("bboxes", [])
+        ),
+        airports=geofence_cfg.get("airports", []),
+        countries=geofence_cfg.get("countries", []),
+        keep_flightplans=geofence_cfg.get("keep_flightplans", True),
+        airport_radius_nm=geofence_cfg.get(
+            "airport_radius", AIRPORT_RADIUS_NM
+        ),
+    )
+    if (
+        new_geofence.keep_flightplans
+        or new_geofence.airports
+        or new_geofence.countries
+    ):
+        with Session(get_engine()) as session:
+            new_geofence.add_region_airports(
+                session.exec(text(REGION_AIRPORTS_QUERY))  # type: ignore
+            )
+    if new_geofence.region is None and new_geofence.anchors is None:
+        logger.warning(
+            "The geofence region is empty, check the geojson, bboxes, "
+            "airports and countries"
+        )
+    geofence = new_geofence
+    logger.info(
+        "Built geofence with {:d} region airports in {:.2f}s".format(
+            len(geofence.airports), timer() - start
+        )
+    )
+    return geofence
+
+
+def filter_pilots(pilots, keep_ids=()):
+    if geofence is None:
+        return pilots
+    filtered = geofence.filter(pilots, keep_ids)
+    logger.debug("Geofence kept %d of %d pilots", len(filtered), len(pilots))
+    return filtered
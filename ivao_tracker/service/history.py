@@ -0,0 +1,233 @@
+"""
+Point-in-time positions of pilot sessions.
+
+A lookup at time T only reads the day/night partitions of the window
+`[T - max_gap, T + max_gap]`, which are named in the query, so the planner
+does not consider the other partitions. For each session the last sample
+before and the first sample after T are fetched with a `LIMIT 1` scan of the
+`(pilotSessionId, timestamp)` index, and the position, altitude and heading
+are interpolated between them (the position along the great circle). A
+sample is only used up to max_gap seconds away from T, so a session is not
+interpolated across a disconnect.
+"""
+
+import logging
+from datetime import UTC, datetime, timedelta
+from typing import NamedTuple
+
+import numpy
+from sqlmodel import Session, or_, select, text
+
+from ivao_tracker.config.loader import config
+from ivao_tracker.model.sql import PilotSession
+from ivao_tracker.service import metrics
+from ivao_tracker.service.sql import get_engine, pilottrack_partitions
+from ivao_tracker.util.geo import great_circle_interpolate, interpolate_heading
+
+logger = logging.getLogger(__name__)
+
+
+class Position(NamedTuple):
+    pilotSessionId: int
+    timestamp: datetime
+    latitude: float
+    longitude: float
+    altitude: int
+    heading: int
+    # False if T matches a sample or only the sample before T is known
+    interpolated: bool
+
+
+SAMPLE_COLUMNS = (
+    'extract(epoch FROM "timestamp") AS epoch, altitude, heading, '
+    "ST_Y(geometry) AS lat, ST_X(geometry) AS lon"
+)
+
+known_partitions: set[str] = set()
+
+
+def max_gap() -> timedelta:
+    seconds = config.config.get("history", {}).get("max_gap", 120)
+    return timedelta(seconds=seconds)
+
+
+def existing_partitions(session, partitions: list[str]) -> list[str]:
+    """
+    Returns the partitions that exist, the existing ones are cached.
+    """
+    if not set(partitions) <= known_partitions:
+        known_partitions.update(
+            session.exec(
+                text(  # type: ignore
+                    "SELECT c.relname FROM pg_inherits i "
+                    "JOIN pg_class c ON c.oid = i.inhrelid "
+                    "JOIN pg_class p ON p.oid = i.inhparent "
+                    "WHERE p.relname = 'pilottrack'"
+                )
+            ).scalars()
+        )
+    return [p for p in partitions if p in known_partitions]
+
+
+def nearest_sample_query(partitions: list[str], before: bool) -> str:
+    """
+    Returns the lateral subquery of the last sample before (or the first
+    sample after) :time of the session s.id.
+    """
+    if before:
+        condition = '"timestamp" <= :time AND "timestamp" >= :start'
+        order = "DESC"
+    else:
+        condition = '"timestamp" > :time AND "timestamp" <= :end'
+        order = "ASC"
+    branches = [
+        "(SELECT {:s} FROM {:s} "
+        'WHERE "pilotSessionId" = s.id AND {:s} '
+        'ORDER BY "timestamp" {:s} LIMIT 1)'.format(
+            SAMPLE_COLUMNS, partition, condition, order
+        )
+        for partition in partitions
+    ]
+    if len(branches) == 1:
+        return branches[0]
+    return "SELECT * FROM ({:s}) samples ORDER BY epoch {:s} LIMIT 1".format(
+        " UNION ALL ".join(branches), order
+    )
+
+
+def positions_query(partitions: list[str]) -> str:
+    return """
+        SELECT s.id,
+            b.epoch, b.altitude, b.heading, b.lat, b.lon,
+            a.epoch, a.altitude, a.heading, a.lat, a.lon
+        FROM unnest(CAST(:ids AS integer[])) AS s(id)
+        LEFT JOIN LATERAL ({:s}) b ON true
+        LEFT JOIN LATERAL ({:s}) a ON true
+    """.format(
+        nearest_sample_query(partitions, True),
+        nearest_sample_query(partitions, False),
+    )
+
+
+def interpolate_samples(epoch, rows) -> list[Position | None]:
+    """
+    Interpolates the positions at epoch (seconds) between the samples of
+    the rows (id, 5 columns before, 5 columns after), None where there is no
+    sample before.
+    """
+    if not rows:
+        return []
+    samples = numpy.array(
+        [row[1:] for row in rows], dtype=numpy.float64
+    ).reshape(len(rows), 10)
+    (t0, alt0, hdg0, lat0, lon0, t1, alt1, hdg1, lat1, lon1) = samples.T
+    has_before = ~numpy.isnan(t0)
+    has_after = ~numpy.isnan(t1)
+    # without a sample after T, the sample before is used as is
+    for before, after in [
+        (alt0, alt1),
+        (hdg0, hdg1),
+        (lat0, lat1),
+        (lon0, lon1),
+    ]:
+        numpy.copyto(after, before, where=~has_after)
+
+    span = t1 - t0
+    fraction = numpy.zeros(len(rows))
+    numpy.divide(
+        epoch - t0,
+        span,
+        out=fraction,
+        where=has_before & has_after & (span > 0),
+    )
+    lats, lons = great_circle_interpolate(lat0, lon0, lat1, lon1, fraction)
+    altitudes = alt0 + (alt1 - alt0) * fraction
+    headings = interpolate_heading(hdg0, hdg1, fraction)
+
+    timestamp = datetime.fromtimestamp(epoch, UTC)
+    return [
+        (
+            Position(
+                row[0],
+                timestamp,
+                float(lats[i]),
+                float(lons[i]),
+                int(round(altitudes[i])),
+                int(round(headings[i])) % 360,
+                bool(fraction[i] > 0),
+            )
+            if has_before[i]
+            else None
+        )
+        for i, row in enumerate(rows)
+    ]
+
+
+def positions_at(session_ids, time: datetime) -> dict[int, Position]:
+    """
+    Returns the interpolated positions of the sessions at the time (UTC),
+    by session id. Sessions without a sample in the max_gap before the time
+    are missing.
+    """
+    if time.tzinfo is not None:
+        time = time.astimezone(UTC).replace(tzinfo=None)
+    session_ids = list(session_ids)
+    if not session_ids:
+        return {}
+    gap = max_gap()
+    kind = "single" if len(session_ids) == 1 else "batch"
+    with metrics.history_lookup_duration.time(kind=kind):
+        with Session(get_engine()) as session:
+            partitions = existing_partitions(
+                session, pilottrack_partitions(time - gap, time + gap)
+            )
+            if not partitions:
+                return {}
+            rows = session.exec(
+                text(positions_query(partitions)),  # type: ignore
+                params={
+                    "ids": session_ids,
+                    "time": time,
+                    "start": time - gap,
+                    "end": time + gap,
+                },
+            ).all()
+        epoch = time.replace(tzinfo=UTC).timestamp()
+        positions = interpolate_samples(epoch, rows)
+    return {p.pilotSessionId: p for p in positions if p is not None}
+
+
+def position_at(session_id: int, time: datetime) -> Position | None:
+    return positions_at([session_id], time).get(session_id)
+
+
+def session_at(callsign: str, time: datetime) -> int | None:
+    """
+    Returns the id of the session of the callsign connected at the time.
+    """
+    if time.tzinfo is not None:
+        time = time.astimezone(UTC).replace(tzinfo=None)
+    with Session(get_engine()) as session:
+        return session.exec(
+            select(PilotSession.id)
+            .where(PilotSession.callsign == callsign)
+            .where(PilotSession.createdAt <= time)
+            .where(
+                or_(
+                    PilotSession.disconnectTime.is_(None),  # type: ignore
+                    PilotSession.disconnectTime >= time,  # type: ignore
+                )
+            )
+            .order_by(PilotSession.createdAt.desc())  # type: ignore
+            .limit(1)
+        ).first()
+
+
+def position_of(callsign: str, time: datetime) -> Position | None:
+    """
+    Returns where the callsign was at the time.
+    """
+    session_id = session_at(callsign, time)
+    if session_id is None:
+        return None
+    return position_at(session_id, time)
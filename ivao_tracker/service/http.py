@@ -0,0 +1,127 @@
+import logging
+import threading
+from email.message import Message
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Iterator, NamedTuple
+from urllib.parse import parse_qs, urlsplit
+
+from ivao_tracker.config.loader import config
+
+logger = logging.getLogger(__name__)
+
+
+class Response(NamedTuple):
+    status: int
+    content_type: str
+    body: bytes
+    headers: dict = {}
+
+
+class StreamingResponse(NamedTuple):
+    status: int
+    content_type: str
+    chunks: Iterator[bytes]
+    headers: dict = {}
+
+
+class Request(NamedTuple):
+    path: str
+    query: dict
+    # case insensitive mapping of the request headers
+    headers: Message
+
+
+Handler = Callable[[Request], Response | StreamingResponse]
+
+routes: dict[str, Handler] = {}
+prefix_routes: dict[str, Handler] = {}
+
+
+def route(path: str, prefix: bool = False):
+    """
+    Registers a handler for the given path. Prefix routes receive every
+    request whose path starts with the given path.
+    """
+
+    def decorator(handler):
+        if prefix:
+            prefix_routes[path] = handler
+        else:
+            routes[path] = handler
+        return handler
+
+    return decorator
+
+
+def find_handler(path: str):
+    handler = routes.get(path)
+    if handler is None:
+        for route_prefix, prefix_handler in prefix_routes.items():
+            if path.startswith(route_prefix):
+                return prefix_handler
+    return handler
+
+
+class _RequestHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        url = urlsplit(self.path)
+        handler = find_handler(url.path)
+        if handler is None:
+            response = Response(404, "text/plain", b"Not found\n")
+        else:
+            request = Request(
+                path=url.path,
+                query={k: v[-1] for k, v in parse_qs(url.query).items()},
+                headers=self.headers,
+            )
+            try:
+                response = handler(request)
+            except ValueError as e:
+                response = Response(400, "text/plain", f"{e}\n".encode())
+            except Exception:
+                logger.exception("Problem while handling %s", url.path)
+                response = Response(500, "text/plain", b"Error\n")
+
+        if isinstance(response, StreamingResponse):
+            self._stream(response)
+            return
+
+        self.send_response(response.status)
+        self.send_header("Content-Type", response.content_type)
+        self.send_header("Content-Length", str(len(response.body)))
+        for name, value in response.headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(response.body)
+
+    def _stream(self, response):
+        self.send_response(response.status)
+        self.send_header("Content-Type", response.content_type)
+        for name, value in response.headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        try:
+            for chunk in response.chunks:
+                self.wfile.write(chunk)
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            logger.debug("Client closed the stream")
+        finally:
+            response.chunks.close()
+
+    def log_message(self, format, *args):
+        logger.debug(format, *args)
+
+
+def start_http_server():
+    http_cfg = config.config.get("http", {})
+    if not http_cfg.get("enabled", False):
+        return None
+
+    host = http_cfg.get("host", "127.0.0.1")
+    port = http_cfg.get("port", 9100)
+    server = ThreadingHTTPServer((host, port), _RequestHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    logger.info("Serving HTTP on %s:%d", host, port)
+    return server
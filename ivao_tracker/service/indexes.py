@@ -0,0 +1,225 @@
+"""
+Index profiles of the pilot tracks and sessions.
+
+The indexes of the hot tables are not declared on the models, but applied by
+create_schema for the configured `[indexes] profile`:
+
+- `legacy` (default): btree on `pilotSessionId`, `isActive` and `callsign`,
+  i.e. the indexes the models used to declare, and the `(pilotSessionId,
+  timestamp)` and `(callsign, createdAt)` indexes of the point-in-time
+  lookups
+- `lean`: BRIN on `timestamp`, btree on `(pilotSessionId, timestamp)`, a
+  partial index of the active sessions and `(callsign, createdAt)`, without
+  the single column indexes the composite ones cover
+
+The pilottrack indexes are created on the partitioned table, so Postgres
+creates them on every new partition as well. Managed indexes that are not
+part of the profile are dropped, so switching profiles converges. Since
+partitioned tables cannot be indexed concurrently, the profile is only
+applied to existing tables by the `create-schema` command.
+
+The GiST index on the geometry is configured separately: on `all`
+partitions (default), only on `sealed` partitions (whose time range ended
+at least `seal_after` seconds ago, so the inserts do not maintain it) or
+`none`.
+"""
+
+import logging
+import re
+from datetime import UTC, datetime, timedelta
+from timeit import default_timer as timer
+from typing import NamedTuple
+
+from sqlalchemy import text
+
+from ivao_tracker.config.loader import config
+
+logger = logging.getLogger(__name__)
+
+
+class IndexSpec(NamedTuple):
+    table: str
+    definition: str
+
+
+INDEXES = {
+    "ix_pilottrack_pilotSessionId": IndexSpec(
+        "pilottrack", '("pilotSessionId")'
+    ),
+    "ix_pilotsession_isActive": IndexSpec("pilotsession", '("isActive")'),
+    "ix_pilotsession_callsign": IndexSpec("pilotsession", "(callsign)"),
+    "brin_pilottrack_timestamp": IndexSpec(
+        "pilottrack", 'USING brin ("timestamp")'
+    ),
+    "ix_pilottrack_session_timestamp": IndexSpec(
+        "pilottrack", '("pilotSessionId", "timestamp")'
+    ),
+    "ix_pilotsession_active": IndexSpec(
+        "pilotsession", '(id) WHERE "isActive"'
+    ),
+    "ix_pilotsession_callsign_created": IndexSpec(
+        "pilotsession", '(callsign, "createdAt")'
+    ),
+    # the name geoalchemy2 used for the spatial_index of the model
+    "idx_pilottrack_geometry": IndexSpec(
+        "pilottrack", "USING gist (geometry)"
+    ),
+}
+
+PROFILES = {
+    "legacy": [
+        "ix_pilottrack_pilotSessionId",
+        "ix_pilotsession_isActive",
+        "ix_pilotsession_callsign",
+        "ix_pilottrack_session_timestamp",
+        "ix_pilotsession_callsign_created",
+    ],
+    "lean": [
+        "brin_pilottrack_timestamp",
+        "ix_pilottrack_session_timestamp",
+        "ix_pilotsession_active",
+        "ix_pilotsession_callsign_created",
+    ],
+}
+
+GIST_MODES = ("all", "sealed", "none")
+
+PARTITION_PATTERN = re.compile(r"^pilottrack_(\d{8})_(day|night)$")
+
+
+def index_config():
+    return config.config.get("indexes", {})
+
+
+def profile_indexes(profile: str, gist: str) -> list[str]:
+    """
+    Returns the names of the managed indexes of the profile.
+    """
+    if profile not in PROFILES:
+        raise ValueError("Unknown index profile " + profile)
+    if gist not in GIST_MODES:
+        raise ValueError("Unknown gist mode " + gist)
+    names = list(PROFILES[profile])
+    if gist == "all":
+        names.append("idx_pilottrack_geometry")
+    return names
+
+
+def create_index_sql(name: str, table: str, definition: str) -> str:
+    return 'CREATE INDEX IF NOT EXISTS "{:s}" ON {:s} {:s}'.format(
+        name, table, definition
+    )
+
+
+def apply_index_profile(connection, profile=None, gist=None):
+    """
+    Creates the indexes of the profile and drops the other managed indexes.
+    """
+    index_cfg = index_config()
+    profile = profile or index_cfg.get("profile", "legacy")
+    gist = gist or index_cfg.get("gist", "all")
+    wanted = profile_indexes(profile, gist)
+
+    existing = set(
+        connection.execute(
+            text(
+                "SELECT indexname FROM pg_indexes "
+                "WHERE tablename IN ('pilottrack', 'pilotsession')"
+            )
+        ).scalars()
+    )
+    for name, spec in INDEXES.items():
+        if name in wanted and name not in existing:
+            start = timer()
+            connection.execute(
+                text(create_index_sql(name, spec.table, spec.definition))
+            )
+            logger.info(
+                "Created index {:s} in {:.2f}s".format(name, timer() - start)
+            )
+        elif name not in wanted and name in existing:
+            connection.execute(
+                text('DROP INDEX IF EXISTS "{:s}"'.format(name))
+            )
+            logger.info("Dropped index %s", name)
+
+
+def partition_end(partition: str) -> datetime | None:
+    """
+    Returns the (exclusive) end of the range of a pilottrack partition.
+    """
+    match = PARTITION_PATTERN.match(partition)
+    if match is None:
+        return None
+    day = datetime.strptime(match.group(1), "%Y%m%d")
+    if match.group(2) == "day":
+        return day + timedelta(hours=18)
+    return day + timedelta(days=1, hours=6)
+
+
+def unindexed_partitions(connection) -> list[str]:
+    """
+    Returns the pilottrack partitions without a GiST index.
+    """
+    return list(
+        connection.execute(
+            text(
+                """
+                SELECT c.relname
+                FROM pg_inherits i
+                JOIN pg_class c ON c.oid = i.inhrelid
+                JOIN pg_class p ON p.oid = i.inhparent
+                WHERE p.relname = 'pilottrack'
+                AND NOT EXISTS (
+                    SELECT 1 FROM pg_indexes x
+                    WHERE x.tablename = c.relname
+                    AND position('USING gist' IN x.indexdef) > 0
+                )
+                ORDER BY c.relname
+                """
+            )
+        ).scalars()
+    )
+
+
+def seal_partitions(engine, now: datetime | None = None) -> int:
+    """
+    Creates the GiST index on the partitions that are sealed, if the GiST
+    index is deferred. Returns the number of indexed partitions.
+    """
+    index_cfg = index_config()
+    if index_cfg.get("gist", "all") != "sealed":
+        return 0
+    if now is None:
+        now = datetime.now(UTC)
+    # the partition bounds are naive UTC timestamps
+    sealed_before = now.replace(tzinfo=None) - timedelta(
+        seconds=index_cfg.get("seal_after", 3600)
+    )
+
+    sealed = 0
+    with engine.begin() as connection:
+        partitions = unindexed_partitions(connection)
+    for partition in partitions:
+        end = partition_end(partition)
+        if end is None or end > sealed_before:
+            continue
+        start = timer()
+        # one transaction per partition, so the locks are held briefly
+        with engine.begin() as connection:
+            connection.execute(
+                text(
+                    create_index_sql(
+                        partition + "_geometry_idx",
+                        partition,
+                        "USING gist (geometry)",
+                    )
+                )
+            )
+        sealed += 1
+        logger.info(
+            "Sealed partition {:s} in {:.2f}s".format(
+                partition, timer() - start
+            )
+        )
+    return sealed
@@ -1,42 +1,109 @@
 import logging
 from datetime import UTC, datetime, timedelta
 from timeit import default_timer as timer
+from typing import NamedTuple
 from urllib.request import urlopen
 
-from msgspec import json
-from sqlalchemy.exc import SQLAlchemyError
-from sqlmodel import Session, select
+from msgspec import json, msgpack, to_builtins
+from sqlalchemy.exc import InterfaceError, OperationalError, SQLAlchemyError
+from sqlmodel import Session, func, select, true
 
 from ivao_tracker.config.loader import config
 from ivao_tracker.config.logging import setup_logging
 from ivao_tracker.model.constants import State, airport_field_map
-from ivao_tracker.model.json import JsonSnapshot
-from ivao_tracker.model.sql import Aircraft, PilotSession
-from ivao_tracker.service.airport import create_or_find_and_update_airport, known_airports
-from ivao_tracker.service.sql import engine, ensure_db_partitions
-from ivao_tracker.util.model import json2sqlPilotSession, json_to_sql_snapshot
+from ivao_tracker.model.json import JsonPilot, JsonSnapshot
+from ivao_tracker.model.sql import (
+    Aircraft,
+    PilotSession,
+    QuarantinedPilot,
+    Snapshot,
+)
+from ivao_tracker.service import metrics
+from ivao_tracker.service.airport import (
+    create_or_find_and_update_airport,
+    known_airports,
+    warm_known_airports,
+)
+from ivao_tracker.service.archive import archive_snapshot
+from ivao_tracker.service.context import AppContext, app_context, use_context
+from ivao_tracker.service.events import publish_snapshot_events
+from ivao_tracker.service.fir import fir_codes, locate_firs
+from ivao_tracker.service.geofence import filter_pilots
+from ivao_tracker.service.keyframes import write_keyframe
+from ivao_tracker.service import locator
+from ivao_tracker.service.live import live_state
+from ivao_tracker.service.locator import build_airport_locator, resolve_airport
+from ivao_tracker.service.profiler import profiled
+from ivao_tracker.service.shards import (
+    ShardedImporter,
+    ShardError,
+    commit_prepared,
+    delete_snapshot,
+    prepare_transaction,
+    prepared_xid,
+    recover_prepared,
+    rollback_prepared,
+)
+from ivao_tracker.service.spool import drain_spool, get_spool, spool_snapshot
+from ivao_tracker.service.sql import (
+    database_is_healthy,
+    get_engine,
+    ensure_db_partitions,
+)
+from ivao_tracker.service.summary import (
+    finalize_flight_summary,
+    load_active_flight_summaries,
+    track_flight_summary,
+)
+from ivao_tracker.service.tiles import invalidate_tiles
+from ivao_tracker.service.traffic import TrafficRollup
+from ivao_tracker.service.warmstart import (
+    restore_importer_state,
+    save_importer_state,
+)
+from ivao_tracker.util.model import (
+    createAircraft,
+    json2sqlPilotSession,
+    json_to_sql_snapshot,
+)
 
-setup_logging()
 logger = logging.getLogger(__name__)
 
 last_snapshot = datetime.now(UTC)
+# seconds the last import of a fetched snapshot took
+last_import_duration = 0.0
 
 
 def read_ivao_snapshot() -> JsonSnapshot:
     whazzup_url = config.config["ivao"]["whazzup_url"]
-    with urlopen(whazzup_url) as url:
-        start = timer()
-        json_data = url.read()
-        snapshot = json.decode(json_data, type=JsonSnapshot)
-        end = timer()
-        duration = end - start
-        msgTpl = "Parsed whazzup json in {:.2f}s"
-        logger.debug(msgTpl.format(duration))
-        return snapshot
+    with metrics.import_duration.time(stage="fetch"):
+        with urlopen(whazzup_url) as url:
+            json_data = url.read()
 
-
-def import_ivao_snapshot():
-    global last_snapshot
+    start = timer()
+    with metrics.import_duration.time(stage="decode"):
+        snapshot = json.decode(json_data, type=JsonSnapshot)
+    end = timer()
+    duration = end - start
+    msgTpl = "Parsed whazzup json in {:.2f}s"
+    logger.debug(msgTpl.format(duration))
+
+    with metrics.import_duration.time(stage="archive"):
+        archive_snapshot(snapshot.updatedAt, json_data)
+
+    return snapshot
+
+
+@profiled
+def import_ivao_snapshot() -> datetime:
+    """
+    Fetches the current snapshot and imports it, if it has been updated.
+    Snapshots are spooled if the database is unavailable or the importer
+    falls behind, i.e. the last import took longer than `ivao.interval`, and
+    drained in bulk in the next cycles.
+    Returns the updatedAt value of the fetched snapshot.
+    """
+    global last_import_duration, last_snapshot
     json_snapshot = read_ivao_snapshot()
 
     # check if the snapshot is the same as the last one
@@ -46,92 +113,612 @@ def import_ivao_snapshot():
 
     if snapshots_are_equal:
         logger.info("No update available")
+        metrics.snapshots_skipped.inc()
     else:
-        ensure_db_partitions()
-
-        logger.debug("Importing new snapshot")
-        start = timer()
-
-        try:
-            session = Session(engine)
-            with session.no_autoflush:
-                snapshot = json_to_sql_snapshot(json_snapshot)
-                session.add(snapshot)
-
-                last_active_sessions = session.exec(
-                    select(PilotSession).where(PilotSession.isActive)
-                ).all()
-
-                aircrafts = session.exec(select(Aircraft)).all()
-
-                logger.debug(
-                    "Found %d last active sessions", len(last_active_sessions)
+        age = datetime.now(UTC) - json_snapshot.updatedAt
+        metrics.snapshot_age.observe(age.total_seconds())
+        spool = get_spool()
+        if spool is None:
+            import_snapshot(json_snapshot)
+        elif len(spool) > 0:
+            # keep the order, the snapshot is imported after the older ones
+            spool_and_publish(spool, json_snapshot)
+            # the shards commit every snapshot on their own
+            bulk = get_sharded_importer() is None
+            drain_spool(
+                spool,
+                import_snapshot,
+                database_is_healthy,
+                import_batch=import_snapshots if bulk else None,
+            )
+            # a drain that stopped early set it to an older snapshot
+            last_snapshot = json_snapshot.updatedAt
+        elif last_import_duration > config.config["ivao"]["interval"]:
+            logger.warning(
+                "Last import took {:.2f}s, spooling to catch up".format(
+                    last_import_duration
                 )
+            )
+            spool_and_publish(spool, json_snapshot)
+            # measured again once the spool has been drained
+            last_import_duration = 0.0
+        else:
+            start = timer()
+            imported = import_snapshot(json_snapshot)
+            last_import_duration = timer() - start
+            if not imported:
+                spool_and_publish(spool, json_snapshot)
+
+    return json_snapshot.updatedAt
+
+
+def spool_and_publish(spool, json_snapshot: JsonSnapshot):
+    """
+    Spools the snapshot for a later import and publishes it. The snapshot
+    becomes the last one, so it is not spooled and published again if the
+    next fetch returns it again.
+    """
+    global last_snapshot
+    spool_snapshot(spool, json_snapshot)
+    publish_snapshot(json_snapshot)
+    last_snapshot = json_snapshot.updatedAt
 
-                # iterate over all sessions in the snapshot
-                for json_pilot in json_snapshot.clients.pilots:
-                    pilot_session_raw = json2sqlPilotSession(json_pilot)
-                    pilot_session = next(
-                        (
-                            s
-                            for s in last_active_sessions
-                            if s.id == json_pilot.id
-                        ),
-                        None,
-                    )
 
-                    revived_session = False
-                    if pilot_session is None:
-                        # try to revive possible ghost connections
-                        pilot_session = session.get(
-                            PilotSession, json_pilot.id
-                        )
-                        if pilot_session:
-                            pilot_session.isActive = True
-                            revived_session = True
-                            logger.debug(
-                                "Revived pilot session %s", pilot_session.id
-                            )
-
-                    known_airports = {}
-                    if pilot_session is None:
-                        # no pilotSession in db...
-                        pilot_session = create_pilot_session(
-                            session, snapshot, pilot_session_raw, aircrafts
-                        )
-                    else:
-                        # we found an existing pilotSession in db
-                        mergePilotSession(
-                            session,
-                            snapshot,
-                            pilot_session_raw,
-                            pilot_session,
-                            aircrafts,
-                        )
-                        if revived_session is False:
-                            last_active_sessions.remove(pilot_session)
-
-                for inactive_pilot_session in last_active_sessions:
-                    inactive_pilot_session.isActive = False
-                    inactive_pilot_session.disconnectTime = snapshot.updatedAt
-                    session.merge(inactive_pilot_session)
-                    logger.debug("Ended session %d", inactive_pilot_session.id)
+def warm_restart() -> bool:
+    """
+    Restores the checkpointed importer state, so the first snapshot after
+    a restart is skipped if it has been imported already and resolves its
+    airports from the cache. Returns True on a warm start.
+    """
+    global last_snapshot
+    updated_at = restore_importer_state()
+    if updated_at is None:
+        return False
+    last_snapshot = updated_at.replace(tzinfo=UTC)
+    metrics.last_snapshot_timestamp.set(last_snapshot.timestamp())
+    return True
+
+
+def follow_ivao_snapshot() -> datetime:
+    """
+    Standby variant of import_ivao_snapshot: fetches the current snapshot
+    for the live state and warms the caches from the state committed by the
+    leader, so this replica can take over without a cold start.
+    """
+    global last_snapshot
+    json_snapshot = read_ivao_snapshot()
+    live_state.update(
+        json_snapshot, fir_codes(locate_firs(json_snapshot.clients.pilots))
+    )
+
+    with Session(get_engine()) as session:
+        committed = session.exec(select(func.max(Snapshot.updatedAt))).one()
+        if committed is not None:
+            last_snapshot = committed.replace(tzinfo=UTC)
+        warmed = warm_known_airports(session)
+    logger.debug("Standby: warmed %d airports", warmed)
+    # the leader commits the tracks of the snapshot
+    invalidate_tiles(json_snapshot.clients.pilots)
+
+    return json_snapshot.updatedAt
+
+
+def publish_snapshot(json_snapshot: JsonSnapshot, firs=None):
+    """
+    Updates the live state and publishes the events of the snapshot.
+    """
+    if firs is None:
+        firs = locate_firs(json_snapshot.clients.pilots)
+    live_state.update(json_snapshot, fir_codes(firs))
+    publish_snapshot_events(json_snapshot, get_engine())
+
+
+def import_snapshot(json_snapshot: JsonSnapshot, publish=True) -> bool:
+    """
+    Imports the given snapshot into the database. Returns True on success.
+    Spooled and replayed snapshots are imported without publishing them,
+    since newer snapshots have been published already. They neither update
+    the live state nor the warm restart checkpoint.
+    """
+    global last_snapshot
 
+    logger.debug("Importing new snapshot")
+    start = timer()
+
+    try:
+        session = Session(get_engine())
+        ensure_db_partitions(json_snapshot.updatedAt)
+        reconcile_start = timer()
+        firs = locate_firs(json_snapshot.clients.pilots)
+        sharded_importer = get_sharded_importer()
+        if sharded_importer is not None:
+            snapshot_id, imported_pilots = import_sharded_snapshot(
+                sharded_importer, session, json_snapshot, firs
+            )
+        else:
+            snapshot_id, imported_pilots = write_snapshot(
+                session, json_snapshot, firs, reconcile_start
+            )
+            with metrics.import_duration.time(stage="commit"):
                 session.commit()
-                session.close()
+        session.close()
 
-                end = timer()
-                duration = end - start
-                msgTpl = "Updated DB in {:.2f}s"
-                logger.info(msgTpl.format(duration))
+        if publish:
+            publish_snapshot(json_snapshot, firs)
 
-                last_snapshot = json_snapshot.updatedAt
-        except SQLAlchemyError as e:
-            logger.error("SQL Alchemy Error: %s", str(e))
-            session.rollback()
+        end = timer()
+        duration = end - start
+        msgTpl = "Updated DB in {:.2f}s"
+        logger.info(msgTpl.format(duration))
+
+        last_snapshot = json_snapshot.updatedAt
+        metrics.snapshots_imported.inc()
+        metrics.last_snapshot_timestamp.set(last_snapshot.timestamp())
+        if publish:
+            save_importer_state(snapshot_id, last_snapshot)
+        write_keyframe(snapshot_id, last_snapshot, imported_pilots)
+        invalidate_tiles(imported_pilots)
+        return True
+    except SQLAlchemyError as e:
+        logger.error("SQL Alchemy Error: %s", str(e))
+        session.rollback()
+
+    except Exception as e:
+        logger.error("Unexpected error: %s", str(e))
+
+    return False
+
+
+def write_snapshot(session, json_snapshot, firs, reconcile_start):
+    """
+    Adds the snapshot and reconciles its pilots in the session without
+    committing. Returns the snapshot id and the imported pilots.
+    """
+    with session.no_autoflush:
+        snapshot = json_to_sql_snapshot(json_snapshot)
+        session.add(snapshot)
+
+        traffic = TrafficRollup()
+        imported_pilots = reconcile_pilots(
+            session,
+            snapshot,
+            json_snapshot.clients.pilots,
+            firs,
+            traffic,
+        )
+        traffic.flush(session)
+
+        metrics.import_duration.observe(
+            timer() - reconcile_start, stage="reconcile"
+        )
+        with metrics.import_duration.time(stage="flush"):
+            session.flush()
+    return snapshot.id, imported_pilots
+
+
+def import_snapshots(json_snapshots) -> bool:
+    """
+    Bulk variant of import_snapshot for draining the spool: imports the
+    snapshots in order in one transaction, so the commit is paid once per
+    batch instead of once per snapshot. Nothing is published. Returns True
+    on success, otherwise the whole batch is rolled back.
+    """
+    global last_snapshot
 
+    start = timer()
+    airport_ids = set(known_airports)
+    session = Session(get_engine())
+    imported = []
+    try:
+        for json_snapshot in json_snapshots:
+            ensure_db_partitions(json_snapshot.updatedAt)
+            reconcile_start = timer()
+            firs = locate_firs(json_snapshot.clients.pilots)
+            snapshot_id, imported_pilots = write_snapshot(
+                session, json_snapshot, firs, reconcile_start
+            )
+            imported.append((snapshot_id, json_snapshot, imported_pilots))
+        with metrics.import_duration.time(stage="commit"):
+            session.commit()
+    except Exception as e:
+        logger.error(
+            "Could not import batch of %d snapshots: %s",
+            len(json_snapshots),
+            str(e),
+        )
+        session.rollback()
+        # the airports created in the batch have been rolled back
+        for airport_id in set(known_airports) - airport_ids:
+            del known_airports[airport_id]
+        return False
+    finally:
+        session.close()
+
+    logger.info(
+        "Updated DB with {:d} snapshots in {:.2f}s".format(
+            len(imported), timer() - start
+        )
+    )
+    for snapshot_id, json_snapshot, imported_pilots in imported:
+        last_snapshot = json_snapshot.updatedAt
+        write_keyframe(snapshot_id, last_snapshot, imported_pilots)
+    metrics.snapshots_imported.inc(len(imported))
+    metrics.last_snapshot_timestamp.set(last_snapshot.timestamp())
+    invalidate_tiles(p for _, _, pilots in imported for p in pilots)
+    return True
+
+
+class ShardJob(NamedTuple):
+    snapshot_id: int
+    shard: tuple[int, int]
+    # msgpack encoded list of JsonPilot
+    pilots: bytes
+    firs: dict[int, int]
+    xid: str
+    locator_version: int
+
+
+class ShardResult(NamedTuple):
+    traffic: tuple
+    counters: dict
+
+
+def start_sharded_importer(nr_of_shards: int) -> ShardedImporter:
+    recover_prepared()
+    return ShardedImporter(
+        nr_of_shards,
+        initializer=init_shard_worker,
+        initargs=(config.path,),
+    )
+
+
+def get_sharded_importer() -> ShardedImporter | None:
+    """
+    Returns the sharded importer of the app context if ivao.shards is
+    greater than 1.
+    """
+    nr_of_shards = config.config["ivao"].get("shards", 1)
+    if nr_of_shards <= 1:
+        return None
+    return app_context().resource(
+        "sharded_importer",
+        lambda: start_sharded_importer(nr_of_shards),
+        lambda importer: importer.shutdown(),
+    )
+
+
+def init_shard_worker(config_path: str):
+    global worker_locator_version
+    # spawned workers start without the parent's logging, config and context
+    setup_logging()
+    config.load(config_path)
+    use_context(AppContext())
+    build_airport_locator()
+    worker_locator_version = locator.airport_locator_version
+
+
+worker_locator_version = 0
+
+
+def import_shard(job: ShardJob) -> ShardResult:
+    """
+    Reconciles the pilots of one shard in a prepared transaction. Runs in
+    the shard's worker process.
+    """
+    global worker_locator_version
+    if job.locator_version != worker_locator_version:
+        # the airports have been synced by the coordinator
+        build_airport_locator()
+        worker_locator_version = job.locator_version
+
+    counters = metrics.counter_values()
+    pilots = msgpack.decode(job.pilots, type=list[JsonPilot])
+    traffic = TrafficRollup()
+    with Session(get_engine()) as session:
+        with session.no_autoflush:
+            snapshot = session.get(Snapshot, job.snapshot_id)
+            reconcile_pilots(
+                session, snapshot, pilots, job.firs, traffic, job.shard
+            )
+            prepare_transaction(session, job.xid)
+
+    counters = {
+        key: value - counters.get(key, 0)
+        for key, value in metrics.counter_values().items()
+        if value != counters.get(key, 0)
+    }
+    return ShardResult(traffic.export(), counters)
+
+
+def prepare_shared_rows(session, pilots):
+    """
+    Creates or updates the airports and aircrafts of the flight plans, so
+    the shards do not write (and lock) shared rows.
+    """
+    airport_ids = set()
+    aircrafts = {}
+    for json_pilot in pilots:
+        fp = json_pilot.flightPlan
+        if fp is None:
+            continue
+        for airport_id_field in airport_field_map:
+            airport_id = getattr(fp, airport_id_field)
+            if airport_id:
+                airport_ids.add(airport_id)
+        if fp.aircraft and fp.aircraft.icaoCode:
+            aircrafts.setdefault(fp.aircraft.icaoCode, fp)
+
+    for airport_id in airport_ids:
+        create_or_find_and_update_airport(airport_id, session)
+    known_aircrafts = set(session.exec(select(Aircraft.icaoCode)).all())
+    for icao_code, fp in aircrafts.items():
+        if icao_code not in known_aircrafts:
+            session.add(createAircraft(fp))
+    session.commit()
+
+
+def import_sharded_snapshot(importer, session, json_snapshot, firs):
+    """
+    Imports the snapshot with the shard processes. The snapshot row is
+    removed again, if a shard fails. Returns the id of the snapshot and the
+    imported pilots.
+    """
+    active_ids = set(
+        session.exec(
+            select(PilotSession.id).where(PilotSession.isActive)
+        ).all()
+    )
+    pilots = filter_pilots(json_snapshot.clients.pilots, active_ids)
+    prepare_shared_rows(session, pilots)
+
+    snapshot = json_to_sql_snapshot(json_snapshot)
+    session.add(snapshot)
+    session.commit()
+    snapshot_id = snapshot.id
+
+    n = importer.nr_of_shards
+    encoder = msgpack.Encoder()
+    jobs = [
+        ShardJob(
+            snapshot_id,
+            (n, index),
+            encoder.encode(shard_pilots),
+            {p.id: firs[p.id] for p in shard_pilots if p.id in firs},
+            prepared_xid(snapshot_id, index),
+            locator.airport_locator_version,
+        )
+        for index, shard_pilots in enumerate(importer.split(pilots))
+    ]
+    results = importer.map(import_shard, jobs)
+    prepared = [
+        job.xid
+        for job, result in zip(jobs, results)
+        if not isinstance(result, BaseException)
+    ]
+    errors = [r for r in results if isinstance(r, BaseException)]
+    traffic = TrafficRollup()
+    try:
+        if errors:
+            raise ShardError(
+                "{:d} shards failed: {}".format(len(errors), errors[0])
+            )
+        for result in results:
+            traffic.merge(result.traffic)
+            metrics.add_counter_values(result.counters)
+        with Session(get_engine()) as traffic_session:
+            traffic.flush(traffic_session)
+            xid = prepared_xid(snapshot_id, "traffic")
+            prepare_transaction(traffic_session, xid)
+            prepared.append(xid)
+    except Exception:
+        rollback_prepared(prepared)
+        delete_snapshot(snapshot_id)
+        raise
+
+    with metrics.import_duration.time(stage="commit"):
+        failed = commit_prepared(prepared)
+    if failed:
+        raise ShardError("Could not commit " + ", ".join(failed))
+    return snapshot_id, pilots
+
+
+def shard_filter(column, shard):
+    """
+    Returns the where clause selecting the ids of the shard (nr_of_shards,
+    index) or True without a shard.
+    """
+    if shard is None:
+        return true()
+    nr_of_shards, index = shard
+    return column % nr_of_shards == index
+
+
+def reconcile_pilots(session, snapshot, pilots, firs, traffic, shard=None):
+    """
+    Creates, continues and ends the pilot sessions of the snapshot. With a
+    shard, only the sessions of the shard are loaded and ended. Returns the
+    imported pilots.
+    """
+    last_active_sessions = {
+        s.id: s
+        for s in session.exec(
+            select(PilotSession).where(
+                PilotSession.isActive, shard_filter(PilotSession.id, shard)
+            )
+        ).all()
+    }
+
+    aircrafts = session.exec(select(Aircraft)).all()
+    summaries = load_active_flight_summaries(session, shard)
+
+    logger.debug("Found %d last active sessions", len(last_active_sessions))
+
+    # pilots outside of the geofence are skipped, active sessions
+    # are kept until they disconnect
+    pilots = filter_pilots(pilots, last_active_sessions)
+
+    # flush the snapshot, so a failed batch only rolls back pilots
+    session.flush()
+    pilot_import = PilotImport(
+        session,
+        snapshot,
+        firs,
+        last_active_sessions,
+        aircrafts,
+        summaries,
+        traffic,
+    )
+    pilot_import.run(pilots, config.config["ivao"].get("batch_size"))
+    quarantine_pilots(session, snapshot.updatedAt, pilot_import.quarantined)
+
+    for inactive_pilot_session in last_active_sessions.values():
+        inactive_pilot_session.isActive = False
+        inactive_pilot_session.disconnectTime = snapshot.updatedAt
+        session.merge(inactive_pilot_session)
+        logger.debug("Ended session %d", inactive_pilot_session.id)
+        finalize_flight_summary(summaries, inactive_pilot_session.id)
+        metrics.pilot_sessions.inc(kind="ended")
+
+    quarantined = {json_pilot.id for json_pilot, _ in pilot_import.quarantined}
+    return [p for p in pilots if p.id not in quarantined]
+
+
+class PilotImport:
+    """
+    Imports the pilots of a snapshot in batches, each in a SAVEPOINT. A
+    failed batch is rolled back and bisected until the failing pilots are
+    isolated, which are collected in `quarantined`.
+    """
+
+    def __init__(
+        self,
+        session,
+        snapshot,
+        firs,
+        last_active_sessions,
+        aircrafts,
+        summaries,
+        traffic,
+    ):
+        self.session = session
+        self.snapshot = snapshot
+        self.firs = firs
+        self.last_active_sessions = last_active_sessions
+        self.aircrafts = aircrafts
+        self.summaries = summaries
+        self.traffic = traffic
+        self.quarantined: list[tuple[JsonPilot, str]] = []
+
+    def run(self, pilots, batch_size=None):
+        batch_size = batch_size or len(pilots) or 1
+        for start in range(0, len(pilots), batch_size):
+            end = start + batch_size
+            self.batch(pilots[start:end])
+        # quarantined pilots keep their sessions as they are
+        for json_pilot, _ in self.quarantined:
+            self.last_active_sessions.pop(json_pilot.id, None)
+
+    def batch(self, pilots):
+        checkpoint = self.checkpoint()
+        try:
+            with self.session.begin_nested():
+                for json_pilot in pilots:
+                    self.pilot(json_pilot)
+        except (OperationalError, InterfaceError):
+            # the database is gone, bisecting would quarantine everything
+            raise
         except Exception as e:
-            logger.error("Unexpected error: %s", str(e))
+            self.restore(checkpoint)
+            if len(pilots) == 1:
+                logger.error(
+                    "Quarantined pilot %s: %s", pilots[0].callsign, str(e)
+                )
+                self.quarantined.append((pilots[0], repr(e)))
+                return
+            middle = len(pilots) // 2
+            self.batch(pilots[:middle])
+            self.batch(pilots[middle:])
+
+    def checkpoint(self):
+        return (
+            dict(self.last_active_sessions),
+            len(self.aircrafts),
+            dict(self.summaries),
+            self.traffic.checkpoint(),
+            set(known_airports),
+        )
+
+    def restore(self, checkpoint):
+        """
+        Restores the in-memory state after a rolled back batch. The session
+        expires the objects modified in the batch and expunges new ones.
+        """
+        sessions, nr_of_aircrafts, summaries, traffic, airport_ids = checkpoint
+        self.last_active_sessions.clear()
+        self.last_active_sessions.update(sessions)
+        del self.aircrafts[nr_of_aircrafts:]
+        self.summaries.clear()
+        self.summaries.update(summaries)
+        self.traffic.restore(traffic)
+        for airport_id in set(known_airports) - airport_ids:
+            del known_airports[airport_id]
+
+    def pilot(self, json_pilot):
+        session = self.session
+        pilot_session_raw = json2sqlPilotSession(
+            json_pilot, self.firs.get(json_pilot.id)
+        )
+        pilot_session = self.last_active_sessions.get(json_pilot.id)
+
+        revived_session = False
+        if pilot_session is None:
+            # try to revive possible ghost connections
+            pilot_session = session.get(PilotSession, json_pilot.id)
+            if pilot_session:
+                pilot_session.isActive = True
+                revived_session = True
+                logger.debug("Revived pilot session %s", pilot_session.id)
+                metrics.pilot_sessions.inc(kind="revived")
+
+        if pilot_session is None:
+            # no pilotSession in db...
+            pilot_session = create_pilot_session(
+                session, self.snapshot, pilot_session_raw, self.aircrafts
+            )
+            metrics.pilot_sessions.inc(kind="new")
+            metrics.tracks_written.inc(len(pilot_session_raw.tracks))
+        else:
+            # we found an existing pilotSession in db
+            mergePilotSession(
+                session,
+                self.snapshot,
+                pilot_session_raw,
+                pilot_session,
+                self.aircrafts,
+                self.traffic,
+                json_pilot.lastTrack,
+            )
+            if revived_session is False:
+                del self.last_active_sessions[pilot_session.id]
+                metrics.pilot_sessions.inc(kind="continued")
+            if len(pilot_session_raw.tracks) > 0:
+                metrics.tracks_written.inc()
+
+        track_flight_summary(session, self.summaries, json_pilot)
+
+
+def quarantine_pilots(session, updated_at, quarantined):
+    for json_pilot, error in quarantined:
+        session.add(
+            QuarantinedPilot(
+                snapshotUpdatedAt=updated_at,
+                pilotSessionId=json_pilot.id,
+                callsign=json_pilot.callsign,
+                error=error,
+                payload=to_builtins(json_pilot),
+            )
+        )
+    metrics.quarantined_pilots.inc(len(quarantined))
 
 
 def create_pilot_session(
@@ -171,7 +758,13 @@ def create_pilot_session(
 
 
 def mergePilotSession(
-    session, snapshot, raw_pilot_session, pilot_session, aircrafts
+    session,
+    snapshot,
+    raw_pilot_session,
+    pilot_session,
+    aircrafts,
+    traffic,
+    json_track=None,
 ):
     for fp in raw_pilot_session.flightplans:
         # handle flightplans
@@ -234,12 +827,23 @@ def mergePilotSession(
                     minutes=1
                 )
                 logger.debug("%s departed", pilot_session.callsign)
+                if json_track:
+                    pilot_session.actualDepartureId = resolve_airport(
+                        json_track.latitude, json_track.longitude
+                    )
+                traffic.departure(pilot_session, pilot_session.takeoffTime)
             elif last_state == State.EN_ROUTE and new_state == State.APPROACH:
                 pilot_session.approachTime = new_track.timestamp
                 logger.debug("%s is approaching", pilot_session.callsign)
             elif last_state == State.APPROACH and new_state == State.LANDED:
+                if pilot_session.landingTime is None:
+                    traffic.arrival(pilot_session, new_track.timestamp)
                 pilot_session.landingTime = new_track.timestamp
                 logger.debug("%s landed", pilot_session.callsign)
+                if json_track:
+                    pilot_session.actualArrivalId = resolve_airport(
+                        json_track.latitude, json_track.longitude
+                    )
             elif last_state == State.LANDED and new_state == State.ON_BLOCKS:
                 pilot_session.onBlocksTime = new_track.timestamp
                 logger.debug("%s is on blocks", pilot_session.callsign)
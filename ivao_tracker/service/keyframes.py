@@ -0,0 +1,291 @@
+"""
+Keyframes of the whole traffic for the reconstruction at any time.
+
+Every `interval` seconds, the importer stores the active pilots of the
+snapshot as a zstd compressed array of fixed size records (~30 bytes per
+pilot) in the keyframe table. The traffic at time T is reconstructed from
+the last keyframe before T and the latest track of each session after it,
+so at most interval seconds of tracks are read, however far back T is.
+Pilots of the keyframe without a newer track (e.g. parked ones, whose
+position is not written again) are kept until their session disconnects.
+
+Without a keyframe of the last 2 * interval seconds, the latest tracks of
+the max_gap before T are used, sessions without a sample in it are left
+out.
+"""
+
+import logging
+from datetime import UTC, datetime, timedelta
+from timeit import default_timer as timer
+from typing import NamedTuple
+
+import numpy
+import zstandard
+from sqlalchemy.exc import SQLAlchemyError
+from sqlmodel import Session, func, select, text
+
+from ivao_tracker.config.loader import config
+from ivao_tracker.model.constants import State
+from ivao_tracker.model.sql import Keyframe, PilotSession
+from ivao_tracker.service.history import existing_partitions, max_gap
+from ivao_tracker.service.sql import (
+    get_engine,
+    pilottrack_partitions,
+    pilottrack_source,
+)
+
+logger = logging.getLogger(__name__)
+
+KEYFRAME_DTYPE = numpy.dtype(
+    [
+        ("id", "<i4"),
+        # epoch seconds of the track
+        ("timestamp", "<f8"),
+        ("latitude", "<f4"),
+        ("longitude", "<f4"),
+        ("altitude", "<i4"),
+        ("heading", "<i2"),
+        ("groundSpeed", "<i2"),
+        # index of the State, -1 if unknown
+        ("state", "i1"),
+        ("onGround", "?"),
+    ]
+)
+
+STATES = list(State)
+STATE_CODES = {state.value: code for code, state in enumerate(STATES)}
+# the database stores the names of the enum members
+STATE_NAME_CODES = {state.name: code for code, state in enumerate(STATES)}
+
+LATEST_TRACKS_QUERY = """
+    SELECT DISTINCT ON ("pilotSessionId")
+        "pilotSessionId", extract(epoch FROM "timestamp"),
+        ST_Y(geometry), ST_X(geometry), altitude, heading, "groundSpeed",
+        state, "onGround"
+    FROM {:s}
+    WHERE "timestamp" > :since AND "timestamp" <= :time
+    ORDER BY "pilotSessionId", "timestamp" DESC
+"""
+
+
+class WorldState(NamedTuple):
+    time: datetime
+    # updatedAt of the keyframe the state is based on
+    keyframe: datetime | None
+    # KEYFRAME_DTYPE records of the active pilots, sorted by id
+    pilots: numpy.ndarray
+
+
+def keyframe_config():
+    return config.config.get("keyframes", {})
+
+
+def pilot_records(pilots) -> numpy.ndarray:
+    """
+    Returns the records of the pilots with a position.
+    """
+    positioned = [p for p in pilots if p.lastTrack]
+    records = numpy.zeros(len(positioned), dtype=KEYFRAME_DTYPE)
+    if not positioned:
+        return records
+    tracks = [p.lastTrack for p in positioned]
+    records["id"] = [p.id for p in positioned]
+    records["timestamp"] = [t.timestamp.timestamp() for t in tracks]
+    records["latitude"] = [t.latitude for t in tracks]
+    records["longitude"] = [t.longitude for t in tracks]
+    records["altitude"] = [t.altitude for t in tracks]
+    records["heading"] = [t.heading for t in tracks]
+    records["groundSpeed"] = [t.groundSpeed for t in tracks]
+    records["state"] = [STATE_CODES.get(t.state, -1) for t in tracks]
+    records["onGround"] = [t.onGround for t in tracks]
+    return numpy.sort(records, order="id")
+
+
+def encode_keyframe(records: numpy.ndarray) -> bytes:
+    return zstandard.ZstdCompressor(level=3).compress(records.tobytes())
+
+
+def decode_keyframe(data: bytes) -> numpy.ndarray:
+    raw = zstandard.ZstdDecompressor().decompress(data)
+    return numpy.frombuffer(raw, dtype=KEYFRAME_DTYPE)
+
+
+def track_records(rows) -> numpy.ndarray:
+    """
+    Returns the records of the rows of the latest tracks query.
+    """
+    records = numpy.zeros(len(rows), dtype=KEYFRAME_DTYPE)
+    if not rows:
+        return records
+    columns = list(zip(*rows))
+    for name, column in zip(KEYFRAME_DTYPE.names[:7], columns):
+        records[name] = column
+    records["state"] = [STATE_NAME_CODES.get(s, -1) for s in columns[7]]
+    records["onGround"] = columns[8]
+    return records
+
+
+def latest_records(records: numpy.ndarray) -> numpy.ndarray:
+    """
+    Returns the latest record of each id, sorted by id.
+    """
+    if len(records) == 0:
+        return records
+    records = records[numpy.lexsort((records["timestamp"], records["id"]))]
+    last = numpy.ones(len(records), dtype=bool)
+    last[:-1] = records["id"][1:] != records["id"][:-1]
+    return records[last]
+
+
+_last_bucket: int | None = None
+
+
+def keyframe_bucket(updated_at: datetime, interval) -> int:
+    return int(updated_at.timestamp() // interval)
+
+
+def write_keyframe(snapshot_id: int, updated_at: datetime, pilots) -> bool:
+    """
+    Writes the keyframe of the snapshot, if it is the first snapshot of a
+    new interval. Returns True if a keyframe has been written.
+    """
+    global _last_bucket
+    keyframe_cfg = keyframe_config()
+    if not keyframe_cfg.get("enabled", False):
+        return False
+    interval = keyframe_cfg.get("interval", 600)
+    bucket = keyframe_bucket(updated_at, interval)
+
+    try:
+        with Session(get_engine()) as session:
+            if _last_bucket is None:
+                last = session.exec(select(func.max(Keyframe.updatedAt))).one()
+                if last is not None:
+                    _last_bucket = keyframe_bucket(
+                        last.replace(tzinfo=UTC), interval
+                    )
+            if _last_bucket is not None and bucket <= _last_bucket:
+                return False
+
+            start = timer()
+            records = pilot_records(pilots)
+            data = encode_keyframe(records)
+            session.add(
+                Keyframe(
+                    snapshotId=snapshot_id,
+                    updatedAt=updated_at,
+                    pilots=len(records),
+                    data=data,
+                )
+            )
+            session.commit()
+    except SQLAlchemyError as e:
+        logger.error("Could not write keyframe: %s", str(e))
+        return False
+
+    _last_bucket = bucket
+    logger.info(
+        "Wrote keyframe of {:d} pilots ({:d} bytes) in {:.2f}s".format(
+            len(records), len(data), timer() - start
+        )
+    )
+    return True
+
+
+def connected_records(records: numpy.ndarray, disconnects) -> numpy.ndarray:
+    """
+    Returns the records of the sessions that have not been disconnected
+    after the record. disconnects maps session ids to the epoch of their
+    disconnect.
+    """
+    if len(records) == 0 or not disconnects:
+        return records
+    disconnected_at = numpy.array(
+        [disconnects.get(i, numpy.inf) for i in records["id"].tolist()]
+    )
+    # revived sessions have tracks after their last disconnect
+    return records[
+        ~(
+            (disconnected_at > records["timestamp"])
+            & numpy.isfinite(disconnected_at)
+        )
+    ]
+
+
+def last_keyframe(session, time: datetime, since: datetime):
+    return session.exec(
+        select(Keyframe)
+        .where(Keyframe.updatedAt <= time, Keyframe.updatedAt >= since)
+        .order_by(Keyframe.updatedAt.desc())  # type: ignore
+        .limit(1)
+    ).first()
+
+
+def latest_tracks(session, since: datetime, time: datetime) -> numpy.ndarray:
+    """
+    Returns the records of the latest track of each session in (since,
+    time].
+    """
+    partitions = existing_partitions(
+        session, pilottrack_partitions(since, time)
+    )
+    if not partitions:
+        return track_records([])
+    rows = session.exec(
+        text(  # type: ignore
+            LATEST_TRACKS_QUERY.format(pilottrack_source(partitions))
+        ),
+        params={"since": since, "time": time},
+    ).all()
+    return track_records(rows)
+
+
+def disconnect_times(session, ids, time: datetime) -> dict[int, float]:
+    """
+    Returns the epoch of the disconnect of the sessions that disconnected
+    until time.
+    """
+    if not ids:
+        return {}
+    rows = session.exec(
+        select(PilotSession.id, PilotSession.disconnectTime).where(
+            PilotSession.id.in_(ids),  # type: ignore
+            PilotSession.disconnectTime <= time,  # type: ignore
+        )
+    ).all()
+    return {
+        session_id: disconnect.replace(tzinfo=UTC).timestamp()
+        for session_id, disconnect in rows
+    }
+
+
+def world_state(time: datetime) -> WorldState:
+    """
+    Reconstructs the active pilots at the time (UTC) from the last keyframe
+    before it and the tracks after the keyframe.
+    """
+    if time.tzinfo is not None:
+        time = time.astimezone(UTC).replace(tzinfo=None)
+    gap = max_gap()
+    interval = timedelta(seconds=keyframe_config().get("interval", 600))
+    with Session(get_engine()) as session:
+        keyframe = last_keyframe(session, time, time - 2 * interval)
+        if keyframe is None:
+            records = latest_records(latest_tracks(session, time - gap, time))
+            active_since = (time - gap).replace(tzinfo=UTC).timestamp()
+            return WorldState(
+                time, None, records[records["timestamp"] >= active_since]
+            )
+
+        records = latest_records(
+            numpy.concatenate(
+                [
+                    decode_keyframe(keyframe.data),
+                    latest_tracks(session, keyframe.updatedAt, time),
+                ]
+            )
+        )
+        disconnects = disconnect_times(session, records["id"].tolist(), time)
+    return WorldState(
+        time, keyframe.updatedAt, connected_records(records, disconnects)
+    )
@@ -0,0 +1,111 @@
+"""
+Leader election of tracker replicas with Postgres advisory locks.
+
+Each task (importer, airport sync) has its own session-level advisory lock,
+held on a dedicated connection by the leader. The lock is released by the
+server when the leader's connection is gone, so a standby takes over on its
+next tick. Standbys run a standby task instead, which keeps their caches
+warm from the state committed by the leader.
+"""
+
+import functools
+import logging
+
+from sqlalchemy.exc import SQLAlchemyError
+from sqlmodel import text
+
+from ivao_tracker.config.loader import config
+from ivao_tracker.service import metrics
+from ivao_tracker.service.sql import get_engine, lock_key
+
+logger = logging.getLogger(__name__)
+
+
+class AdvisoryLock:
+    def __init__(self, name: str, engine=None):
+        self.name = name
+        self.key = lock_key(name)
+        self.engine = engine or get_engine()
+        self._connection = None
+
+    @property
+    def held(self) -> bool:
+        return self._connection is not None
+
+    def acquire(self) -> bool:
+        """
+        Tries to acquire the lock or checks that it is still held. Returns
+        True if this process is the leader.
+        """
+        if self._connection is not None:
+            try:
+                self._connection.execute(text("SELECT 1"))
+                return True
+            except SQLAlchemyError:
+                logger.warning("Lost leadership for %s", self.name)
+                self._discard()
+                return False
+
+        connection = None
+        try:
+            # autocommit, so the held connection is not idle in transaction
+            connection = self.engine.connect().execution_options(
+                isolation_level="AUTOCOMMIT"
+            )
+            acquired = connection.execute(
+                text("SELECT pg_try_advisory_lock(:key)"), {"key": self.key}
+            ).scalar()
+        except SQLAlchemyError as e:
+            logger.error("Could not try lock %s: %s", self.name, str(e))
+            if connection is not None:
+                connection.invalidate()
+                connection.close()
+            return False
+
+        if not acquired:
+            connection.close()
+            return False
+        logger.info("Became leader for %s", self.name)
+        self._connection = connection
+        return True
+
+    def release(self):
+        if self._connection is None:
+            return
+        try:
+            self._connection.execute(
+                text("SELECT pg_advisory_unlock(:key)"), {"key": self.key}
+            )
+            self._connection.close()
+        except SQLAlchemyError:
+            self._discard()
+        self._connection = None
+
+    def _discard(self):
+        try:
+            self._connection.invalidate()
+            self._connection.close()
+        except SQLAlchemyError:
+            pass
+        self._connection = None
+
+
+def lead_or_follow(name: str, task, standby_task):
+    """
+    Returns the task, which runs the standby_task instead while another
+    replica holds the lock of the name. Without leader election, the task
+    is returned as is.
+    """
+    if not config.config.get("leader", {}).get("enabled", False):
+        return task
+    lock = AdvisoryLock(name)
+
+    @functools.wraps(task)
+    def run():
+        is_leader = lock.acquire()
+        metrics.leader.set(1 if is_leader else 0, task=name)
+        if is_leader:
+            return task()
+        return standby_task()
+
+    return run
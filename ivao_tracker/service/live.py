@@ -0,0 +1,223 @@
+"""
+In-memory store of the current traffic.
+
+The store is replaced atomically after each committed snapshot and is
+served from memory on `/live`, `/live/pilots` and `/live/atcs`.
+"""
+
+import logging
+import threading
+from datetime import datetime
+from typing import List, NamedTuple, Optional
+
+from msgspec import Struct, json
+
+from ivao_tracker.model.json import JsonSnapshot
+from ivao_tracker.service.http import Response, route
+from ivao_tracker.util.spatial import GridIndex
+
+logger = logging.getLogger(__name__)
+
+
+class LivePilot(Struct, frozen=True):
+    id: int
+    userId: int
+    callsign: str
+    latitude: Optional[float]
+    longitude: Optional[float]
+    altitude: Optional[int]
+    groundSpeed: Optional[int]
+    heading: Optional[int]
+    onGround: Optional[bool]
+    state: Optional[str]
+    transponder: Optional[int]
+    timestamp: Optional[datetime]
+    aircraftId: Optional[str]
+    departureId: Optional[str]
+    arrivalId: Optional[str]
+    fir: Optional[str] = None
+
+
+class LiveAtc(Struct, frozen=True):
+    id: int
+    userId: int
+    callsign: str
+    frequency: float
+    position: str
+    latitude: Optional[float]
+    longitude: Optional[float]
+
+
+class LiveTraffic(Struct, frozen=True):
+    updatedAt: datetime
+    pilots: List[LivePilot]
+    atcs: List[LiveAtc]
+
+
+class _EncodedView(NamedTuple):
+    traffic: LiveTraffic
+    pilots_by_id: dict
+    etag: str
+    bodies: dict
+    # grid index over the pilot positions (ids are list indices)
+    index: GridIndex
+
+
+def to_live_pilot(json_pilot, fir=None) -> LivePilot:
+    lt = json_pilot.lastTrack
+    fp = json_pilot.flightPlan
+    return LivePilot(
+        id=json_pilot.id,
+        userId=json_pilot.userId,
+        callsign=json_pilot.callsign,
+        latitude=lt.latitude if lt else None,
+        longitude=lt.longitude if lt else None,
+        altitude=lt.altitude if lt else None,
+        groundSpeed=lt.groundSpeed if lt else None,
+        heading=lt.heading if lt else None,
+        onGround=lt.onGround if lt else None,
+        state=lt.state if lt else None,
+        transponder=lt.transponder if lt else None,
+        timestamp=lt.timestamp if lt else None,
+        aircraftId=fp.aircraftId if fp else None,
+        departureId=fp.departureId if fp else None,
+        arrivalId=fp.arrivalId if fp else None,
+        fir=fir,
+    )
+
+
+def to_live_atc(json_atc) -> LiveAtc:
+    lt = json_atc.lastTrack
+    return LiveAtc(
+        id=json_atc.id,
+        userId=json_atc.userId,
+        callsign=json_atc.callsign,
+        frequency=json_atc.atcSession.frequency,
+        position=json_atc.atcSession.position,
+        latitude=lt.latitude if lt else None,
+        longitude=lt.longitude if lt else None,
+    )
+
+
+def build_pilot_index(pilots) -> GridIndex:
+    positions = [
+        (i, p.latitude, p.longitude)
+        for i, p in enumerate(pilots)
+        if p.latitude is not None and p.longitude is not None
+    ]
+    ids, lats, lons = zip(*positions) if positions else ((), (), ())
+    return GridIndex(ids, lats, lons)
+
+
+class LiveState:
+    def __init__(self):
+        self._view: _EncodedView | None = None
+        self._encoder = json.Encoder()
+        self._lock = threading.Lock()
+
+    def update(self, json_snapshot: JsonSnapshot, firs=None):
+        """
+        Replaces the live traffic with the given snapshot. firs maps pilot
+        ids to FIR codes.
+        """
+        firs = firs or {}
+        traffic = LiveTraffic(
+            updatedAt=json_snapshot.updatedAt,
+            pilots=[
+                to_live_pilot(p, firs.get(p.id))
+                for p in json_snapshot.clients.pilots
+            ],
+            atcs=[to_live_atc(a) for a in json_snapshot.clients.atcs],
+        )
+        self.replace(traffic)
+
+    def replace(self, traffic: LiveTraffic):
+        with self._lock:
+            # encode once per snapshot, all readers share the bytes
+            bodies = {
+                "/live": self._encoder.encode(traffic),
+                "/live/pilots": self._encoder.encode(traffic.pilots),
+                "/live/atcs": self._encoder.encode(traffic.atcs),
+            }
+            etag = '"{:d}"'.format(
+                int(traffic.updatedAt.timestamp() * 1_000_000)
+            )
+            self._view = _EncodedView(
+                traffic,
+                {p.id: p for p in traffic.pilots},
+                etag,
+                bodies,
+                build_pilot_index(traffic.pilots),
+            )
+
+    @property
+    def traffic(self) -> LiveTraffic | None:
+        view = self._view
+        return view.traffic if view else None
+
+    def pilot(self, pilot_id: int) -> LivePilot | None:
+        view = self._view
+        return view.pilots_by_id.get(pilot_id) if view else None
+
+    def pilots_in_bbox(self, min_lon, min_lat, max_lon, max_lat):
+        view = self._view
+        if view is None:
+            return []
+        positions = view.index.bbox(min_lon, min_lat, max_lon, max_lat)
+        return [view.traffic.pilots[i] for i in positions]
+
+    def pilots_in_radius(self, lat, lon, radius_nm):
+        """
+        Returns the pilots within the radius, ordered by distance.
+        """
+        view = self._view
+        if view is None:
+            return []
+        positions, _ = view.index.radius(lat, lon, radius_nm)
+        return [view.traffic.pilots[i] for i in positions]
+
+    def nearest_pilots(self, lat, lon, k=1):
+        view = self._view
+        if view is None:
+            return []
+        positions, _ = view.index.nearest(lat, lon, k)
+        return [view.traffic.pilots[i] for i in positions]
+
+    def response(self, request) -> Response:
+        view = self._view
+        if view is None:
+            return Response(503, "text/plain", b"No snapshot available\n")
+        headers = {"ETag": view.etag, "Cache-Control": "no-cache"}
+        if request.headers.get("If-None-Match") == view.etag:
+            return Response(304, "application/json", b"", headers)
+
+        query = request.query
+        if request.path == "/live/pilots" and query:
+            body = self._encoder.encode(self.query_pilots(query))
+        else:
+            body = view.bodies[request.path]
+        return Response(200, "application/json", body, headers)
+
+    def query_pilots(self, query):
+        if "bbox" in query:
+            bbox = [float(v) for v in query["bbox"].split(",")]
+            if len(bbox) != 4:
+                raise ValueError("bbox must be minLon,minLat,maxLon,maxLat")
+            return self.pilots_in_bbox(*bbox)
+        if "lat" in query and "lon" in query:
+            lat = float(query["lat"])
+            lon = float(query["lon"])
+            if "radius" in query:
+                return self.pilots_in_radius(lat, lon, float(query["radius"]))
+            return self.nearest_pilots(lat, lon, int(query.get("k", 1)))
+        raise ValueError("Expected bbox or lat/lon with radius or k")
+
+
+live_state = LiveState()
+
+
+@route("/live")
+@route("/live/pilots")
+@route("/live/atcs")
+def live_endpoint(request):
+    return live_state.response(request)
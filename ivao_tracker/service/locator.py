@@ -0,0 +1,214 @@
+"""
+Nearest airport lookups from positions.
+
+The airports are kept in a KD-tree over 3D unit vectors, so nearest
+neighbours by chord length are nearest neighbours by great-circle distance.
+"""
+
+import logging
+import math
+from timeit import default_timer as timer
+
+import numpy
+from sqlalchemy import text
+from sqlmodel import Session
+
+from ivao_tracker.model.constants import AirportType
+from ivao_tracker.service.sql import get_engine
+from ivao_tracker.util.geo import EARTH_RADIUS_NM
+
+logger = logging.getLogger(__name__)
+
+# positions further away from any airport are not resolved
+MAX_AIRPORT_DISTANCE_NM = 10.0
+
+# positions are not resolved to these airports, a heliport or seaplane base
+# next to an airport would take over its arrivals and departures
+EXCLUDED_AIRPORT_TYPES = frozenset(
+    {
+        AirportType.CLOSED.name,
+        AirportType.BALLOONPORT.name,
+        AirportType.HELIPORT.name,
+        AirportType.SEAPLANE_BASE.name,
+    }
+)
+
+AIRPORT_POSITIONS_QUERY = """
+SELECT code, type, ST_Y(geom), ST_X(geom)
+FROM airport
+WHERE geom IS NOT NULL
+"""
+
+
+def to_unit_vectors(lats, lons) -> numpy.ndarray:
+    phi = numpy.radians(numpy.asarray(lats, dtype=numpy.float64))
+    lam = numpy.radians(numpy.asarray(lons, dtype=numpy.float64))
+    cos_phi = numpy.cos(phi)
+    return numpy.column_stack(
+        (cos_phi * numpy.cos(lam), cos_phi * numpy.sin(lam), numpy.sin(phi))
+    )
+
+
+def chord_to_nm(chord):
+    return 2 * EARTH_RADIUS_NM * numpy.arcsin(numpy.minimum(chord / 2, 1))
+
+
+def nm_to_chord(distance_nm):
+    return 2 * numpy.sin(distance_nm / EARTH_RADIUS_NM / 2)
+
+
+class AirportLocator:
+    def __init__(self, codes, lats, lons):
+        # scipy is imported on first use to keep the startup fast
+        from scipy.spatial import cKDTree
+
+        self.codes = numpy.asarray(codes, dtype=object)
+        self.tree = cKDTree(to_unit_vectors(lats, lons))
+
+    def __len__(self):
+        return len(self.codes)
+
+    def nearest(
+        self, lat, lon, max_distance_nm=MAX_AIRPORT_DISTANCE_NM
+    ) -> tuple[str | None, float]:
+        """
+        Returns the code and distance (nm) of the nearest airport or None,
+        if there is no airport within max_distance_nm.
+        """
+        phi = math.radians(lat)
+        lam = math.radians(lon)
+        point = (
+            math.cos(phi) * math.cos(lam),
+            math.cos(phi) * math.sin(lam),
+            math.sin(phi),
+        )
+        chord, position = self.tree.query(
+            point,
+            distance_upper_bound=2
+            * math.sin(max_distance_nm / EARTH_RADIUS_NM / 2),
+        )
+        if position == len(self.codes):
+            return None, float("inf")
+        distance = 2 * EARTH_RADIUS_NM * math.asin(min(chord / 2, 1))
+        return self.codes[position], distance
+
+    def nearest_many(
+        self, lats, lons, max_distance_nm=MAX_AIRPORT_DISTANCE_NM, workers=-1
+    ):
+        """
+        Vectorized variant of nearest. Returns arrays of codes (None if not
+        resolved) and distances.
+        """
+        chords, positions = self.tree.query(
+            to_unit_vectors(lats, lons),
+            distance_upper_bound=nm_to_chord(max_distance_nm),
+            workers=workers,
+        )
+        found = positions < len(self.codes)
+        codes = numpy.full(len(positions), None, dtype=object)
+        codes[found] = self.codes[positions[found]]
+        return codes, chord_to_nm(chords)
+
+
+def locatable_airports(rows):
+    """
+    Returns the codes, latitudes and longitudes of the airport rows (code,
+    type, lat, lon) positions are resolved to.
+    """
+    rows = [
+        (code, lat, lon)
+        for code, airport_type, lat, lon in rows
+        if airport_type not in EXCLUDED_AIRPORT_TYPES
+    ]
+    return tuple(zip(*rows)) if rows else ((), (), ())
+
+
+airport_locator: AirportLocator | None = None
+# incremented on every build, so worker processes know when to rebuild
+airport_locator_version = 0
+
+
+def build_airport_locator() -> AirportLocator:
+    global airport_locator, airport_locator_version
+    start = timer()
+    with Session(get_engine()) as session:
+        rows = session.exec(
+            text(AIRPORT_POSITIONS_QUERY)  # type: ignore
+        ).all()
+    airport_locator = AirportLocator(*locatable_airports(rows))
+    airport_locator_version += 1
+    logger.info(
+        "Built airport locator with {:d} airports in {:.2f}s".format(
+            len(airport_locator), timer() - start
+        )
+    )
+    return airport_locator
+
+
+def resolve_airport(lat, lon) -> str | None:
+    """
+    Returns the code of the airport nearest to the position, if the
+    locator has been built and an airport is close enough.
+    """
+    if airport_locator is None or len(airport_locator) == 0:
+        return None
+    code, _ = airport_locator.nearest(lat, lon)
+    return code
+
+
+BACKFILL_QUERY = """
+SELECT ps.id, ST_Y(t.geometry), ST_X(t.geometry)
+FROM pilotsession ps
+JOIN pilottrack t ON t."pilotSessionId" = ps.id
+WHERE t.timestamp = ps.{time_column} + interval '{offset}'
+  AND ps.{id_column} IS NULL
+  AND ps.{time_column} >= :start AND ps.{time_column} < :end
+"""
+
+
+def backfill_actual_airports(start, end):
+    """
+    Resolves the actual departure and arrival airports of all sessions in
+    the time range that do not have them yet.
+    """
+    locator = airport_locator or build_airport_locator()
+    begin = timer()
+    columns = [
+        # takeoffTime is set one minute before the initial climb track
+        ('"takeoffTime"', '"actualDepartureId"', "1 minute"),
+        ('"landingTime"', '"actualArrivalId"', "0 minutes"),
+    ]
+    updated = 0
+    with Session(get_engine()) as session:
+        for time_column, id_column, offset in columns:
+            query = BACKFILL_QUERY.format(
+                time_column=time_column, id_column=id_column, offset=offset
+            )
+            rows = session.exec(
+                text(query),  # type: ignore
+                params={"start": start, "end": end},
+            ).all()
+            if not rows:
+                continue
+            ids, lats, lons = zip(*rows)
+            codes, _ = locator.nearest_many(lats, lons)
+            params = [
+                {"id": session_id, "code": code}
+                for session_id, code in zip(ids, codes)
+                if code is not None
+            ]
+            if params:
+                session.connection().execute(
+                    text(
+                        f"UPDATE pilotsession SET {id_column} = :code "
+                        "WHERE id = :id"
+                    ),
+                    params,
+                )
+                updated += len(params)
+        session.commit()
+    logger.info(
+        "Resolved {:d} actual airports in {:.2f}s".format(
+            updated, timer() - begin
+        )
+    )
@@ -0,0 +1,291 @@
+"""
+Prometheus metrics for the snapshot import and the airport sync.
+
+The metrics are rendered in the Prometheus text format and served on
+`/metrics` when the http server is enabled in the config.
+"""
+
+import threading
+from contextlib import contextmanager
+from timeit import default_timer as timer
+
+from ivao_tracker.service.http import Response, route
+
+_registry = []
+
+DEFAULT_BUCKETS = (
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    20.0,
+    30.0,
+    60.0,
+)
+
+
+def _format_labels(labelnames, values, extra=None):
+    pairs = list(zip(labelnames, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    inner = ",".join(
+        '{:s}="{:s}"'.format(name, str(value).replace('"', '\\"'))
+        for name, value in pairs
+    )
+    return "{" + inner + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+        _registry.append(self)
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(
+                "Expected labels {} for {}".format(self.labelnames, self.name)
+            )
+        return tuple(labels[name] for name in self.labelnames)
+
+    def render(self):
+        lines = [
+            "# HELP {:s} {:s}".format(self.name, self.documentation),
+            "# TYPE {:s} {:s}".format(self.name, self.kind),
+        ]
+        with self._lock:
+            lines.extend(self._render_samples())
+        return lines
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+    def _render_samples(self):
+        if not self._values and not self.labelnames:
+            self._values[()] = 0
+        return [
+            "{:s}{:s} {:s}".format(
+                self.name,
+                _format_labels(self.labelnames, key),
+                _format_value(value),
+            )
+            for key, value in sorted(self._values.items())
+        ]
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def value(self, **labels):
+        return self._values.get(self._key(labels))
+
+    def _render_samples(self):
+        return [
+            "{:s}{:s} {:s}".format(
+                self.name,
+                _format_labels(self.labelnames, key),
+                _format_value(value),
+            )
+            for key, value in sorted(self._values.items())
+        ]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.get(
+                key, ([0] * len(self.buckets), 0.0)
+            )
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            self._values[key] = (counts, total + value)
+
+    @contextmanager
+    def time(self, **labels):
+        start = timer()
+        try:
+            yield
+        finally:
+            self.observe(timer() - start, **labels)
+
+    def _render_samples(self):
+        lines = []
+        for key, (counts, total) in sorted(self._values.items()):
+            for bound, count in zip(self.buckets, counts):
+                labels = _format_labels(
+                    self.labelnames, key, ("le", _format_value(bound))
+                )
+                lines.append(
+                    "{:s}_bucket{:s} {:d}".format(self.name, labels, count)
+                )
+            labels = _format_labels(self.labelnames, key)
+            lines.append(
+                "{:s}_sum{:s} {:s}".format(
+                    self.name, labels, _format_value(total)
+                )
+            )
+            lines.append(
+                "{:s}_count{:s} {:d}".format(self.name, labels, counts[-1])
+            )
+        return lines
+
+
+def render() -> str:
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+def counter_values() -> dict:
+    """
+    Returns the values of all counters, e.g. to pass them from a worker
+    process to add_counter_values of the main process.
+    """
+    return {
+        (metric.name, key): value
+        for metric in _registry
+        if isinstance(metric, Counter)
+        for key, value in list(metric._values.items())
+    }
+
+
+def add_counter_values(values: dict):
+    counters = {m.name: m for m in _registry if isinstance(m, Counter)}
+    for (name, key), amount in values.items():
+        counter = counters[name]
+        with counter._lock:
+            counter._values[key] = counter._values.get(key, 0) + amount
+
+
+@route("/metrics")
+def metrics_endpoint(request):
+    return Response(
+        200, "text/plain; version=0.0.4; charset=utf-8", render().encode()
+    )
+
+
+import_duration = Histogram(
+    "ivao_tracker_import_duration_seconds",
+    "Duration of the snapshot import stages.",
+    ["stage"],
+)
+airport_sync_duration = Histogram(
+    "ivao_tracker_airport_sync_duration_seconds",
+    "Duration of the airport sync.",
+    buckets=(1.0, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0),
+)
+pilot_sessions = Counter(
+    "ivao_tracker_pilot_sessions_total",
+    "Pilot sessions processed by the importer.",
+    ["kind"],
+)
+tracks_written = Counter(
+    "ivao_tracker_tracks_written_total",
+    "Pilot tracks written to the database.",
+)
+airport_cache = Counter(
+    "ivao_tracker_airport_cache_total",
+    "Lookups of the known airports cache.",
+    ["result"],
+)
+snapshots_imported = Counter(
+    "ivao_tracker_snapshots_imported_total",
+    "Snapshots imported into the database.",
+)
+snapshots_skipped = Counter(
+    "ivao_tracker_snapshots_skipped_total",
+    "Import cycles skipped because no update was available.",
+)
+missed_ticks = Counter(
+    "ivao_tracker_schedule_missed_ticks_total",
+    "Scheduled ticks skipped because a task was behind schedule.",
+    ["task"],
+)
+snapshot_age = Histogram(
+    "ivao_tracker_snapshot_age_seconds",
+    "Age of new snapshots when they have been fetched.",
+    buckets=(0.5, 1.0, 2.0, 3.0, 5.0, 7.5, 10.0, 15.0, 20.0, 30.0, 60.0),
+)
+upstream_period = Gauge(
+    "ivao_tracker_upstream_period_seconds",
+    "Estimated update period of the upstream snapshots.",
+)
+last_snapshot_timestamp = Gauge(
+    "ivao_tracker_last_snapshot_timestamp_seconds",
+    "The updatedAt value of the last imported snapshot.",
+)
+spooled_snapshots = Gauge(
+    "ivao_tracker_spooled_snapshots",
+    "Snapshots waiting in the spool to be imported.",
+)
+quarantined_pilots = Counter(
+    "ivao_tracker_quarantined_pilots_total",
+    "Pilots moved to the dead-letter table because they failed to import.",
+)
+history_lookup_duration = Histogram(
+    "ivao_tracker_history_lookup_duration_seconds",
+    "Duration of the point-in-time position lookups.",
+    ["kind"],
+    buckets=(0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.25, 0.5, 1.0),
+)
+leader = Gauge(
+    "ivao_tracker_leader",
+    "1 if this replica holds the advisory lock of the task.",
+    ["task"],
+)
+tile_requests = Counter(
+    "ivao_tracker_tile_requests_total",
+    "Vector tile requests by layer, served from the cache or rendered.",
+    ["layer", "result"],
+)
+tile_render_duration = Histogram(
+    "ivao_tracker_tile_render_duration_seconds",
+    "Duration of rendering the vector tiles on a cache miss.",
+    ["layer"],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5),
+)
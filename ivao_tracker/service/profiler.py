@@ -0,0 +1,201 @@
+"""
+Opt-in profiling of slow import and sync cycles.
+
+While a profiled cycle runs, a sampling thread collects the call stacks of
+the cycle's thread and SQLAlchemy events collect statement counts and
+timings. The collected data is only written to disk if the cycle exceeded
+the configured threshold.
+"""
+
+import cProfile
+import functools
+import logging
+import os
+import sys
+import threading
+import tracemalloc
+from collections import Counter
+from datetime import UTC, datetime
+from timeit import default_timer as timer
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from ivao_tracker.config.loader import config
+
+logger = logging.getLogger(__name__)
+
+_collectors = threading.local()
+_cprofile_lock = threading.Lock()
+_sql_listeners_installed = False
+
+
+def profiler_config():
+    return config.config.get("profiler", {})
+
+
+class _StackSampler(threading.Thread):
+    """
+    Samples the stack of a thread and counts collapsed stacks, which can be
+    rendered by flamegraph tools.
+    """
+
+    def __init__(self, thread_id, interval):
+        super().__init__(daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(
+                    "{:s}:{:s}".format(
+                        os.path.basename(code.co_filename), code.co_name
+                    )
+                )
+                frame = frame.f_back
+            self.stacks[";".join(reversed(stack))] += 1
+
+    def stop(self):
+        self._stopped.set()
+        self.join()
+
+
+class _SqlStats:
+    def __init__(self):
+        self.counts = Counter()
+        self.durations = Counter()
+
+    def record(self, statement, duration):
+        key = " ".join(statement.split())[:200]
+        self.counts[key] += 1
+        self.durations[key] += duration
+
+
+def _before_cursor_execute(conn, cursor, statement, *args):
+    if getattr(_collectors, "sql", None) is not None:
+        conn.info.setdefault("profiler_start", []).append(timer())
+
+
+def _after_cursor_execute(conn, cursor, statement, *args):
+    sql_stats = getattr(_collectors, "sql", None)
+    if sql_stats is not None and conn.info.get("profiler_start"):
+        start = conn.info["profiler_start"].pop()
+        sql_stats.record(statement, timer() - start)
+
+
+def _install_sql_listeners():
+    global _sql_listeners_installed
+    if not _sql_listeners_installed:
+        event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+        _sql_listeners_installed = True
+
+
+def profiled(task):
+    """
+    Decorator that profiles the decorated task if the profiler is enabled
+    and dumps the profile if the task exceeded the configured threshold.
+    """
+
+    @functools.wraps(task)
+    def wrapper(*args, **kwargs):
+        cfg = profiler_config()
+        if not cfg.get("enabled", False):
+            return task(*args, **kwargs)
+
+        _install_sql_listeners()
+        sampler = _StackSampler(
+            threading.get_ident(), cfg.get("sample_interval", 0.005)
+        )
+        sql_stats = _SqlStats()
+        _collectors.sql = sql_stats
+
+        # only a single cProfile profiler can be active at a time
+        profile = None
+        if cfg.get("cprofile", False) and _cprofile_lock.acquire(False):
+            profile = cProfile.Profile()
+
+        started_tracemalloc = False
+        if cfg.get("tracemalloc", False) and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            started_tracemalloc = True
+
+        sampler.start()
+        if profile:
+            profile.enable()
+        start = timer()
+        try:
+            return task(*args, **kwargs)
+        finally:
+            duration = timer() - start
+            if profile:
+                profile.disable()
+                _cprofile_lock.release()
+            sampler.stop()
+            _collectors.sql = None
+
+            memory = None
+            if started_tracemalloc:
+                if duration > cfg.get("threshold", 10.0):
+                    memory = tracemalloc.take_snapshot()
+                tracemalloc.stop()
+
+            if duration > cfg.get("threshold", 10.0):
+                dump_profile(
+                    cfg.get("directory", "profiles"),
+                    task.__name__,
+                    duration,
+                    sampler.stacks,
+                    sql_stats,
+                    profile,
+                    memory,
+                )
+
+    return wrapper
+
+
+def dump_profile(
+    directory, name, duration, stacks, sql_stats, profile=None, memory=None
+):
+    os.makedirs(directory, exist_ok=True)
+    stamp = datetime.now(UTC).strftime("%Y%m%dT%H%M%S")
+    base = os.path.join(directory, f"{name}-{stamp}")
+
+    with open(base + ".collapsed", "w") as collapsed:
+        for stack, count in stacks.most_common():
+            collapsed.write(f"{stack} {count}\n")
+
+    with open(base + ".sql.txt", "w") as sql:
+        sql.write(
+            "{:d} statements in {:.3f}s\n\n".format(
+                sum(sql_stats.counts.values()),
+                sum(sql_stats.durations.values()),
+            )
+        )
+        for statement, total in sql_stats.durations.most_common():
+            sql.write(
+                "{:8d} {:10.3f}s  {:s}\n".format(
+                    sql_stats.counts[statement], total, statement
+                )
+            )
+
+    if profile:
+        profile.dump_stats(base + ".pstats")
+
+    if memory:
+        with open(base + ".tracemalloc.txt", "w") as allocations:
+            for stat in memory.statistics("lineno")[:50]:
+                allocations.write(f"{stat}\n")
+
+    logger.warning(
+        "%s took %.2fs. Dumped profile to %s.*", name, duration, base
+    )
+    return base
@@ -0,0 +1,177 @@
+"""
+Replays historical whazzup snapshots into the database.
+
+Snapshots are read from a directory of whazzup json files (optionally
+gzipped) or from a snapshot archive. They are decoded in parallel by a
+process pool and imported in `updatedAt` order by the regular import
+pipeline.
+"""
+
+import glob
+import gzip
+import logging
+import os
+import re
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from timeit import default_timer as timer
+
+from msgspec import json
+
+from ivao_tracker.model.json import JsonSnapshot
+from ivao_tracker.service.archive import SEGMENT_PREFIX, SnapshotArchive
+from ivao_tracker.service.ivao import import_snapshot
+
+logger = logging.getLogger(__name__)
+
+UPDATED_AT_PATTERN = re.compile(rb'"updatedAt"\s*:\s*("[^"]+")')
+
+
+def _open(path):
+    if path.endswith(".gz"):
+        return gzip.open(path, "rb")
+    return open(path, "rb")
+
+
+def peek_updated_at(path) -> datetime:
+    """
+    Reads the updatedAt value of a whazzup file without decoding it.
+    """
+    with _open(path) as snapshot_file:
+        head = snapshot_file.read(4096)
+    match = UPDATED_AT_PATTERN.search(head)
+    if match:
+        return json.decode(match.group(1), type=datetime)
+    return decode_snapshot_file(path).updatedAt
+
+
+def decode_snapshot_file(path) -> JsonSnapshot:
+    with _open(path) as snapshot_file:
+        return json.decode(snapshot_file.read(), type=JsonSnapshot)
+
+
+def decode_snapshot(raw: bytes) -> JsonSnapshot:
+    return json.decode(raw, type=JsonSnapshot)
+
+
+def read_checkpoint(path) -> datetime | None:
+    if path and os.path.exists(path):
+        with open(path, "rb") as checkpoint:
+            return json.decode(checkpoint.read().strip(), type=datetime)
+    return None
+
+
+def write_checkpoint(path, updated_at: datetime):
+    if path:
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as checkpoint:
+            checkpoint.write(json.encode(updated_at))
+        os.replace(tmp_path, path)
+
+
+def is_archive(source) -> bool:
+    pattern = os.path.join(source, SEGMENT_PREFIX + "*.idx")
+    return os.path.isdir(source) and len(glob.glob(pattern)) > 0
+
+
+def _json_tasks(source, start):
+    if os.path.isdir(source):
+        paths = glob.glob(os.path.join(source, "*.json")) + glob.glob(
+            os.path.join(source, "*.json.gz")
+        )
+    else:
+        paths = [source]
+
+    snapshots = {}
+    for path in paths:
+        updated_at = peek_updated_at(path)
+        if start is None or updated_at > start:
+            snapshots.setdefault(updated_at, path)
+
+    for updated_at in sorted(snapshots):
+        yield updated_at, decode_snapshot_file, snapshots[updated_at]
+
+
+def _archive_tasks(source, start):
+    for updated_at, raw in SnapshotArchive(source).iter(start=start):
+        yield updated_at, decode_snapshot, raw
+
+
+def _decoded_snapshots(executor, tasks, prefetch):
+    """
+    Decodes the snapshots in the process pool while keeping their order.
+    """
+    pending = deque()
+    for _, decoder, argument in tasks:
+        pending.append(executor.submit(decoder, argument))
+        if len(pending) >= prefetch:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def _log_progress(msgTpl, nr_of_snapshots, nr_of_rows, duration):
+    logger.info(
+        msgTpl.format(
+            nr_of_snapshots,
+            duration,
+            nr_of_snapshots / duration if duration else 0,
+            nr_of_rows / duration if duration else 0,
+        )
+    )
+
+
+def replay(source, workers=None, checkpoint=None, prefetch=None) -> bool:
+    """
+    Imports all snapshots of the source in updatedAt order as fast as
+    possible. The updatedAt of the last imported snapshot is written to the
+    checkpoint file, so an interrupted replay resumes after it. The
+    snapshots are not published, the live state and the events of a running
+    importer are left alone.
+    """
+    start = read_checkpoint(checkpoint)
+    if start:
+        logger.info("Resuming replay after %s", start.isoformat())
+
+    if is_archive(source):
+        tasks = _archive_tasks(source, start)
+    else:
+        tasks = _json_tasks(source, start)
+
+    workers = workers or os.cpu_count() or 1
+    prefetch = prefetch or workers * 2
+
+    nr_of_snapshots = 0
+    nr_of_rows = 0
+    replay_start = timer()
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for json_snapshot in _decoded_snapshots(executor, tasks, prefetch):
+            if not import_snapshot(json_snapshot, publish=False):
+                logger.error(
+                    "Could not import snapshot %s. Stopping replay.",
+                    json_snapshot.updatedAt.isoformat(),
+                )
+                return False
+            write_checkpoint(checkpoint, json_snapshot.updatedAt)
+
+            nr_of_snapshots += 1
+            nr_of_rows += len(json_snapshot.clients.pilots)
+            if nr_of_snapshots % 100 == 0:
+                _log_progress(
+                    "Replayed {:d} snapshots in {:.2f}s "
+                    "({:.2f} snapshots/s, {:.0f} rows/s)",
+                    nr_of_snapshots,
+                    nr_of_rows,
+                    timer() - replay_start,
+                )
+
+    _log_progress(
+        "Finished replay of {:d} snapshots in {:.2f}s "
+        "({:.2f} snapshots/s, {:.0f} rows/s)",
+        nr_of_snapshots,
+        nr_of_rows,
+        timer() - replay_start,
+    )
+    return True
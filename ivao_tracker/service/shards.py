@@ -0,0 +1,145 @@
+"""
+Sharded import of the pilots with one writer process per shard.
+
+The pilots of a snapshot are split by `id % nr_of_shards`. Every shard is
+served by its own single process executor, so a process always gets the
+same pilots and keeps its caches and its database connection. The shards
+write their part in a prepared transaction (PREPARE TRANSACTION), which the
+coordinator commits only when all shards succeeded.
+
+Postgres has to allow prepared transactions, i.e. `max_prepared_transactions`
+has to be at least the number of shards plus one.
+"""
+
+import logging
+import multiprocessing
+import re
+from concurrent.futures import ProcessPoolExecutor, wait
+
+from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError
+from sqlmodel import Session
+
+from ivao_tracker.model.sql import Snapshot
+from ivao_tracker.service.sql import get_engine
+
+logger = logging.getLogger(__name__)
+
+XID_PREFIX = "ivao_tracker"
+XID_PATTERN = re.compile(r"^ivao_tracker-(\d+)-(\w+)$")
+
+
+def prepared_xid(snapshot_id: int, part) -> str:
+    return "{:s}-{:d}-{}".format(XID_PREFIX, snapshot_id, part)
+
+
+def prepare_transaction(session, xid: str):
+    """
+    Flushes the session and prepares its transaction for the commit by the
+    coordinator. The session must not be used afterwards.
+    """
+    if not XID_PATTERN.match(xid):
+        raise ValueError("Invalid transaction id " + xid)
+    session.flush()
+    session.connection().exec_driver_sql(
+        "PREPARE TRANSACTION '{:s}'".format(xid)
+    )
+
+
+def _finish_prepared(command: str, xids):
+    failed = []
+    # COMMIT/ROLLBACK PREPARED cannot run inside a transaction block
+    with (
+        get_engine()
+        .connect()
+        .execution_options(isolation_level="AUTOCOMMIT") as connection
+    ):
+        for xid in xids:
+            try:
+                connection.exec_driver_sql(
+                    "{:s} PREPARED '{:s}'".format(command, xid)
+                )
+            except SQLAlchemyError as e:
+                logger.error("%s PREPARED %s failed: %s", command, xid, e)
+                failed.append(xid)
+    return failed
+
+
+def commit_prepared(xids) -> list[str]:
+    """
+    Commits the prepared transactions. Returns the failed ones.
+    """
+    return _finish_prepared("COMMIT", xids)
+
+
+def rollback_prepared(xids) -> list[str]:
+    return _finish_prepared("ROLLBACK", xids)
+
+
+def delete_snapshot(snapshot_id: int):
+    with Session(get_engine()) as session:
+        snapshot = session.get(Snapshot, snapshot_id)
+        if snapshot is not None:
+            session.delete(snapshot)
+            session.commit()
+
+
+def recover_prepared():
+    """
+    Rolls back the prepared transactions left by a crashed coordinator and
+    removes their snapshots.
+    """
+    with get_engine().connect() as connection:
+        xids = connection.execute(
+            text("SELECT gid FROM pg_prepared_xacts WHERE gid LIKE :prefix"),
+            {"prefix": XID_PREFIX + "-%"},
+        ).scalars()
+        xids = list(xids)
+    if not xids:
+        return
+    logger.warning("Rolling back %d prepared transactions", len(xids))
+    rollback_prepared(xids)
+    for snapshot_id in {int(XID_PATTERN.match(x).group(1)) for x in xids}:
+        delete_snapshot(snapshot_id)
+
+
+class ShardError(Exception):
+    pass
+
+
+class ShardedImporter:
+    def __init__(self, nr_of_shards: int, initializer=None, initargs=()):
+        self.nr_of_shards = nr_of_shards
+        # spawn, the workers must not share the parent's connections
+        context = multiprocessing.get_context("spawn")
+        self.executors = [
+            ProcessPoolExecutor(
+                max_workers=1,
+                mp_context=context,
+                initializer=initializer,
+                initargs=initargs,
+            )
+            for _ in range(nr_of_shards)
+        ]
+
+    def split(self, pilots) -> list[list]:
+        shards = [[] for _ in range(self.nr_of_shards)]
+        for pilot in pilots:
+            shards[pilot.id % self.nr_of_shards].append(pilot)
+        return shards
+
+    def map(self, worker, jobs) -> list:
+        """
+        Runs worker(job) for each shard's job in its process. Returns the
+        results, which are the raised exceptions for failed shards.
+        """
+        futures = [
+            executor.submit(worker, job)
+            for executor, job in zip(self.executors, jobs)
+        ]
+        wait(futures)
+        return [future.exception() or future.result() for future in futures]
+
+    def shutdown(self):
+        for executor in self.executors:
+            executor.shutdown()
@@ -0,0 +1,171 @@
+"""
+Write-ahead spool of decoded snapshots.
+
+Snapshots that could not be imported (e.g. while the database is down or
+the importer falls behind) are stored as msgpack files named by their
+`updatedAt` (in microseconds since epoch) and imported in order, in batches,
+once the database is healthy again. While the spool is not empty, new
+snapshots are appended to it as well, so the order of the imports is kept.
+"""
+
+import glob
+import logging
+import os
+from timeit import default_timer as timer
+
+from msgspec import msgpack
+
+from ivao_tracker.config.loader import config
+from ivao_tracker.model.json import JsonSnapshot
+from ivao_tracker.service import metrics
+from ivao_tracker.service.archive import to_micros
+from ivao_tracker.service.context import app_context
+
+logger = logging.getLogger(__name__)
+
+SPOOL_SUFFIX = ".msgpack"
+
+
+class SnapshotSpool:
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.failed_directory = os.path.join(directory, "failed")
+        os.makedirs(self.failed_directory, exist_ok=True)
+        self._encoder = msgpack.Encoder()
+        self._decoder = msgpack.Decoder(type=JsonSnapshot)
+
+    def _path(self, key: int) -> str:
+        return os.path.join(
+            self.directory, "{:020d}{:s}".format(key, SPOOL_SUFFIX)
+        )
+
+    def pending(self) -> list[str]:
+        """
+        Returns the paths of the spooled snapshots, oldest first.
+        """
+        return sorted(
+            glob.glob(os.path.join(self.directory, "*" + SPOOL_SUFFIX))
+        )
+
+    def rejected(self) -> list[str]:
+        return sorted(
+            glob.glob(os.path.join(self.failed_directory, "*" + SPOOL_SUFFIX))
+        )
+
+    def __len__(self):
+        return len(self.pending())
+
+    def append(self, json_snapshot: JsonSnapshot) -> bool:
+        """
+        Spools the snapshot. Returns False if it has been spooled before.
+        """
+        path = self._path(to_micros(json_snapshot.updatedAt))
+        if os.path.exists(path):
+            return False
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as spool_file:
+            spool_file.write(self._encoder.encode(json_snapshot))
+        os.replace(tmp_path, path)
+        return True
+
+    def read(self, path: str) -> JsonSnapshot:
+        with open(path, "rb") as spool_file:
+            return self._decoder.decode(spool_file.read())
+
+    def remove(self, path: str):
+        os.remove(path)
+
+    def reject(self, path: str):
+        """
+        Moves a snapshot that cannot be imported out of the spool.
+        """
+        os.replace(
+            path, os.path.join(self.failed_directory, os.path.basename(path))
+        )
+
+
+def open_spool(directory: str) -> SnapshotSpool:
+    spool = SnapshotSpool(directory)
+    metrics.spooled_snapshots.set(len(spool))
+    return spool
+
+
+def get_spool() -> SnapshotSpool | None:
+    """
+    Returns the spool of the app context or None if spooling is disabled.
+    """
+    spool_cfg = config.config.get("spool", {})
+    if not spool_cfg.get("enabled", False):
+        return None
+    return app_context().resource(
+        "spool", lambda: open_spool(spool_cfg.get("directory", "spool"))
+    )
+
+
+def spool_snapshot(spool: SnapshotSpool, json_snapshot: JsonSnapshot):
+    if spool.append(json_snapshot):
+        logger.warning(
+            "Spooled snapshot %s", json_snapshot.updatedAt.isoformat()
+        )
+    metrics.spooled_snapshots.set(len(spool))
+
+
+def drain_spool(
+    spool: SnapshotSpool,
+    import_snapshot,
+    is_healthy,
+    budget=None,
+    import_batch=None,
+) -> int:
+    """
+    Imports the spooled snapshots in order until the spool is empty, an
+    import fails or the drain budget is used up. With import_batch, up to
+    `[spool] batch_size` snapshots are imported in one call (bulk mode), a
+    failed batch is retried one snapshot at a time. A snapshot that fails
+    while the database is healthy is moved to the failed directory, so it
+    does not block the spool. Returns the number of imported snapshots.
+    """
+    spool_cfg = config.config["spool"]
+    if budget is None:
+        budget = spool_cfg.get("drain_budget", 10.0)
+    batch_size = spool_cfg.get("batch_size", 20) if import_batch else 1
+    start = timer()
+    imported = 0
+    paths = spool.pending()
+    for batch_start in range(0, len(paths), batch_size):
+        if timer() - start > budget:
+            break
+        batch_end = batch_start + batch_size
+        batch = paths[batch_start:batch_end]
+        json_snapshots = [spool.read(path) for path in batch]
+        if len(batch) > 1 and import_batch(json_snapshots):
+            for path in batch:
+                spool.remove(path)
+            imported += len(batch)
+            continue
+
+        database_down = False
+        for path, json_snapshot in zip(batch, json_snapshots):
+            if import_snapshot(json_snapshot, publish=False):
+                spool.remove(path)
+                imported += 1
+            elif is_healthy():
+                logger.error("Rejected spooled snapshot %s", path)
+                spool.reject(path)
+            else:
+                database_down = True
+                break
+        if database_down:
+            break
+
+    pending = len(spool)
+    metrics.spooled_snapshots.set(pending)
+    if imported > 0:
+        duration = timer() - start
+        logger.info(
+            "Drained {:d} spooled snapshots in {:.2f}s "
+            "({:.1f} snapshots/s, {:d} pending)".format(
+                imported, duration, imported / duration, pending
+            )
+        )
+    return imported
@@ -1,13 +1,16 @@
+import hashlib
 import logging
 from datetime import UTC, datetime, timedelta
 from timeit import default_timer as timer
 
+from sqlalchemy import Engine, inspect
+from sqlalchemy.exc import SQLAlchemyError
 from sqlmodel import Session, SQLModel, create_engine, text
 
 from ivao_tracker.config.loader import config
-from ivao_tracker.config.logging import setup_logging
+from ivao_tracker.service.context import app_context
+from ivao_tracker.service.indexes import apply_index_profile, seal_partitions
 
-setup_logging()
 logger = logging.getLogger(__name__)
 
 
@@ -24,27 +27,114 @@ def get_db_url():
     )
 
 
-engine = create_engine(get_db_url(), echo=False)
+def create_db_engine() -> Engine:
+    # pre ping, so connections are replaced after a database outage
+    return create_engine(get_db_url(), echo=False, pool_pre_ping=True)
 
 
-def create_schema():
+def get_engine() -> Engine:
+    """
+    Returns the engine of the app context, which is created on first use.
+    """
+    return app_context().resource(
+        "engine", create_db_engine, lambda engine: engine.dispose()
+    )
+
+
+def database_is_healthy() -> bool:
+    try:
+        with get_engine().connect() as connection:
+            connection.execute(text("SELECT 1"))
+        return True
+    except SQLAlchemyError:
+        return False
+
+
+def lock_key(name: str) -> int:
+    """
+    Returns a stable signed 64 bit advisory lock key for the name.
+    """
+    digest = hashlib.blake2b(
+        ("ivao_tracker:" + name).encode(), digest_size=8
+    ).digest()
+    return int.from_bytes(digest, "big", signed=True)
+
+
+def create_schema(apply_indexes=False):
+    """
+    Creates the missing tables and columns. The index profile is applied to
+    new tables, and to existing ones only with apply_indexes (the
+    `create-schema` command), since building or dropping the indexes of a
+    filled table blocks the inserts.
+    """
     # time.sleep(2)
     start = timer()
 
-    SQLModel.metadata.create_all(engine)
+    engine = get_engine()
+    with engine.begin() as connection:
+        # replicas starting at the same time create the schema one by one
+        connection.execute(
+            text("SELECT pg_advisory_xact_lock(:key)"),
+            {"key": lock_key("schema")},
+        )
+        new_tables = not inspect(connection).has_table("pilottrack")
+        SQLModel.metadata.create_all(connection)
+        if apply_indexes or new_tables:
+            apply_index_profile(connection)
+    add_missing_columns(engine)
 
     end = timer()
     duration = end - start
     logger.info("Processed DB Schema in {:.2f}s".format(duration))
 
 
-def ensure_db_partitions():
-    today = datetime.now(UTC)
+def add_missing_columns(engine):
+    """
+    Adds columns of the models that are missing in existing tables, since
+    create_all only creates missing tables.
+    """
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+    with engine.begin() as connection:
+        for table in SQLModel.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+            existing_columns = {
+                c["name"] for c in inspector.get_columns(table.name)
+            }
+            for column in table.columns:
+                if column.name in existing_columns:
+                    continue
+                column_type = column.type.compile(engine.dialect)
+                ddl = 'ALTER TABLE {:s} ADD COLUMN IF NOT EXISTS "{:s}" {:s}'
+                ddl = ddl.format(table.name, column.name, column_type)
+                for fk in column.foreign_keys:
+                    ddl += ' REFERENCES {:s} ("{:s}")'.format(
+                        fk.column.table.name, fk.column.name
+                    )
+                connection.execute(text(ddl))
+                logger.info("Added column %s.%s", table.name, column.name)
+
+
+known_partitions: set[str] = set()
+
+
+def ensure_db_partitions(today: datetime | None = None):
+    """
+    Ensures that the partitions for the given day (default: today) and the
+    day before exist.
+    """
+    if today is None:
+        today = datetime.now(UTC)
     yesterday = today - timedelta(days=1)
 
     for date in [yesterday, today]:
-        if not pilottrack_partitions_exist(engine, date):
-            create_pilottrack_partitions(engine, date)
+        day_str = date.strftime("%Y%m%d")
+        if day_str in known_partitions:
+            continue
+        if not pilottrack_partitions_exist(get_engine(), date):
+            create_pilottrack_partitions(get_engine(), date)
+        known_partitions.add(day_str)
 
 
 def pilottrack_partitions_exist(engine, day: datetime) -> bool:
@@ -71,11 +161,60 @@ def pilottrack_partitions_exist(engine, day: datetime) -> bool:
     return len(result) == 2
 
 
+def pilottrack_partition(timestamp: datetime) -> str:
+    """
+    Returns the name of the partition holding the (UTC) timestamp.
+    """
+    if timestamp.hour < 6:
+        day = timestamp - timedelta(days=1)
+        return "pilottrack_{:s}_night".format(day.strftime("%Y%m%d"))
+    half = "day" if timestamp.hour < 18 else "night"
+    return "pilottrack_{:s}_{:s}".format(timestamp.strftime("%Y%m%d"), half)
+
+
+def pilottrack_partitions(start: datetime, end: datetime) -> list[str]:
+    """
+    Returns the names of the partitions holding the timestamps from start to
+    end (inclusive), whether they exist or not.
+    """
+    partitions = []
+    timestamp = start
+    while True:
+        partition = pilottrack_partition(timestamp)
+        if partition not in partitions:
+            partitions.append(partition)
+        if timestamp >= end:
+            return partitions
+        timestamp = min(timestamp + timedelta(hours=12), end)
+
+
+def pilottrack_source(partitions: list[str]) -> str:
+    """
+    Returns the FROM item of the given partitions, so the planner does not
+    consider the other partitions.
+    """
+    if len(partitions) == 1:
+        return partitions[0]
+    return "({:s}) tracks".format(
+        " UNION ALL ".join("SELECT * FROM " + p for p in partitions)
+    )
+
+
+def seal_pilottrack_partitions() -> int:
+    """
+    Creates the deferred GiST indexes of the sealed partitions.
+    """
+    return seal_partitions(get_engine())
+
+
 def create_pilottrack_partitions(engine, day: datetime):
     """
     Creates two partitions for the given day:
     - One from 06:00 - 17:59 (day)
     - One from 18:00 - 05:59 (night)
+
+    The partitions get the indexes of the partitioned table, i.e. of the
+    index profile. A deferred GiST index is added by sealing them later.
     """
     day_str = day.strftime("%Y%m%d")
     next_day = day + timedelta(days=1)
@@ -0,0 +1,135 @@
+"""
+Incrementally maintained per-flight summaries.
+
+Each pilot session has one FlightSummary row that is updated with every new
+track, so flight history queries do not have to aggregate the tracks.
+"""
+
+import logging
+from datetime import UTC, datetime
+
+from sqlmodel import select
+
+from ivao_tracker.model.constants import State
+from ivao_tracker.model.sql import FlightSummary, PilotSession
+from ivao_tracker.util.geo import haversine_nm
+
+logger = logging.getLogger(__name__)
+
+state_time_fields = {
+    State.BOARDING: "boardingTime",
+    State.DEPARTING: "departingTime",
+    State.INITIAL_CLIMB: "initialClimbTime",
+    State.EN_ROUTE: "enRouteTime",
+    State.APPROACH: "approachTime",
+    State.LANDED: "landedTime",
+    State.ON_BLOCKS: "onBlocksTime",
+}
+
+
+def load_active_flight_summaries(
+    session, shard=None
+) -> dict[int, FlightSummary]:
+    query = (
+        select(FlightSummary)
+        .join(PilotSession)
+        .where(PilotSession.isActive)  # type: ignore
+    )
+    if shard is not None:
+        nr_of_shards, index = shard
+        query = query.where(
+            FlightSummary.pilotSessionId % nr_of_shards == index
+        )
+    summaries = session.exec(query).all()
+    return {s.pilotSessionId: s for s in summaries}
+
+
+def create_flight_summary(json_pilot) -> FlightSummary:
+    lt = json_pilot.lastTrack
+    fp = json_pilot.flightPlan
+    return FlightSummary(
+        pilotSessionId=json_pilot.id,
+        callsign=json_pilot.callsign,
+        originId=fp.departureId if fp else None,
+        destinationId=fp.arrivalId if fp else None,
+        firstTimestamp=lt.timestamp,
+        lastTimestamp=lt.timestamp,
+        trackCount=1,
+        minAltitude=lt.altitude,
+        maxAltitude=lt.altitude,
+        minGroundSpeed=lt.groundSpeed,
+        maxGroundSpeed=lt.groundSpeed,
+        lastLatitude=lt.latitude,
+        lastLongitude=lt.longitude,
+        lastState=State(lt.state),
+    )
+
+
+def naive_utc(time: datetime) -> datetime:
+    """
+    Returns the time as naive UTC, like the timestamps read from the
+    database.
+    """
+    if time.tzinfo is not None:
+        return time.astimezone(UTC).replace(tzinfo=None)
+    return time
+
+
+def update_flight_summary(summary: FlightSummary, json_pilot):
+    """
+    Accumulates the last track of the pilot into the summary.
+    """
+    lt = json_pilot.lastTrack
+    fp = json_pilot.flightPlan
+    if fp:
+        summary.originId = fp.departureId
+        summary.destinationId = fp.arrivalId
+    summary.isFinal = False
+
+    # the track is decoded with UTC, the stored summary is naive
+    timestamp = naive_utc(lt.timestamp)
+    last_timestamp = naive_utc(summary.lastTimestamp)
+    if timestamp <= last_timestamp:
+        # no new position since the last snapshot
+        return
+
+    seconds = round((timestamp - last_timestamp).total_seconds())
+    state_field = state_time_fields[summary.lastState]
+    setattr(summary, state_field, getattr(summary, state_field) + seconds)
+
+    summary.distance += haversine_nm(
+        summary.lastLatitude, summary.lastLongitude, lt.latitude, lt.longitude
+    )
+    summary.minAltitude = min(summary.minAltitude, lt.altitude)
+    summary.maxAltitude = max(summary.maxAltitude, lt.altitude)
+    summary.minGroundSpeed = min(summary.minGroundSpeed, lt.groundSpeed)
+    summary.maxGroundSpeed = max(summary.maxGroundSpeed, lt.groundSpeed)
+    summary.lastLatitude = lt.latitude
+    summary.lastLongitude = lt.longitude
+    summary.lastState = State(lt.state)
+    summary.lastTimestamp = lt.timestamp
+    summary.trackCount += 1
+
+
+def track_flight_summary(session, summaries, json_pilot):
+    """
+    Creates or updates the summary of the pilot's session.
+    """
+    if json_pilot.lastTrack is None:
+        return
+    summary = summaries.get(json_pilot.id)
+    if summary is None:
+        summary = session.get(FlightSummary, json_pilot.id)
+    if summary is None:
+        summary = create_flight_summary(json_pilot)
+        session.add(summary)
+    else:
+        update_flight_summary(summary, json_pilot)
+    summaries[json_pilot.id] = summary
+
+
+def finalize_flight_summary(summaries, pilot_session_id):
+    summary = summaries.get(pilot_session_id)
+    if summary is not None:
+        summary.isFinal = True
+        logger.debug("Finalized flight summary %d", pilot_session_id)
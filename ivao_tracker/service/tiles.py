@@ -0,0 +1,340 @@
+"""
+Vector tiles of the live traffic and of the traffic density.
+
+`/tiles/live/{z}/{x}/{y}.mvt` encodes the pilots of the live state in the
+tile as points, without touching the database.
+`/tiles/density/{z}/{x}/{y}.mvt?start=...&end=...` aggregates the tracks
+of the time range into a grid of cells with `ST_AsMVT`. The range is
+widened to whole time buckets (`[tiles] bucket` seconds), so a viewport
+reloaded with the same range hits the cache.
+
+The tiles are cached in an LRU keyed by the layer, z/x/y and the buckets
+(the snapshot for live tiles) and, if `[tiles] path` is set, the density
+tiles on disk as well. A committed snapshot only invalidates the cached
+density tiles that cover the buckets of its tracks.
+"""
+
+import logging
+import os
+import re
+import shutil
+import threading
+from collections import OrderedDict
+from datetime import UTC, datetime
+from typing import NamedTuple
+
+from sqlmodel import Session, text
+
+from ivao_tracker.config.loader import config
+from ivao_tracker.service import metrics
+from ivao_tracker.service.context import app_context
+from ivao_tracker.service.history import existing_partitions
+from ivao_tracker.service.http import Response, route
+from ivao_tracker.service.live import live_state
+from ivao_tracker.service.sql import (
+    get_engine,
+    pilottrack_partitions,
+    pilottrack_source,
+)
+from ivao_tracker.util.mvt import EXTENT, encode_points, project, tile_bounds
+
+logger = logging.getLogger(__name__)
+
+TILE_TYPE = "application/vnd.mapbox-vector-tile"
+TILE_PATH = re.compile(r"^/tiles/(live|density)/(\d+)/(\d+)/(\d+)\.mvt$")
+BUCKETS_DIR = re.compile(r"^(\d+)-(\d+)$")
+
+# web mercator width of the world in meters
+WORLD_SIZE = 2 * 20037508.342789244
+
+DENSITY_QUERY = """
+    WITH bounds AS (
+        SELECT ST_TileEnvelope(:z, :x, :y) AS merc,
+            ST_Transform(ST_TileEnvelope(:z, :x, :y), 4326) AS wgs84
+    ), cells AS (
+        SELECT ST_SnapToGrid(ST_Transform(geometry, 3857), :cell) AS cell,
+            count(*) AS samples,
+            count(DISTINCT "pilotSessionId") AS sessions
+        FROM {:s}, bounds
+        WHERE "timestamp" >= :start AND "timestamp" < :end
+        AND geometry && bounds.wgs84
+        GROUP BY cell
+    )
+    SELECT ST_AsMVT(tile, 'density', {:d}, 'geom') FROM (
+        SELECT ST_AsMVTGeom(cell, bounds.merc, {:d}, 0, true) AS geom,
+            samples, sessions
+        FROM cells, bounds
+    ) tile
+"""
+
+
+class TileKey(NamedTuple):
+    layer: str
+    z: int
+    x: int
+    y: int
+    # first and last bucket of a density tile, the epoch of the snapshot of
+    # a live tile
+    start: int
+    end: int
+
+
+def tiles_config():
+    return config.config.get("tiles", {})
+
+
+def bucket_size() -> int:
+    return tiles_config().get("bucket", 3600)
+
+
+class TileCache:
+    """
+    LRU of encoded tiles, the density tiles are kept on disk as well if a
+    path is given.
+    """
+
+    def __init__(self, max_entries: int = 4096, path: str | None = None):
+        self.max_entries = max_entries
+        self.path = path
+        self._tiles: OrderedDict[TileKey, bytes] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._tiles)
+
+    def _file(self, key: TileKey) -> str:
+        return os.path.join(
+            self.path,
+            "{:d}-{:d}".format(key.start, key.end),
+            str(key.z),
+            str(key.x),
+            "{:d}.mvt".format(key.y),
+        )
+
+    def get(self, key: TileKey) -> bytes | None:
+        with self._lock:
+            tile = self._tiles.get(key)
+            if tile is not None:
+                self._tiles.move_to_end(key)
+                return tile
+        if self.path is None or key.layer != "density":
+            return None
+        try:
+            with open(self._file(key), "rb") as tile_file:
+                tile = tile_file.read()
+        except FileNotFoundError:
+            return None
+        self._remember(key, tile)
+        return tile
+
+    def put(self, key: TileKey, tile: bytes):
+        self._remember(key, tile)
+        if self.path is None or key.layer != "density":
+            return
+        path = self._file(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = "{:s}.{:d}.tmp".format(path, threading.get_ident())
+        with open(tmp_path, "wb") as tile_file:
+            tile_file.write(tile)
+        os.replace(tmp_path, path)
+
+    def _remember(self, key: TileKey, tile: bytes):
+        with self._lock:
+            self._tiles[key] = tile
+            self._tiles.move_to_end(key)
+            while len(self._tiles) > self.max_entries:
+                self._tiles.popitem(last=False)
+
+    def invalidate(self, buckets) -> int:
+        """
+        Drops the live tiles and the density tiles covering one of the
+        buckets. Returns the number of dropped tiles in memory.
+        """
+        buckets = sorted(buckets)
+
+        def stale(start, end):
+            return any(start <= bucket <= end for bucket in buckets)
+
+        with self._lock:
+            keys = [
+                key
+                for key in self._tiles
+                if key.layer == "live" or stale(key.start, key.end)
+            ]
+            for key in keys:
+                del self._tiles[key]
+
+        if self.path is not None and os.path.isdir(self.path):
+            for name in os.listdir(self.path):
+                match = BUCKETS_DIR.match(name)
+                if match and stale(int(match.group(1)), int(match.group(2))):
+                    shutil.rmtree(
+                        os.path.join(self.path, name), ignore_errors=True
+                    )
+        return len(keys)
+
+
+def get_tile_cache() -> TileCache:
+    tiles_cfg = tiles_config()
+    return app_context().resource(
+        "tile_cache",
+        lambda: TileCache(
+            tiles_cfg.get("cache_size", 4096), tiles_cfg.get("path") or None
+        ),
+    )
+
+
+def invalidate_tiles(pilots) -> int:
+    """
+    Invalidates the cached tiles of the buckets of the pilots' tracks, after
+    their snapshot has been committed.
+    """
+    size = bucket_size()
+    buckets = {
+        int(p.lastTrack.timestamp.timestamp() // size)
+        for p in pilots
+        if p.lastTrack
+    }
+    return get_tile_cache().invalidate(buckets)
+
+
+def live_tile(z: int, x: int, y: int) -> bytes:
+    """
+    Returns the tile of the pilots of the live state.
+    """
+    pilots = live_state.pilots_in_bbox(*tile_bounds(z, x, y))
+    if not pilots:
+        return encode_points("pilots", [])
+    px, py = project(
+        [p.latitude for p in pilots], [p.longitude for p in pilots], z, x, y
+    )
+    return encode_points(
+        "pilots",
+        [
+            (
+                pilot.id,
+                px[i],
+                py[i],
+                {
+                    "callsign": pilot.callsign,
+                    "altitude": pilot.altitude,
+                    "heading": pilot.heading,
+                    "groundSpeed": pilot.groundSpeed,
+                    "onGround": pilot.onGround,
+                    "state": pilot.state,
+                    "aircraftId": pilot.aircraftId,
+                },
+            )
+            for i, pilot in enumerate(pilots)
+            # points on the right or bottom edge belong to the next tile
+            if 0 <= px[i] < EXTENT and 0 <= py[i] < EXTENT
+        ],
+    )
+
+
+def density_tile(z: int, x: int, y: int, start: int, end: int) -> bytes:
+    """
+    Returns the tile of the track density of the buckets start to end.
+    """
+    size = bucket_size()
+    # the partition bounds are naive UTC timestamps
+    start_time = datetime.fromtimestamp(start * size, UTC).replace(tzinfo=None)
+    end_time = datetime.fromtimestamp((end + 1) * size, UTC).replace(
+        tzinfo=None
+    )
+    cell = WORLD_SIZE / 2**z / tiles_config().get("density_grid", 64)
+    with Session(get_engine()) as session:
+        partitions = existing_partitions(
+            session, pilottrack_partitions(start_time, end_time)
+        )
+        if not partitions:
+            return b""
+        query = DENSITY_QUERY.format(
+            pilottrack_source(partitions), EXTENT, EXTENT
+        )
+        tile = session.exec(
+            text(query),  # type: ignore
+            params={
+                "z": z,
+                "x": x,
+                "y": y,
+                "cell": cell,
+                "start": start_time,
+                "end": end_time,
+            },
+        ).scalar()
+    return bytes(tile) if tile is not None else b""
+
+
+def parse_time(value: str) -> datetime:
+    time = datetime.fromisoformat(value)
+    if time.tzinfo is None:
+        time = time.replace(tzinfo=UTC)
+    return time
+
+
+def density_buckets(query: dict) -> tuple[int, int]:
+    """
+    Returns the first and the last bucket of the start and end of the
+    query, the range defaults to the bucket of start.
+    """
+    if "start" not in query:
+        raise ValueError("Expected start and optionally end")
+    size = bucket_size()
+    start = int(parse_time(query["start"]).timestamp() // size)
+    end = start
+    if "end" in query:
+        # end is exclusive
+        end = -int(-parse_time(query["end"]).timestamp() // size) - 1
+    if end < start:
+        raise ValueError("end must be after start")
+    max_buckets = tiles_config().get("max_buckets", 24)
+    if end - start + 1 > max_buckets:
+        raise ValueError(
+            "The range must not exceed {:d} buckets".format(max_buckets)
+        )
+    return start, end
+
+
+def tile_key(request) -> TileKey | None:
+    """
+    Returns the key of the requested tile, None if the path is not a tile.
+    """
+    match = TILE_PATH.match(request.path)
+    if match is None:
+        return None
+    layer = match.group(1)
+    z, x, y = (int(match.group(i)) for i in (2, 3, 4))
+    if z > tiles_config().get("max_zoom", 16) or x >= 2**z or y >= 2**z:
+        raise ValueError("Invalid tile {:d}/{:d}/{:d}".format(z, x, y))
+
+    if layer == "live":
+        traffic = live_state.traffic
+        if traffic is None:
+            return TileKey(layer, z, x, y, -1, -1)
+        epoch = int(traffic.updatedAt.timestamp())
+        return TileKey(layer, z, x, y, epoch, epoch)
+    return TileKey(layer, z, x, y, *density_buckets(request.query))
+
+
+@route("/tiles/", prefix=True)
+def tiles_endpoint(request):
+    key = tile_key(request)
+    if key is None:
+        return Response(404, "text/plain", b"Not found\n")
+    if key.start < 0:
+        return Response(503, "text/plain", b"No snapshot available\n")
+
+    cache = get_tile_cache()
+    tile = cache.get(key)
+    if tile is None:
+        metrics.tile_requests.inc(layer=key.layer, result="miss")
+        with metrics.tile_render_duration.time(layer=key.layer):
+            if key.layer == "live":
+                tile = live_tile(key.z, key.x, key.y)
+            else:
+                tile = density_tile(key.z, key.x, key.y, key.start, key.end)
+        cache.put(key, tile)
+    else:
+        metrics.tile_requests.inc(layer=key.layer, result="hit")
+    return Response(200, TILE_TYPE, tile, {"Cache-Control": "no-cache"})
@@ -0,0 +1,264 @@
+"""
+Hourly airport traffic rollups.
+
+The importer counts takeoffs and landings per airport and hour while it
+merges the pilot sessions and upserts the counts once per snapshot. The
+query functions only read from the rollup table.
+"""
+
+import logging
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import NamedTuple
+from timeit import default_timer as timer
+
+from sqlalchemy import text
+from sqlalchemy.dialects.postgresql import insert
+from sqlmodel import Session, func, select
+
+from ivao_tracker.model.constants import Continent
+from ivao_tracker.model.sql import AirportTrafficHourly
+from ivao_tracker.service.sql import get_engine
+
+logger = logging.getLogger(__name__)
+
+
+def hour_bucket(timestamp: datetime) -> datetime:
+    return timestamp.replace(minute=0, second=0, microsecond=0)
+
+
+def hour_range(start: datetime, end: datetime):
+    """
+    Returns the range of whole hours covering start to end.
+    """
+    hour_end = hour_bucket(end)
+    if hour_end < end:
+        hour_end += timedelta(hours=1)
+    return hour_bucket(start), hour_end
+
+
+def latest_flightplan(pilot_session):
+    if not pilot_session.flightplans:
+        return None
+    return max(
+        pilot_session.flightplans, key=lambda fp: (fp.createdAt, fp.revision)
+    )
+
+
+class AirportInfo(NamedTuple):
+    continent: Continent | None
+    iso_country: str | None
+
+
+class TrafficRollup:
+    """
+    Collects the departures and arrivals of a snapshot.
+    """
+
+    def __init__(self):
+        self.counts = defaultdict(lambda: [0, 0])
+        self.airports = {}
+
+    def _count(self, airport, timestamp, column):
+        if airport is None or timestamp is None:
+            return
+        self.counts[(airport.code, hour_bucket(timestamp))][column] += 1
+        self.airports[airport.code] = airport
+
+    def departure(self, pilot_session, timestamp):
+        fp = latest_flightplan(pilot_session)
+        if fp:
+            self._count(fp.departure, timestamp, 0)
+
+    def arrival(self, pilot_session, timestamp):
+        fp = latest_flightplan(pilot_session)
+        if fp:
+            self._count(fp.arrival, timestamp, 1)
+
+    def checkpoint(self):
+        return {k: list(v) for k, v in self.counts.items()}, dict(
+            self.airports
+        )
+
+    def restore(self, checkpoint):
+        counts, airports = checkpoint
+        # copied, the checkpoint stays valid for another restore
+        self.counts = defaultdict(
+            lambda: [0, 0], {k: list(v) for k, v in counts.items()}
+        )
+        self.airports = dict(airports)
+
+    def export(self):
+        """
+        Returns the counts and airports in a picklable form for merge.
+        """
+        return dict(self.counts), {
+            code: AirportInfo(airport.continent, airport.iso_country)
+            for code, airport in self.airports.items()
+        }
+
+    def merge(self, exported):
+        counts, airports = exported
+        for key, (departures, arrivals) in counts.items():
+            self.counts[key][0] += departures
+            self.counts[key][1] += arrivals
+        self.airports.update(airports)
+
+    def flush(self, session):
+        """
+        Adds the collected counts to the rollup table.
+        """
+        if not self.counts:
+            return
+        rows = [
+            {
+                "airportCode": code,
+                "hour": hour,
+                "continent": self.airports[code].continent,
+                "isoCountry": self.airports[code].iso_country,
+                "departures": departures,
+                "arrivals": arrivals,
+            }
+            for (code, hour), (departures, arrivals) in self.counts.items()
+        ]
+        table = AirportTrafficHourly.__table__
+        stmt = insert(table).values(rows)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c.airportCode, table.c.hour],
+            set_={
+                "departures": table.c.departures + stmt.excluded.departures,
+                "arrivals": table.c.arrivals + stmt.excluded.arrivals,
+            },
+        )
+        session.flush()
+        session.exec(stmt)  # type: ignore
+        self.counts.clear()
+
+
+def airport_traffic(airport_code, start, end):
+    """
+    Returns the hourly departures and arrivals of an airport.
+    """
+    with Session(get_engine()) as session:
+        return session.exec(
+            select(AirportTrafficHourly)
+            .where(AirportTrafficHourly.airportCode == airport_code)
+            .where(AirportTrafficHourly.hour >= start)
+            .where(AirportTrafficHourly.hour < end)
+            .order_by(AirportTrafficHourly.hour)  # type: ignore
+        ).all()
+
+
+def busiest_airports(start, end, limit=20, continent=None, iso_country=None):
+    """
+    Returns (airportCode, departures, arrivals, movements) of the airports
+    with the most movements in the given time range.
+    """
+    departures = func.sum(AirportTrafficHourly.departures)
+    arrivals = func.sum(AirportTrafficHourly.arrivals)
+    movements = departures + arrivals
+    query = (
+        select(
+            AirportTrafficHourly.airportCode,
+            departures.label("departures"),
+            arrivals.label("arrivals"),
+            movements.label("movements"),
+        )
+        .where(AirportTrafficHourly.hour >= start)
+        .where(AirportTrafficHourly.hour < end)
+    )
+    if continent is not None:
+        query = query.where(AirportTrafficHourly.continent == continent)
+    if iso_country is not None:
+        query = query.where(AirportTrafficHourly.isoCountry == iso_country)
+    query = (
+        query.group_by(AirportTrafficHourly.airportCode)
+        .order_by(movements.desc())
+        .limit(limit)
+    )
+    with Session(get_engine()) as session:
+        return session.exec(query).all()
+
+
+def traffic_by(column, start, end):
+    """
+    Returns (key, departures, arrivals) grouped by "continent" or
+    "isoCountry".
+    """
+    group = getattr(AirportTrafficHourly, column)
+    query = (
+        select(
+            group,
+            func.sum(AirportTrafficHourly.departures).label("departures"),
+            func.sum(AirportTrafficHourly.arrivals).label("arrivals"),
+        )
+        .where(AirportTrafficHourly.hour >= start)
+        .where(AirportTrafficHourly.hour < end)
+        .group_by(group)
+        .order_by(group)
+    )
+    with Session(get_engine()) as session:
+        return session.exec(query).all()
+
+
+BACKFILL_DELETE_QUERY = """
+DELETE FROM airporttraffichourly WHERE hour >= :start AND hour < :end
+"""
+
+BACKFILL_QUERY = """
+WITH latest_flightplan AS (
+    SELECT DISTINCT ON (fp."pilotSessionId")
+        fp."pilotSessionId", fp."departureId", fp."arrivalId"
+    FROM flightplan fp
+    ORDER BY fp."pilotSessionId", fp."createdAt" DESC, fp.revision DESC
+),
+movements AS (
+    SELECT lf."departureId" AS code,
+           date_trunc('hour', ps."takeoffTime") AS hour,
+           1 AS departures, 0 AS arrivals
+    FROM pilotsession ps
+    JOIN latest_flightplan lf ON lf."pilotSessionId" = ps.id
+    WHERE ps."takeoffTime" >= :start AND ps."takeoffTime" < :end
+      AND lf."departureId" IS NOT NULL
+    UNION ALL
+    SELECT lf."arrivalId" AS code,
+           date_trunc('hour', ps."landingTime") AS hour,
+           0 AS departures, 1 AS arrivals
+    FROM pilotsession ps
+    JOIN latest_flightplan lf ON lf."pilotSessionId" = ps.id
+    WHERE ps."landingTime" >= :start AND ps."landingTime" < :end
+      AND lf."arrivalId" IS NOT NULL
+)
+INSERT INTO airporttraffichourly
+    ("airportCode", hour, continent, "isoCountry", departures, arrivals)
+SELECT m.code, m.hour, a.continent, a.iso_country,
+       sum(m.departures), sum(m.arrivals)
+FROM movements m
+JOIN airport a ON a.code = m.code
+GROUP BY m.code, m.hour, a.continent, a.iso_country
+"""
+
+
+def backfill_airport_traffic(start, end):
+    """
+    Recomputes the rollups of the given time range from the pilot sessions.
+    The range is widened to whole hours, whose rows are replaced in one
+    transaction, so hours without movements anymore are cleared and partial
+    hours are not overwritten with the counts of a part of them.
+    """
+    begin = timer()
+    start, end = hour_range(start, end)
+    params = {"start": start, "end": end}
+    with Session(get_engine()) as session:
+        session.exec(
+            text(BACKFILL_DELETE_QUERY), params=params  # type: ignore
+        )
+        result = session.exec(
+            text(BACKFILL_QUERY), params=params  # type: ignore
+        )
+        session.commit()
+    logger.info(
+        "Backfilled {:d} airport traffic rows in {:.2f}s".format(
+            result.rowcount, timer() - begin
+        )
+    )
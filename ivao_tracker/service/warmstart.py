@@ -0,0 +1,165 @@
+"""
+Warm restart of the importer from a checkpoint of its in-process state.
+
+The importer periodically stores the id and `updatedAt` of the last
+imported snapshot, its airport code resolutions and the pilots of the last
+published snapshot (the events baseline) as msgpack. On boot, the checkpoint
+is validated against the snapshots in the database: it is dropped if its
+snapshot has been rolled back (cold start), and the events baseline is only
+restored if no other snapshot has been imported since.
+"""
+
+import logging
+import os
+from datetime import datetime
+from timeit import default_timer as timer
+
+import msgspec
+from msgspec import Struct, msgpack
+from sqlalchemy import inspect
+from sqlmodel import Session, select
+
+from ivao_tracker.config.loader import config
+from ivao_tracker.model.sql import Airport, Snapshot
+from ivao_tracker.service.airport import known_airports
+from ivao_tracker.service.events import FrameColumns, snapshot_diff
+from ivao_tracker.service.sql import get_engine
+
+logger = logging.getLogger(__name__)
+
+
+class ImporterState(Struct):
+    snapshot_id: int
+    updated_at: datetime
+    # requested airport code -> code of the resolved airport
+    airports: dict[str, str]
+    pilots: FrameColumns | None = None
+
+
+def warmstart_config():
+    return config.config.get("warmstart", {})
+
+
+def capture_importer_state(snapshot_id: int, updated_at) -> ImporterState:
+    airports = {}
+    for airport_id, airport in known_airports.items():
+        # the cached airports are detached, their code is read from the key
+        identity = inspect(airport).identity
+        if identity is not None:
+            airports[airport_id] = identity[0]
+    return ImporterState(
+        snapshot_id, updated_at, airports, snapshot_diff.export()
+    )
+
+
+def write_importer_state(path: str, state: ImporterState):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as state_file:
+        state_file.write(msgpack.encode(state))
+    os.replace(tmp_path, path)
+
+
+def read_importer_state(path: str) -> ImporterState | None:
+    try:
+        with open(path, "rb") as state_file:
+            return msgpack.decode(state_file.read(), type=ImporterState)
+    except FileNotFoundError:
+        return None
+    except msgspec.DecodeError as e:
+        logger.warning("Ignoring unreadable importer state %s: %s", path, e)
+        return None
+
+
+_last_save: float | None = None
+
+
+def save_importer_state(snapshot_id: int, updated_at, force=False) -> bool:
+    """
+    Checkpoints the importer state, at most every interval seconds unless
+    forced. Returns True if the state has been written.
+    """
+    global _last_save
+    warmstart_cfg = warmstart_config()
+    if not warmstart_cfg.get("enabled", False):
+        return False
+    now = timer()
+    interval = warmstart_cfg.get("interval", 60)
+    if not force and _last_save is not None and now - _last_save < interval:
+        return False
+
+    state = capture_importer_state(snapshot_id, updated_at)
+    write_importer_state(warmstart_cfg.get("path", "importer.state"), state)
+    _last_save = now
+    logger.debug(
+        "Saved importer state of snapshot %d in %.3fs",
+        snapshot_id,
+        timer() - now,
+    )
+    return True
+
+
+def last_snapshot(session):
+    """
+    Returns (id, updatedAt) of the last snapshot in the database.
+    """
+    return session.exec(
+        select(Snapshot.id, Snapshot.updatedAt)
+        .order_by(Snapshot.id.desc())  # type: ignore
+        .limit(1)
+    ).first()
+
+
+def restore_importer_state() -> datetime | None:
+    """
+    Restores the airport resolutions of the checkpoint, if its snapshot is
+    still in the database and not newer than the last one. The events
+    baseline is only restored, if no snapshot has been imported since the
+    checkpoint. Returns the updatedAt of the last snapshot in the database
+    on a warm start, None on a cold start.
+    """
+    warmstart_cfg = warmstart_config()
+    if not warmstart_cfg.get("enabled", False):
+        return None
+    start = timer()
+    state = read_importer_state(warmstart_cfg.get("path", "importer.state"))
+    if state is None:
+        return None
+
+    with Session(get_engine()) as session:
+        last = last_snapshot(session)
+        if (
+            last is None
+            or last[0] < state.snapshot_id
+            or session.get(Snapshot, state.snapshot_id) is None
+        ):
+            logger.info(
+                "Importer state of snapshot %d does not match the database, "
+                "starting cold",
+                state.snapshot_id,
+            )
+            return None
+        codes = set(state.airports.values())
+        airports = {
+            airport.code: airport
+            for airport in session.exec(
+                select(Airport).where(Airport.code.in_(codes))  # type: ignore
+            ).all()
+        }
+
+    for airport_id, code in state.airports.items():
+        airport = airports.get(code)
+        if airport is not None:
+            known_airports[airport_id] = airport
+    if state.pilots is not None and last[0] == state.snapshot_id:
+        snapshot_diff.restore(state.pilots)
+
+    logger.info(
+        "Restored importer state of snapshot {:d} ({:s}) with {:d} airports "
+        "in {:.2f}s".format(
+            state.snapshot_id,
+            state.updated_at.isoformat(),
+            len(airports),
+            timer() - start,
+        )
+    )
+    return last[1]
@@ -0,0 +1,82 @@
+import random
+from collections import deque
+from statistics import median
+
+
+class CadenceEstimator:
+    """
+    Learns the period and phase of the upstream snapshot updates from the
+    observed updatedAt values and predicts when the next fetch should
+    happen.
+    """
+
+    def __init__(
+        self,
+        default_period: float,
+        publish_delay: float = 1.0,
+        jitter: float = 0.5,
+        backoff: float = 1.0,
+        history: int = 30,
+    ):
+        self.default_period = default_period
+        self.publish_delay = publish_delay
+        self.jitter = jitter
+        self.backoff = backoff
+        self.updates: deque[float] = deque(maxlen=history)
+        self.last_fetch: float | None = None
+        self.misses = 0
+
+    def period(self) -> float:
+        diffs = [b - a for a, b in zip(self.updates, list(self.updates)[1:])]
+        diffs = [d for d in diffs if d > 0]
+        if not diffs:
+            return self.default_period
+
+        # diffs might span several periods if updates were missed
+        rough = min(median(diffs), min(diffs) * 1.5)
+        return median(d / max(1, round(d / rough)) for d in diffs)
+
+    def expected_update(self, now: float) -> float:
+        """
+        Returns the time of the next expected upstream update after the
+        last observed one.
+        """
+        if not self.updates:
+            return now
+        period = self.period()
+        last_update = self.updates[-1]
+        periods = max(1, -(-(now - last_update) // period))
+        return last_update + periods * period
+
+    def observe(self, updated_at: float | None, fetched_at: float) -> bool:
+        """
+        Records the result of a fetch. Returns True if it was a new update.
+        """
+        self.last_fetch = fetched_at
+        if (
+            updated_at is None
+            or self.updates
+            and updated_at <= self.updates[-1]
+        ):
+            self.misses += 1
+            return False
+        self.updates.append(updated_at)
+        self.misses = 0
+        return True
+
+    def next_fetch(self, now: float) -> float:
+        if self.last_fetch is None:
+            return now
+
+        if self.misses > 0:
+            # the upstream is late, retry with an exponential backoff
+            delay = min(
+                self.backoff * 2 ** (self.misses - 1), self.period() / 2
+            )
+            return max(now, self.last_fetch + delay)
+
+        next_update = self.expected_update(max(now, self.last_fetch))
+        next_time = (
+            next_update + self.publish_delay + random.uniform(0, self.jitter)
+        )
+        return max(now, next_time)
@@ -0,0 +1,99 @@
+import json
+import math
+
+import numpy
+import shapely
+
+EARTH_RADIUS_NM = 3440.065
+
+
+def haversine_nm(lat1, lon1, lat2, lon2) -> float:
+    """
+    Returns the great-circle distance between two points in nautical miles.
+    """
+    phi1 = math.radians(lat1)
+    phi2 = math.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(lon2 - lon1)
+    a = (
+        math.sin(dphi / 2) ** 2
+        + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_NM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def haversine_nm_array(lat, lon, lats, lons) -> numpy.ndarray:
+    """
+    Returns the great-circle distances between a point and an array of
+    points in nautical miles.
+    """
+    phi1 = numpy.radians(lat)
+    phi2 = numpy.radians(lats)
+    dphi = phi2 - phi1
+    dlambda = numpy.radians(lons - lon)
+    a = (
+        numpy.sin(dphi / 2) ** 2
+        + numpy.cos(phi1) * numpy.cos(phi2) * numpy.sin(dlambda / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_NM * numpy.arcsin(numpy.sqrt(numpy.minimum(1, a)))
+
+
+def great_circle_interpolate(lat0, lon0, lat1, lon1, fraction):
+    """
+    Returns the (lats, lons) at the fractions of the great-circle arcs
+    between the points, e.g. 0.5 for the midpoints.
+    """
+    phi0, lambda0 = numpy.radians(lat0), numpy.radians(lon0)
+    phi1, lambda1 = numpy.radians(lat1), numpy.radians(lon1)
+    a = numpy.stack(
+        [
+            numpy.cos(phi0) * numpy.cos(lambda0),
+            numpy.cos(phi0) * numpy.sin(lambda0),
+            numpy.sin(phi0),
+        ]
+    )
+    b = numpy.stack(
+        [
+            numpy.cos(phi1) * numpy.cos(lambda1),
+            numpy.cos(phi1) * numpy.sin(lambda1),
+            numpy.sin(phi1),
+        ]
+    )
+    angle = numpy.arccos(numpy.clip((a * b).sum(axis=0), -1, 1))
+    sin_angle = numpy.sin(angle)
+    # linear for (nearly) identical points, the arc is not defined
+    short = sin_angle < 1e-9
+    safe = numpy.where(short, 1, sin_angle)
+    wa = numpy.where(
+        short, 1 - fraction, numpy.sin((1 - fraction) * angle) / safe
+    )
+    wb = numpy.where(short, fraction, numpy.sin(fraction * angle) / safe)
+    x, y, z = wa * a + wb * b
+    lats = numpy.degrees(numpy.arctan2(z, numpy.hypot(x, y)))
+    lons = numpy.degrees(numpy.arctan2(y, x))
+    return lats, lons
+
+
+def interpolate_heading(heading0, heading1, fraction):
+    """
+    Returns the headings at the fractions of the shortest turns.
+    """
+    turn = (numpy.asarray(heading1) - heading0 + 540) % 360 - 180
+    return (heading0 + turn * fraction) % 360
+
+
+def read_geojson(path) -> list[tuple[dict, shapely.Geometry]]:
+    """
+    Returns the properties and geometries of all features of a GeoJSON
+    file (a FeatureCollection, a Feature or a bare geometry).
+    """
+    with open(path) as geojson_file:
+        geojson = json.load(geojson_file)
+    features = geojson.get("features", [geojson])
+    return [
+        (
+            feature.get("properties") or {},
+            shapely.geometry.shape(feature.get("geometry", feature)),
+        )
+        for feature in features
+    ]
@@ -1,6 +1,5 @@
 import logging
 
-from ivao_tracker.config.logging import setup_logging
 from ivao_tracker.model.constants import State, TransponderMode, WakeTurbulence
 from ivao_tracker.model.sql import (
     Aircraft,
@@ -10,7 +9,6 @@ from ivao_tracker.model.sql import (
     Snapshot,
 )
 
-setup_logging()
 logger = logging.getLogger(__name__)
 
 
@@ -31,7 +29,7 @@ def json_to_sql_snapshot(jsonSnapshot):
     return snapshot
 
 
-def json2sqlPilotSession(jsonPilot):
+def json2sqlPilotSession(jsonPilot, firId=None):
     flightplans = []
     if jsonPilot.flightPlan:
         fp = jsonPilot.flightPlan
@@ -55,6 +53,7 @@ def json2sqlPilotSession(jsonPilot):
             transponder=lt.transponder,
             transponderMode=TransponderMode(lt.transponderMode),
             geometry=f"SRID=4326;POINT({lt.longitude} {lt.latitude})",
+            firId=firId,
         )
         tracks.append(track)
 
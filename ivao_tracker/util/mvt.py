@@ -0,0 +1,138 @@
+"""
+Minimal encoder of Mapbox Vector Tiles (version 2) with point features.
+
+Only the parts of the protobuf schema needed for one layer of points are
+written, see https://github.com/mapbox/vector-tile-spec/tree/master/2.1.
+"""
+
+import math
+
+import numpy
+
+EXTENT = 4096
+
+# protobuf wire types
+_VARINT = 0
+_DOUBLE = 1
+_LENGTH = 2
+
+_POINT = 1
+_MOVE_TO = 1
+
+
+def _encode_varint(value: int) -> bytes:
+    out = bytearray()
+    while value > 0x7F:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+
+# tags and tile coordinates are small, their encodings are looked up
+_SMALL_VARINTS = [_encode_varint(value) for value in range(1 << 14)]
+
+
+def _varint(value: int) -> bytes:
+    if value < 1 << 14:
+        return _SMALL_VARINTS[value]
+    return _encode_varint(value)
+
+
+def _zigzag(value: int) -> int:
+    return (value << 1) ^ (value >> 63)
+
+
+def _key(field: int, wire_type: int) -> bytes:
+    return _varint((field << 3) | wire_type)
+
+
+def _length_delimited(field: int, payload: bytes) -> bytes:
+    return _key(field, _LENGTH) + _varint(len(payload)) + payload
+
+
+def _packed(field: int, values) -> bytes:
+    return _length_delimited(field, b"".join(_varint(v) for v in values))
+
+
+def _value(value) -> bytes:
+    if isinstance(value, str):
+        return _length_delimited(1, value.encode())
+    if isinstance(value, bool):
+        return _key(7, _VARINT) + _varint(int(value))
+    if isinstance(value, int):
+        if value < 0:
+            return _key(6, _VARINT) + _varint(_zigzag(value))
+        return _key(5, _VARINT) + _varint(value)
+    return _key(3, _DOUBLE) + numpy.float64(value).tobytes()
+
+
+def tile_bounds(z: int, x: int, y: int):
+    """
+    Returns (min_lon, min_lat, max_lon, max_lat) of the web mercator tile.
+    """
+    n = 2**z
+
+    def lat(tile_y):
+        return math.degrees(
+            math.atan(math.sinh(math.pi * (1 - 2 * tile_y / n)))
+        )
+
+    return x / n * 360 - 180, lat(y + 1), (x + 1) / n * 360 - 180, lat(y)
+
+
+def project(lats, lons, z: int, x: int, y: int, extent: int = EXTENT):
+    """
+    Returns the integer tile coordinates of the WGS84 points.
+    """
+    n = 2**z
+    lats = numpy.radians(numpy.clip(lats, -85.0511, 85.0511))
+    tile_x = (numpy.asarray(lons) + 180) / 360 * n
+    tile_y = (1 - numpy.arcsinh(numpy.tan(lats)) / math.pi) / 2 * n
+    return (
+        numpy.floor((tile_x - x) * extent).astype(numpy.int64),
+        numpy.floor((tile_y - y) * extent).astype(numpy.int64),
+    )
+
+
+def encode_points(name: str, features, extent: int = EXTENT) -> bytes:
+    """
+    Returns a tile with one layer of point features. The features are
+    tuples (id, x, y, properties) in tile coordinates, None properties are
+    left out.
+    """
+    keys: dict[str, int] = {}
+    # keyed by the type as well, since True == 1
+    values: dict[tuple, int] = {}
+    encoded = []
+    for feature_id, px, py, properties in features:
+        tags = []
+        for key, value in properties.items():
+            if value is None:
+                continue
+            tags.append(keys.setdefault(key, len(keys)))
+            tags.append(values.setdefault((type(value), value), len(values)))
+        geometry = [(1 << 3) | _MOVE_TO, _zigzag(int(px)), _zigzag(int(py))]
+        encoded.append(
+            _length_delimited(
+                2,
+                _key(1, _VARINT)
+                + _varint(feature_id)
+                + _packed(2, tags)
+                + _key(3, _VARINT)
+                + _varint(_POINT)
+                + _packed(4, geometry),
+            )
+        )
+
+    layer = (
+        _key(15, _VARINT)
+        + _varint(2)
+        + _length_delimited(1, name.encode())
+        + b"".join(encoded)
+        + b"".join(_length_delimited(3, key.encode()) for key in keys)
+        + b"".join(_length_delimited(4, _value(v)) for _, v in values)
+        + _key(5, _VARINT)
+        + _varint(extent)
+    )
+    return _length_delimited(3, layer)
@@ -0,0 +1,145 @@
+import math
+
+import numpy
+
+from ivao_tracker.util.geo import EARTH_RADIUS_NM, haversine_nm_array
+
+NM_PER_DEGREE = EARTH_RADIUS_NM * math.pi / 180
+
+
+class GridIndex:
+    """
+    A static grid index over points in WGS84 coordinates.
+
+    The points are sorted by their grid cell, so the points of a range of
+    cells in the same grid row are a contiguous slice. Bounding box, radius
+    and k-nearest queries only look at the slices of the covered rows.
+    """
+
+    def __init__(self, ids, lats, lons, cell_size: float = 1.0):
+        self.cell_size = cell_size
+        self.rows = math.ceil(180 / cell_size)
+        self.cols = math.ceil(360 / cell_size)
+
+        ids = numpy.asarray(ids)
+        lats = numpy.asarray(lats, dtype=numpy.float64)
+        lons = numpy.asarray(lons, dtype=numpy.float64)
+        cells = self._rows(lats) * self.cols + self._cols(lons)
+        order = numpy.argsort(cells, kind="stable")
+
+        self.ids = ids[order]
+        self.lats = lats[order]
+        self.lons = lons[order]
+        self.cells = cells[order]
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _rows(self, lats):
+        rows = numpy.floor((lats + 90) / self.cell_size).astype(numpy.int64)
+        return numpy.clip(rows, 0, self.rows - 1)
+
+    def _cols(self, lons):
+        cols = numpy.floor((lons + 180) / self.cell_size).astype(numpy.int64)
+        return numpy.clip(cols, 0, self.cols - 1)
+
+    def _candidates(self, min_lon, min_lat, max_lon, max_lat):
+        """
+        Returns the positions of all points in the cells that intersect the
+        bounding box. The box must not cross the antimeridian.
+        """
+        row_min, row_max = (
+            min(max(int((lat + 90) // self.cell_size), 0), self.rows - 1)
+            for lat in (min_lat, max_lat)
+        )
+        col_min, col_max = (
+            min(max(int((lon + 180) // self.cell_size), 0), self.cols - 1)
+            for lon in (min_lon, max_lon)
+        )
+        rows = numpy.arange(row_min, row_max + 1) * self.cols
+        starts = numpy.searchsorted(self.cells, rows + col_min, "left")
+        ends = numpy.searchsorted(self.cells, rows + col_max, "right")
+        if len(starts) == 1:
+            return numpy.arange(starts[0], ends[0])
+        # concatenate the slices of all rows without a python loop
+        lengths = ends - starts
+        offsets = numpy.cumsum(lengths) - lengths
+        return numpy.repeat(starts - offsets, lengths) + numpy.arange(
+            lengths.sum()
+        )
+
+    def _bbox_positions(self, min_lon, min_lat, max_lon, max_lat):
+        if min_lon > max_lon:
+            # the box crosses the antimeridian
+            return numpy.concatenate(
+                [
+                    self._bbox_positions(min_lon, min_lat, 180, max_lat),
+                    self._bbox_positions(-180, min_lat, max_lon, max_lat),
+                ]
+            )
+        positions = self._candidates(min_lon, min_lat, max_lon, max_lat)
+        lats = self.lats[positions]
+        lons = self.lons[positions]
+        inside = (
+            (lats >= min_lat)
+            & (lats <= max_lat)
+            & (lons >= min_lon)
+            & (lons <= max_lon)
+        )
+        return positions[inside]
+
+    def bbox(self, min_lon, min_lat, max_lon, max_lat) -> numpy.ndarray:
+        """
+        Returns the ids of all points within the bounding box. Boxes with
+        min_lon > max_lon cross the antimeridian.
+        """
+        return self.ids[
+            self._bbox_positions(min_lon, min_lat, max_lon, max_lat)
+        ]
+
+    def _radius_positions(self, lat, lon, radius_nm):
+        delta_lat = radius_nm / NM_PER_DEGREE
+        min_lat = max(-90.0, lat - delta_lat)
+        max_lat = min(90.0, lat + delta_lat)
+        max_abs_lat = max(abs(min_lat), abs(max_lat))
+        if max_abs_lat >= 90 or radius_nm >= math.pi * EARTH_RADIUS_NM / 2:
+            positions = self._bbox_positions(-180, min_lat, 180, max_lat)
+        else:
+            delta_lon = delta_lat / math.cos(math.radians(max_abs_lat))
+            if delta_lon >= 180:
+                min_lon, max_lon = -180.0, 180.0
+            else:
+                min_lon = (lon - delta_lon + 180) % 360 - 180
+                max_lon = (lon + delta_lon + 180) % 360 - 180
+            positions = self._bbox_positions(
+                min_lon, min_lat, max_lon, max_lat
+            )
+
+        distances = haversine_nm_array(
+            lat, lon, self.lats[positions], self.lons[positions]
+        )
+        inside = distances <= radius_nm
+        return positions[inside], distances[inside]
+
+    def radius(self, lat, lon, radius_nm):
+        """
+        Returns the ids and distances (nm) of all points within the radius,
+        ordered by distance.
+        """
+        positions, distances = self._radius_positions(lat, lon, radius_nm)
+        order = numpy.argsort(distances)
+        return self.ids[positions[order]], distances[order]
+
+    def nearest(self, lat, lon, k: int = 1):
+        """
+        Returns the ids and distances (nm) of the k nearest points.
+        """
+        k = min(k, len(self))
+        radius_nm = self.cell_size * NM_PER_DEGREE
+        while True:
+            positions, distances = self._radius_positions(lat, lon, radius_nm)
+            if len(positions) >= k or radius_nm > math.pi * EARTH_RADIUS_NM:
+                break
+            radius_nm *= 4
+        order = numpy.argsort(distances)[:k]
+        return self.ids[positions[order]], distances[order]
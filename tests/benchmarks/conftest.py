@@ -0,0 +1,51 @@
+import copy
+import json
+import random
+
+import pytest
+
+SNAPSHOT_SIZES = (1_000, 5_000, 10_000)
+
+
+def synthetic_snapshot(template: dict, nr_of_pilots: int, seed=42) -> dict:
+    """
+    Returns a whazzup snapshot with copies of the pilots of the template,
+    with their own ids, callsigns and positions.
+    """
+    rng = random.Random(seed)
+    snapshot = copy.deepcopy(template)
+    pilots = template["clients"]["pilots"]
+    snapshot["clients"]["pilots"] = []
+    for i in range(nr_of_pilots):
+        pilot = copy.deepcopy(pilots[i % len(pilots)])
+        pilot["id"] = 10_000_000 + i
+        pilot["userId"] = 100_000 + i
+        pilot["callsign"] = "SYN{:d}".format(i)
+        pilot["lastTrack"]["latitude"] = rng.uniform(-60, 70)
+        pilot["lastTrack"]["longitude"] = rng.uniform(-180, 180)
+        if pilot["flightPlan"]:
+            pilot["flightPlan"]["id"] = 20_000_000 + i
+        snapshot["clients"]["pilots"].append(pilot)
+    snapshot["connections"]["pilot"] = nr_of_pilots
+    return snapshot
+
+
+@pytest.fixture(scope="session")
+def mock_data(request):
+    return request.config.rootpath / "tests" / "mock_data"
+
+
+@pytest.fixture(scope="session")
+def snapshot_payloads(mock_data, tmp_path_factory):
+    """
+    Paths of the synthetic whazzup payloads by number of pilots.
+    """
+    with open(mock_data / "snapshot.json") as snapshot_json:
+        template = json.load(snapshot_json)
+    directory = tmp_path_factory.mktemp("payloads")
+    payloads = {}
+    for nr_of_pilots in SNAPSHOT_SIZES:
+        path = directory / "whazzup-{:d}.json".format(nr_of_pilots)
+        path.write_text(json.dumps(synthetic_snapshot(template, nr_of_pilots)))
+        payloads[nr_of_pilots] = path
+    return payloads
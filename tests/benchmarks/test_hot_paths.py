@@ -0,0 +1,115 @@
+"""
+Micro-benchmarks of the hot paths of the import and the airport sync.
+
+Run with `make bench`, see docs/makefile.md. In the regular test run the
+benchmarks are disabled and each function runs once.
+"""
+
+import msgspec
+import pytest
+from sqlmodel import Session, select
+
+from ivao_tracker.config.loader import config
+from ivao_tracker.model.json import JsonSnapshot
+from ivao_tracker.model.sql import Airport
+from ivao_tracker.service import airport
+from ivao_tracker.service.airport import (
+    airport_id_is_in_keywords,
+    create_or_find_and_update_airport,
+    parse_airport_csv,
+)
+from ivao_tracker.service.ivao import read_ivao_snapshot
+from ivao_tracker.service.sql import database_is_healthy, get_engine
+from ivao_tracker.util.model import createFlightplan, json2sqlPilotSession
+
+from .conftest import SNAPSHOT_SIZES
+
+
+@pytest.fixture(scope="module")
+def pilots(snapshot_payloads):
+    with open(snapshot_payloads[1_000], "rb") as payload:
+        snapshot = msgspec.json.decode(payload.read(), type=JsonSnapshot)
+    return snapshot.clients.pilots
+
+
+@pytest.mark.parametrize("nr_of_pilots", SNAPSHOT_SIZES)
+def test_read_ivao_snapshot(
+    benchmark, monkeypatch, snapshot_payloads, nr_of_pilots
+):
+    path = snapshot_payloads[nr_of_pilots]
+    monkeypatch.setitem(config.config["ivao"], "whazzup_url", path.as_uri())
+    monkeypatch.setitem(config.config["archive"], "enabled", False)
+
+    snapshot = benchmark(read_ivao_snapshot)
+    assert len(snapshot.clients.pilots) == nr_of_pilots
+
+
+def test_json2sqlPilotSession(benchmark, pilots):
+    sessions = benchmark(lambda: [json2sqlPilotSession(p) for p in pilots])
+    assert len(sessions) == len(pilots)
+
+
+def test_createFlightplan(benchmark, pilots):
+    flightplans = [(p.id, p.flightPlan) for p in pilots if p.flightPlan]
+    created = benchmark(
+        lambda: [createFlightplan(i, fp, None) for i, fp in flightplans]
+    )
+    assert len(created) == len(flightplans)
+
+
+def test_cached_airport_lookup(benchmark, monkeypatch, pilots):
+    codes = [p.flightPlan.arrivalId for p in pilots if p.flightPlan]
+    monkeypatch.setattr(
+        airport,
+        "known_airports",
+        {code: Airport(code=code, ident=code) for code in codes},
+    )
+    # cached lookups do not touch the session
+    found = benchmark(
+        lambda: [create_or_find_and_update_airport(c, None) for c in codes]
+    )
+    assert [a.code for a in found] == codes
+
+
+def test_uncached_airport_lookup(benchmark, monkeypatch):
+    if not database_is_healthy():
+        pytest.skip("needs the configured database")
+    known_airports = {}
+    monkeypatch.setattr(airport, "known_airports", known_airports)
+    with Session(get_engine()) as session:
+        codes = session.exec(
+            select(Airport.code).order_by(Airport.code).limit(100)
+        ).all()
+
+        def lookup():
+            known_airports.clear()
+            return [
+                create_or_find_and_update_airport(c, session) for c in codes
+            ]
+
+        found = benchmark(lookup)
+        # is_used and fixed codes are not persisted
+        session.rollback()
+    assert len(found) == len(codes)
+
+
+@pytest.mark.parametrize(
+    "airport_id,keywords,expected",
+    [
+        ("EDDF", "Frankfurt am Main, EDDF, Rhein-Main", True),
+        ("EDD", "Frankfurt am Main, EDDF, Rhein-Main", False),
+        ("KJFK", "Manhattan, New York City, NYC, Idlewild", False),
+    ],
+)
+def test_airport_id_is_in_keywords(benchmark, airport_id, keywords, expected):
+    assert benchmark(airport_id_is_in_keywords, airport_id, keywords) is (
+        expected
+    )
+
+
+def test_parse_airport_csv(benchmark, monkeypatch, mock_data):
+    url = (mock_data / "airports.csv").as_uri()
+    monkeypatch.setitem(config.config["airports"], "url", url)
+
+    airports = benchmark(parse_airport_csv)
+    assert len(airports) == 5
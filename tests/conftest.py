@@ -1,6 +1,15 @@
+import os
 import sys
 import pytest
 
+from ivao_tracker.config.loader import config
+
+
+# the config is loaded lazily, i.e. after the chdir to the temp dir
+@pytest.fixture(scope="session", autouse=True)
+def load_config(request):
+    config.load(os.path.join(str(request.config.rootpath), "config.toml"))
+
 
 # each test runs on cwd to its temp dir
 @pytest.fixture(autouse=True)
@@ -0,0 +1,50 @@
+import unittest
+
+from ivao_tracker.model.constants import AirportType, Continent
+from ivao_tracker.service.airport import (
+    airport_rows,
+    create_new_airports,
+    read_airport_csv,
+)
+
+
+class TestAirportCsv(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        with open("tests/mock_data/airports.csv", "rb") as csv_file:
+            cls.csv = read_airport_csv(csv_file)
+
+    def test_read_airport_csv(self):
+        csv = self.csv
+        assert len(csv) == 5
+        assert str(csv["continent"].dtype) == "category"
+        # NA is the continent code of North America, not a missing value
+        assert csv["continent"].tolist() == ["NA", "EU", "NA", "AS", "AN"]
+        assert csv["scheduled_service"].tolist() == [
+            False,
+            True,
+            True,
+            True,
+            False,
+        ]
+        assert str(csv["last_updated"].dtype).startswith("datetime64")
+
+    def test_missing_values_are_none(self):
+        heliport, *_, wilkins = airport_rows(self.csv)
+        assert heliport.icao_code is None
+        assert heliport.keywords is None
+        assert heliport.elevation_ft == 11
+        assert wilkins.elevation_ft is None
+        assert wilkins.municipality is None
+        assert wilkins.last_updated is None
+
+    def test_create_new_airports(self):
+        airports = create_new_airports(self.csv)
+        frankfurt = airports[1]
+        assert frankfurt.code == "EDDF"
+        assert frankfurt.type == AirportType.LARGE_AIRPORT
+        assert frankfurt.continent == Continent.EUROPE
+        assert frankfurt.elevation_ft == 364
+        assert type(frankfurt.score) is int
+        assert frankfurt.geom == "SRID=4326;POINT(8.559294 50.036249)"
+        assert airports[4].elevation_ft is None
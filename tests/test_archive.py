@@ -0,0 +1,35 @@
+import datetime
+import unittest
+
+from ivao_tracker.service.archive import SnapshotArchive
+
+
+class TestSnapshotArchive(unittest.TestCase):
+    def test_append_read_and_iterate(self):
+        archive = SnapshotArchive("archive", segment=60)
+        start = datetime.datetime(
+            2024, 2, 10, 22, 5, 0, 607809, tzinfo=datetime.timezone.utc
+        )
+        updated_ats = [
+            start + datetime.timedelta(seconds=15 * i) for i in range(6)
+        ]
+        for i, updated_at in enumerate(updated_ats):
+            raw = b'{"updatedAt": "%s", "i": %d}' % (
+                updated_at.isoformat().encode(),
+                i,
+            )
+            assert archive.append(updated_at, raw)
+
+        # duplicates are skipped
+        assert not archive.append(updated_ats[-1], b"{}")
+
+        assert len(archive.segment_bases()) == 2
+        assert archive.read(updated_ats[3]).endswith(b'"i": 3}')
+        assert archive.read(start - datetime.timedelta(seconds=1)) is None
+
+        # a new instance reads the index from disk
+        reopened = SnapshotArchive("archive", segment=60)
+        assert list(reopened.updated_ats()) == updated_ats
+        assert [
+            raw[-2:-1] for _, raw in reopened.iter(start=updated_ats[1])
+        ] == [b"2", b"3", b"4", b"5"]
@@ -0,0 +1,28 @@
+import unittest
+
+from ivao_tracker.util.cadence import CadenceEstimator
+
+
+class TestCadenceEstimator(unittest.TestCase):
+    def setUp(self):
+        self.estimator = CadenceEstimator(
+            20, publish_delay=1.0, jitter=0.0, backoff=1.0
+        )
+        self.start = 1_700_000_003.0
+        # the update at start + 45 has been missed
+        for k in [0, 1, 2, 4, 5]:
+            update = self.start + 15 * k
+            self.estimator.observe(update, update + 2)
+
+    def test_learns_period_and_phase(self):
+        assert self.estimator.period() == 15
+        next_fetch = self.estimator.next_fetch(self.start + 77)
+        assert next_fetch == self.start + 90 + 1
+
+    def test_backs_off_when_upstream_is_late(self):
+        last_update = self.start + 75
+        assert not self.estimator.observe(last_update, self.start + 91)
+        assert self.estimator.next_fetch(self.start + 91) == self.start + 92
+        assert not self.estimator.observe(last_update, self.start + 92)
+        assert self.estimator.next_fetch(self.start + 92) == self.start + 94
+        assert self.estimator.observe(self.start + 90, self.start + 94)
@@ -0,0 +1,38 @@
+import unittest
+from unittest.mock import patch
+
+from ivao_tracker import cli
+from ivao_tracker.service import context
+from ivao_tracker.service.context import AppContext
+
+
+class TestMain(unittest.TestCase):
+    def setUp(self):
+        self.context = context.app_context()
+
+    def tearDown(self):
+        context.use_context(self.context)
+
+    def main(self, argv):
+        with (
+            patch.object(cli, "setup_logging"),
+            patch.object(cli.config, "load"),
+            patch.object(cli, "run") as run,
+            patch.object(cli, "sync_airports_once") as sync_airports_once,
+            patch.object(AppContext, "close") as close,
+        ):
+            cli.main(argv)
+        return run, sync_airports_once, close
+
+    def test_run_keeps_context(self):
+        for argv in ([], ["run"]):
+            run, _, close = self.main(argv)
+            run.assert_called_once()
+            # the scheduled tasks still use the resources
+            close.assert_not_called()
+
+    def test_one_shot_command_closes_context(self):
+        run, sync_airports_once, close = self.main(["sync-airports"])
+        run.assert_not_called()
+        sync_airports_once.assert_called_once()
+        close.assert_called_once()
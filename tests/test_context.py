@@ -0,0 +1,38 @@
+import unittest
+
+from ivao_tracker.service.context import AppContext
+
+
+class TestAppContext(unittest.TestCase):
+    def test_resources(self):
+        context = AppContext()
+        created = []
+        closed = []
+
+        def factory(name):
+            created.append(name)
+            return name
+
+        for _ in range(2):
+            assert context.resource("a", lambda: factory("a"), closed.append)
+        context.resource("b", lambda: factory("b"))
+        context.resource("c", lambda: factory("c"), closed.append)
+        assert created == ["a", "b", "c"]
+
+        context.close()
+        assert closed == ["c", "a"]
+        # a closed context creates the resources again
+        context.resource("a", lambda: factory("a"))
+        assert created == ["a", "b", "c", "a"]
+
+    def test_failing_close(self):
+        context = AppContext()
+        closed = []
+
+        def fail(resource):
+            raise RuntimeError("gone")
+
+        context.resource("a", lambda: "a", closed.append)
+        context.resource("b", lambda: "b", fail)
+        context.close()
+        assert closed == ["a"]
@@ -0,0 +1,95 @@
+import datetime
+import itertools
+import unittest
+
+import msgspec
+
+from ivao_tracker.model.json import JsonSnapshot
+from ivao_tracker.service.events import (
+    Connected,
+    Disconnected,
+    EventPublisher,
+    FlightPlanRevised,
+    SnapshotDiff,
+    SquawkChanged,
+    StateChanged,
+    _event_stream,
+)
+
+
+class TestSnapshotDiff(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        with open("tests/mock_data/snapshot.json", "rb") as snapshot_json:
+            cls.snapshot = msgspec.json.decode(
+                snapshot_json.read(), type=JsonSnapshot
+            )
+
+    def test_diff(self):
+        first, second = self.snapshot.clients.pilots
+        changed = msgspec.structs.replace(
+            first,
+            lastTrack=msgspec.structs.replace(
+                first.lastTrack, state="Approach", transponder=7700
+            ),
+            flightPlan=msgspec.structs.replace(
+                first.flightPlan, revision=first.flightPlan.revision + 1
+            ),
+        )
+        new_pilot = msgspec.structs.replace(second, id=12345, callsign="NEW1")
+        next_snapshot = msgspec.structs.replace(
+            self.snapshot,
+            updatedAt=self.snapshot.updatedAt + datetime.timedelta(seconds=15),
+            clients=msgspec.structs.replace(
+                self.snapshot.clients, pilots=[new_pilot, changed]
+            ),
+        )
+
+        snapshot_diff = SnapshotDiff()
+        assert snapshot_diff.diff(self.snapshot) == []
+        events = snapshot_diff.diff(next_snapshot)
+        by_type = {type(event): event for event in events}
+
+        assert by_type[Connected].id == 12345
+        assert by_type[Disconnected].id == second.id
+        assert by_type[FlightPlanRevised].id == first.id
+        assert by_type[StateChanged].previous == "En Route"
+        assert by_type[StateChanged].current == "Approach"
+        assert by_type[SquawkChanged].current == 7700
+        assert msgspec.json.encode(by_type[Connected]).startswith(
+            b'{"type":"connected"'
+        )
+
+
+class TestEventPublisher(unittest.TestCase):
+    def events(self, n):
+        timestamp = datetime.datetime(2024, 2, 10, 22, 5)
+        return [
+            Connected(i, "TEST{:d}".format(i), timestamp, None, None)
+            for i in range(n)
+        ]
+
+    def test_slow_stream_is_dropped(self):
+        publisher = EventPublisher()
+        fast = publisher.open_stream()
+        slow = publisher.open_stream(maxsize=2)
+        publisher.publish(self.events(2))
+        publisher.publish(self.events(1))
+
+        assert fast.qsize() == 3
+        # the pending events are replaced by the end of the stream
+        assert slow.get_nowait() is None
+        assert slow.empty()
+        publisher.publish(self.events(1))
+        assert slow.empty()
+
+    def test_dropped_stream_ends_response(self):
+        publisher = EventPublisher()
+        stream = publisher.open_stream(maxsize=2)
+        publisher.publish(self.events(1))
+        chunks = _event_stream(stream)
+        assert next(chunks).startswith(b'data: {"type":"connected"')
+
+        publisher.publish(self.events(3))
+        # ends instead of sending keepalives
+        assert list(itertools.islice(chunks, 1)) == []
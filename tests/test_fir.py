@@ -0,0 +1,29 @@
+import unittest
+
+import numpy
+import shapely
+
+from ivao_tracker.service.fir import FirLocator
+
+
+class TestFirLocator(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.locator = FirLocator(
+            [1, 2, 3],
+            ["EDGG", "EDDF_APP", "LFFF"],
+            [
+                shapely.box(5, 47, 15, 55),
+                shapely.box(8, 49.5, 9.5, 50.5),
+                shapely.box(-5, 42, 5, 51),
+            ],
+        )
+
+    def test_locate(self):
+        fir_ids = self.locator.locate(
+            numpy.array([10.0, 8.6, 2.3, -40.0, numpy.nan]),
+            numpy.array([52.0, 50.0, 48.8, 40.0, numpy.nan]),
+        )
+        # the sector wins over the FIR containing it
+        assert fir_ids.tolist() == [1, 2, 3, 0, 0]
+        assert self.locator.codes[2] == "EDDF_APP"
@@ -0,0 +1,76 @@
+import unittest
+
+import msgspec
+import shapely
+
+from ivao_tracker.model.json import JsonSnapshot
+from ivao_tracker.service.geofence import Geofence
+
+
+class TestGeofence(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        with open("tests/mock_data/snapshot.json", "rb") as snapshot_json:
+            cls.pilots = msgspec.json.decode(
+                snapshot_json.read(), type=JsonSnapshot
+            ).clients.pilots
+
+    def ids(self, geofence, keep_ids=()):
+        return [pilot.id for pilot in geofence.filter(self.pilots, keep_ids)]
+
+    def test_region(self):
+        # the arabian peninsula contains the first pilot only
+        geofence = Geofence(region=shapely.box(35, 12, 60, 32))
+        assert self.ids(geofence) == [98989898]
+        assert self.ids(Geofence(region=None)) == []
+
+    def test_flightplans(self):
+        geofence = Geofence(airports=["WAHQ"])
+        assert self.ids(geofence) == [45454545]
+        geofence.keep_flightplans = False
+        assert self.ids(geofence) == []
+
+    def test_keep_active(self):
+        geofence = Geofence(region=shapely.box(35, 12, 60, 32))
+        assert self.ids(geofence, {45454545}) == [98989898, 45454545]
+
+    def test_region_airports(self):
+        geofence = Geofence(
+            region=shapely.box(-10, 35, 30, 70), countries=["BR"]
+        )
+        geofence.add_region_airports(
+            [
+                ("EDDF", "EDDF", "EDDF", "DE", 8.57, 50.03),
+                ("SBGR", "SBGR", None, "BR", -46.47, -23.43),
+                ("OMDB", "OMDB", "OMDB", "AE", 55.36, 25.25),
+                ("XXXX", "XXXX", None, None, None, None),
+            ]
+        )
+        assert geofence.airports == {"EDDF", "SBGR"}
+        assert self.ids(geofence) == [98989898]
+
+    def test_airports_and_countries_without_flightplans(self):
+        geofence = Geofence(airports=["OEXX"], keep_flightplans=False)
+        geofence.add_region_airports(
+            [
+                # ~7nm from the first pilot
+                ("OEXX", "OEXX", None, "SA", 49.5, 24.3),
+                ("OERK", "OERK", "OERK", "SA", 46.70, 24.96),
+                ("WIMM", "WIMM", "WIMM", "ID", 98.67, 3.56),
+            ]
+        )
+        assert geofence.airports == {"OEXX"}
+        assert self.ids(geofence) == [98989898]
+        geofence.airport_radius_nm = 5
+        assert self.ids(geofence) == []
+
+        geofence = Geofence(countries=["ID"], keep_flightplans=False)
+        geofence.add_region_airports(
+            [
+                ("OEXX", "OEXX", None, "SA", 49.5, 24.3),
+                ("WIXX", None, None, "ID", 88.6, 2.9),
+                ("WIMM", "WIMM", "WIMM", "ID", 98.67, 3.56),
+            ]
+        )
+        assert geofence.airports == {"WIXX", "WIMM"}
+        assert self.ids(geofence) == [45454545]
@@ -0,0 +1,40 @@
+import datetime
+import unittest
+
+from ivao_tracker.service.history import interpolate_samples
+from ivao_tracker.service.sql import pilottrack_partitions
+
+
+class TestHistory(unittest.TestCase):
+    def test_partitions_of_window(self):
+        assert pilottrack_partitions(
+            datetime.datetime(2024, 2, 10, 5, 58),
+            datetime.datetime(2024, 2, 10, 6, 2),
+        ) == ["pilottrack_20240209_night", "pilottrack_20240210_day"]
+        assert pilottrack_partitions(
+            datetime.datetime(2024, 2, 10, 19),
+            datetime.datetime(2024, 2, 10, 20),
+        ) == ["pilottrack_20240210_night"]
+
+    def test_interpolate_samples(self):
+        t = 1_000_000.0
+        rows = [
+            # across the antimeridian, turning right through north
+            (1, t - 10, 1000, 350, 0.0, 179.0, t + 30, 2000, 30, 0.0, -179.0),
+            # no sample after, e.g. the last sample of the session
+            (2, t - 5, 3000, 90, 10.0, 20.0, None, None, None, None, None),
+            # no sample before, not connected yet
+            (3, None, None, None, None, None, t + 5, 0, 0, 1.0, 1.0),
+        ]
+        first, last, missing = interpolate_samples(t, rows)
+
+        assert first.interpolated
+        assert first.altitude == 1250
+        assert first.heading == 0
+        assert abs(first.latitude) < 1e-9
+        assert abs(first.longitude - 179.5) < 1e-9
+
+        assert not last.interpolated
+        assert (last.latitude, last.longitude) == (10.0, 20.0)
+        assert (last.altitude, last.heading) == (3000, 90)
+        assert missing is None
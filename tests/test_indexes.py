@@ -0,0 +1,93 @@
+import datetime
+import unittest
+from unittest.mock import MagicMock, patch
+
+from ivao_tracker.config.loader import config
+from ivao_tracker.service import sql
+from ivao_tracker.service.indexes import (
+    apply_index_profile,
+    partition_end,
+    profile_indexes,
+)
+
+
+class TestIndexProfiles(unittest.TestCase):
+    def test_profile_indexes(self):
+        assert "idx_pilottrack_geometry" in profile_indexes("legacy", "all")
+        assert "idx_pilottrack_geometry" not in profile_indexes(
+            "lean", "sealed"
+        )
+        with self.assertRaises(ValueError):
+            profile_indexes("fast", "all")
+
+    def test_partition_end(self):
+        assert partition_end("pilottrack_20240210_day") == datetime.datetime(
+            2024, 2, 10, 18
+        )
+        assert partition_end("pilottrack_20240210_night") == datetime.datetime(
+            2024, 2, 11, 6
+        )
+        assert partition_end("pilottrack") is None
+
+    def test_switch_profile(self):
+        connection = MagicMock()
+        connection.execute.return_value.scalars.return_value = [
+            "ix_pilottrack_pilotSessionId",
+            "idx_pilottrack_geometry",
+            "ix_pilotsession_active",
+        ]
+        apply_index_profile(connection, "lean", "sealed")
+        statements = [
+            str(c.args[0]) for c in connection.execute.call_args_list[1:]
+        ]
+        assert statements == [
+            'DROP INDEX IF EXISTS "ix_pilottrack_pilotSessionId"',
+            'CREATE INDEX IF NOT EXISTS "brin_pilottrack_timestamp" '
+            'ON pilottrack USING brin ("timestamp")',
+            'CREATE INDEX IF NOT EXISTS "ix_pilottrack_session_timestamp" '
+            'ON pilottrack ("pilotSessionId", "timestamp")',
+            'CREATE INDEX IF NOT EXISTS "ix_pilotsession_callsign_created" '
+            'ON pilotsession (callsign, "createdAt")',
+            'DROP INDEX IF EXISTS "idx_pilottrack_geometry"',
+        ]
+
+    def test_default_profile(self):
+        connection = MagicMock()
+        connection.execute.return_value.scalars.return_value = [
+            "ix_pilottrack_pilotSessionId",
+            "ix_pilotsession_isActive",
+            "ix_pilotsession_callsign",
+            "idx_pilottrack_geometry",
+        ]
+        with patch.dict(config.config, {"indexes": {}}):
+            apply_index_profile(connection)
+        statements = [
+            str(c.args[0]) for c in connection.execute.call_args_list[1:]
+        ]
+        # an existing database keeps the indexes of the models and gets the
+        # ones of the point-in-time lookups
+        assert statements == [
+            'CREATE INDEX IF NOT EXISTS "ix_pilottrack_session_timestamp" '
+            'ON pilottrack ("pilotSessionId", "timestamp")',
+            'CREATE INDEX IF NOT EXISTS "ix_pilotsession_callsign_created" '
+            'ON pilotsession (callsign, "createdAt")',
+        ]
+
+    def test_create_schema_applies_profile_to_new_tables(self):
+        with patch.multiple(
+            sql,
+            get_engine=MagicMock(),
+            inspect=MagicMock(),
+            SQLModel=MagicMock(),
+            apply_index_profile=MagicMock(),
+            add_missing_columns=MagicMock(),
+        ):
+            sql.inspect.return_value.has_table.return_value = True
+            sql.create_schema()
+            sql.apply_index_profile.assert_not_called()
+            sql.create_schema(apply_indexes=True)
+            assert sql.apply_index_profile.call_count == 1
+
+            sql.inspect.return_value.has_table.return_value = False
+            sql.create_schema()
+            assert sql.apply_index_profile.call_count == 2
@@ -0,0 +1,126 @@
+import unittest
+from datetime import UTC, datetime, timedelta
+from types import SimpleNamespace
+from unittest.mock import DEFAULT, MagicMock, patch
+
+import msgspec
+import numpy
+
+from ivao_tracker.model.constants import State
+from ivao_tracker.model.json import JsonSnapshot
+from ivao_tracker.service import keyframes
+from ivao_tracker.service.keyframes import (
+    KEYFRAME_DTYPE,
+    STATES,
+    decode_keyframe,
+    encode_keyframe,
+    latest_records,
+    pilot_records,
+    track_records,
+    world_state,
+)
+
+TIME = datetime(2024, 2, 11, 2, 0)
+
+
+def epoch(time):
+    return time.replace(tzinfo=UTC).timestamp()
+
+
+class TestKeyframes(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        with open("tests/mock_data/snapshot.json", "rb") as snapshot_json:
+            cls.snapshot = msgspec.json.decode(
+                snapshot_json.read(), type=JsonSnapshot
+            )
+
+    def test_encoded_pilots_round_trip(self):
+        pilots = self.snapshot.clients.pilots
+        records = pilot_records(pilots)
+        assert KEYFRAME_DTYPE.itemsize == 30
+        assert list(records["id"]) == sorted(p.id for p in pilots)
+
+        decoded = decode_keyframe(encode_keyframe(records))
+        assert numpy.array_equal(decoded, records)
+        for pilot in pilots:
+            record = decoded[decoded["id"] == pilot.id][0]
+            track = pilot.lastTrack
+            assert record["timestamp"] == track.timestamp.timestamp()
+            assert abs(record["latitude"] - track.latitude) < 1e-4
+            assert abs(record["longitude"] - track.longitude) < 1e-4
+            assert record["altitude"] == track.altitude
+            assert STATES[record["state"]].value == track.state
+
+    def test_latest_records_merge_keyframe_and_tracks(self):
+        keyframe = numpy.zeros(3, dtype=KEYFRAME_DTYPE)
+        keyframe["id"] = [1, 2, 3]
+        keyframe["timestamp"] = [100.0, 100.0, 100.0]
+        tracks = track_records(
+            [
+                (2, 160.0, 1.0, 2.0, 5000, 90, 250, "EN_ROUTE", False),
+                (4, 150.0, 3.0, 4.0, 0, 0, 0, "BOARDING", True),
+            ]
+        )
+        merged = latest_records(numpy.concatenate([keyframe, tracks]))
+
+        assert list(merged["id"]) == [1, 2, 3, 4]
+        assert list(merged["timestamp"]) == [100.0, 160.0, 100.0, 150.0]
+        assert STATES[merged["state"][1]] == State.EN_ROUTE
+        assert merged["onGround"][3]
+
+    def world_state_at(self, keyframe, tracks, disconnects):
+        """
+        Returns the world state at TIME and the since of the tracks query.
+        """
+        latest_tracks = MagicMock(return_value=tracks)
+        with patch.multiple(
+            keyframes,
+            Session=DEFAULT,
+            get_engine=DEFAULT,
+            last_keyframe=MagicMock(return_value=keyframe),
+            latest_tracks=latest_tracks,
+            disconnect_times=MagicMock(return_value=disconnects),
+        ):
+            state = world_state(TIME.replace(tzinfo=UTC))
+        return state, latest_tracks.call_args.args[1]
+
+    def test_world_state_keeps_connected_keyframe_pilots(self):
+        updated_at = TIME - timedelta(seconds=500)
+        records = numpy.zeros(3, dtype=KEYFRAME_DTYPE)
+        records["id"] = [1, 2, 3]
+        records["timestamp"] = epoch(updated_at) - 30
+        keyframe = SimpleNamespace(
+            updatedAt=updated_at, data=encode_keyframe(records)
+        )
+        tracks = track_records(
+            [
+                (2, epoch(TIME) - 10, 1.0, 2.0, 5000, 90, 250, "EN_ROUTE", 0),
+                (4, epoch(TIME) - 5, 3.0, 4.0, 0, 0, 0, "BOARDING", 1),
+            ]
+        )
+        # 3 disconnected after the keyframe
+        disconnects = {3: epoch(updated_at) + 100}
+
+        state, since = self.world_state_at(keyframe, tracks, disconnects)
+
+        assert since == updated_at
+        assert state.time == TIME
+        assert state.keyframe == updated_at
+        # 1 has no track since the keyframe but is still connected
+        assert list(state.pilots["id"]) == [1, 2, 4]
+        assert state.pilots["timestamp"][0] == epoch(updated_at) - 30
+
+    def test_world_state_without_keyframe(self):
+        tracks = track_records(
+            [
+                (1, epoch(TIME) - 1000, 1.0, 2.0, 0, 0, 0, "BOARDING", 1),
+                (2, epoch(TIME) - 10, 1.0, 2.0, 5000, 90, 250, "EN_ROUTE", 0),
+            ]
+        )
+
+        state, since = self.world_state_at(None, tracks, {})
+
+        assert since == TIME - keyframes.max_gap()
+        assert state.keyframe is None
+        assert list(state.pilots["id"]) == [2]
@@ -0,0 +1,82 @@
+import unittest
+
+from sqlalchemy.exc import OperationalError
+
+from ivao_tracker.service.leader import AdvisoryLock
+from ivao_tracker.service.sql import lock_key
+
+
+class _Result:
+    def __init__(self, value):
+        self.value = value
+
+    def scalar(self):
+        return self.value
+
+
+class _Connection:
+    def __init__(self, server):
+        self.server = server
+        self.alive = True
+
+    def execution_options(self, **options):
+        return self
+
+    def execute(self, statement, params=None):
+        if not self.alive:
+            raise OperationalError(str(statement), params, None)
+        sql = str(statement)
+        if "pg_try_advisory_lock" in sql:
+            holder = self.server.locks.setdefault(params["key"], self)
+            return _Result(holder is self)
+        if "pg_advisory_unlock" in sql:
+            del self.server.locks[params["key"]]
+        return _Result(1)
+
+    def invalidate(self):
+        pass
+
+    def close(self):
+        pass
+
+    def die(self):
+        # the server releases the locks of a closed connection
+        self.alive = False
+        self.server.locks = {
+            k: v for k, v in self.server.locks.items() if v is not self
+        }
+
+
+class _Engine:
+    def __init__(self):
+        self.locks = {}
+
+    def connect(self):
+        return _Connection(self)
+
+
+class TestAdvisoryLock(unittest.TestCase):
+    def test_failover(self):
+        server = _Engine()
+        primary = AdvisoryLock("importer", server)
+        standby = AdvisoryLock("importer", server)
+        airports = AdvisoryLock("airport-sync", server)
+
+        assert primary.acquire()
+        assert not standby.acquire()
+        # the locks of the tasks are independent
+        assert airports.acquire()
+        assert primary.acquire()
+
+        primary._connection.die()
+        assert standby.acquire()
+        assert not primary.acquire()
+        assert not primary.held
+
+        standby.release()
+        assert primary.acquire()
+
+    def test_lock_key(self):
+        assert lock_key("importer") == lock_key("importer")
+        assert lock_key("importer") != lock_key("airport-sync")
+        assert -(2**63) <= lock_key("importer") < 2**63
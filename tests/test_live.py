@@ -0,0 +1,96 @@
+import unittest
+from datetime import timedelta
+
+import msgspec
+
+from ivao_tracker.model.json import JsonSnapshot
+from ivao_tracker.service.http import Request
+from ivao_tracker.service.live import LiveState, LiveTraffic
+
+
+class TestLiveState(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        with open("tests/mock_data/snapshot.json", "rb") as snapshot_json:
+            cls.snapshot = msgspec.json.decode(
+                snapshot_json.read(), type=JsonSnapshot
+            )
+
+    def setUp(self):
+        self.state = LiveState()
+        self.state.update(self.snapshot, {98989898: "OBBB"})
+
+    def get(self, path, query=None, headers=None):
+        return self.state.response(Request(path, query or {}, headers or {}))
+
+    def test_update(self):
+        assert LiveState().traffic is None
+        empty = LiveState().response(Request("/live", {}, {}))
+        assert empty.status == 503
+
+        traffic = self.state.traffic
+        assert traffic.updatedAt == self.snapshot.updatedAt
+        assert sorted(p.id for p in traffic.pilots) == [45454545, 98989898]
+        assert self.state.pilot(98989898).fir == "OBBB"
+        assert self.state.pilot(45454545).fir is None
+        assert self.state.pilot(1) is None
+
+        response = self.get("/live/pilots")
+        assert response.status == 200
+        pilots = msgspec.json.decode(response.body)
+        assert sorted(p["id"] for p in pilots) == [45454545, 98989898]
+        body = self.get("/live").body
+        assert msgspec.json.decode(body, type=LiveTraffic) == traffic
+
+        # the next snapshot replaces the state and its bodies
+        updated_at = self.snapshot.updatedAt + timedelta(seconds=15)
+        self.state.update(
+            msgspec.structs.replace(self.snapshot, updatedAt=updated_at)
+        )
+        assert self.state.traffic.updatedAt == updated_at
+        assert self.state.pilot(98989898).fir is None
+        assert self.get("/live").body != body
+
+    def test_etag(self):
+        response = self.get("/live/atcs")
+        etag = response.headers["ETag"]
+        assert response.headers["Cache-Control"] == "no-cache"
+
+        for path in ("/live", "/live/pilots", "/live/atcs"):
+            response = self.get(path, headers={"If-None-Match": etag})
+            assert response.status == 304
+            assert response.body == b""
+            assert response.headers["ETag"] == etag
+
+        self.state.update(
+            msgspec.structs.replace(
+                self.snapshot,
+                updatedAt=self.snapshot.updatedAt + timedelta(seconds=15),
+            )
+        )
+        response = self.get("/live", headers={"If-None-Match": etag})
+        assert response.status == 200
+        assert response.headers["ETag"] != etag
+
+    def ids(self, query):
+        response = self.get("/live/pilots", query)
+        assert response.status == 200
+        return [p["id"] for p in msgspec.json.decode(response.body)]
+
+    def test_bbox_query(self):
+        assert self.ids({"bbox": "40,20,60,30"}) == [98989898]
+        assert self.ids({"bbox": "80,0,90,5"}) == [45454545]
+        assert self.ids({"bbox": "-10,-10,0,0"}) == []
+        with self.assertRaises(ValueError):
+            self.get("/live/pilots", {"bbox": "40,20,60"})
+
+    def test_radius_query(self):
+        # 98989898 is ~60nm north of 23.22, 49.405
+        query = {"lat": "23.22", "lon": "49.405"}
+        assert self.ids({**query, "radius": "50"}) == []
+        assert self.ids({**query, "radius": "70"}) == [98989898]
+        # nearest first
+        assert self.ids({**query, "k": "2"}) == [98989898, 45454545]
+        assert self.ids(query) == [98989898]
+        with self.assertRaises(ValueError):
+            self.get("/live/pilots", {"lat": "23.22"})
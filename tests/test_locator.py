@@ -0,0 +1,36 @@
+import unittest
+
+from ivao_tracker.service.locator import AirportLocator, locatable_airports
+
+
+class TestAirportLocator(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        rows = [
+            ("EDDF", "LARGE_AIRPORT", 50.0333, 8.5706),
+            # heliport and seaplane base right next to the runway
+            ("DE-0001", "HELIPORT", 50.0410, 8.5870),
+            ("DE-0002", "SEAPLANE_BASE", 50.0420, 8.5880),
+            ("DE-0003", "CLOSED", 50.0430, 8.5890),
+            ("EDFE", "SMALL_AIRPORT", 49.9608, 8.6436),
+        ]
+        cls.locator = AirportLocator(*locatable_airports(rows))
+
+    def test_excluded_types(self):
+        assert sorted(self.locator.codes) == ["EDDF", "EDFE"]
+        code, distance = self.locator.nearest(50.0420, 8.5880)
+        assert code == "EDDF"
+        assert distance < 1.5
+
+    def test_nearest_many(self):
+        codes, _ = self.locator.nearest_many(
+            [50.0410, 49.9600, 10.0], [8.5870, 8.6430, 10.0]
+        )
+        assert codes.tolist() == ["EDDF", "EDFE", None]
+
+    def test_no_airports(self):
+        assert locatable_airports([("DE-0001", "HELIPORT", 50.0, 8.5)]) == (
+            (),
+            (),
+            (),
+        )
@@ -0,0 +1,31 @@
+import unittest
+
+from ivao_tracker.service import metrics
+from ivao_tracker.service.http import find_handler
+
+
+class TestMetrics(unittest.TestCase):
+    def test_render_counter_and_histogram(self):
+        counter = metrics.Counter("test_events_total", "Events.", ["kind"])
+        counter.inc(kind="a")
+        counter.inc(2, kind="a")
+        histogram = metrics.Histogram(
+            "test_duration_seconds", "Durations.", buckets=(0.1, 1.0)
+        )
+        histogram.observe(0.5)
+
+        text = metrics.render()
+
+        assert 'test_events_total{kind="a"} 3.0' in text
+        assert 'test_duration_seconds_bucket{le="0.1"} 0' in text
+        assert 'test_duration_seconds_bucket{le="1.0"} 1' in text
+        assert 'test_duration_seconds_bucket{le="+Inf"} 1' in text
+        assert "test_duration_seconds_count 1" in text
+
+    def test_unknown_labels_are_rejected(self):
+        counter = metrics.Counter("test_labels_total", "Labels.", ["kind"])
+        with self.assertRaises(ValueError):
+            counter.inc(other="a")
+
+    def test_metrics_route(self):
+        assert find_handler("/metrics") is metrics.metrics_endpoint
@@ -0,0 +1,51 @@
+import contextlib
+import unittest
+
+import msgspec
+
+from ivao_tracker.model.json import JsonSnapshot
+from ivao_tracker.service.ivao import PilotImport
+from ivao_tracker.service.traffic import TrafficRollup
+
+
+class _Session:
+    def begin_nested(self):
+        return contextlib.nullcontext()
+
+
+class _FailingPilotImport(PilotImport):
+    def __init__(self, failing_ids):
+        super().__init__(_Session(), None, {}, {}, [], {}, TrafficRollup())
+        self.failing_ids = failing_ids
+        self.imported = []
+
+    def pilot(self, json_pilot):
+        # continues the session, as the real import does
+        self.last_active_sessions.pop(json_pilot.id, None)
+        if json_pilot.id in self.failing_ids:
+            raise ValueError("bad pilot")
+        self.imported.append(json_pilot.id)
+
+
+class TestPilotImport(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        with open("tests/mock_data/snapshot.json", "rb") as snapshot_json:
+            template = msgspec.json.decode(
+                snapshot_json.read(), type=JsonSnapshot
+            ).clients.pilots[0]
+        cls.pilots = [
+            msgspec.structs.replace(template, id=i) for i in range(10)
+        ]
+
+    def test_bisect_and_quarantine(self):
+        pilot_import = _FailingPilotImport({3, 8})
+        pilot_import.last_active_sessions.update({3: "s3", 4: "s4", 11: "x"})
+        pilot_import.run(self.pilots, batch_size=4)
+
+        assert [p.id for p, _ in pilot_import.quarantined] == [3, 8]
+        # the pilots of failed batches are imported once the batch passed
+        expected = [0, 1, 2, 4, 5, 6, 7, 9]
+        assert sorted(set(pilot_import.imported)) == expected
+        # quarantined sessions are neither continued nor ended
+        assert pilot_import.last_active_sessions == {11: "x"}
@@ -0,0 +1,56 @@
+import os
+import unittest
+from unittest.mock import patch
+
+from sqlalchemy import create_engine, text
+
+from ivao_tracker.config.loader import config
+from ivao_tracker.service import profiler
+from ivao_tracker.service.profiler import profiled
+
+
+class TestProfiler(unittest.TestCase):
+    def setUp(self):
+        self.clock = 0.0
+        self.engine = create_engine("sqlite://")
+
+    def cycle(self, duration):
+        """
+        Runs a profiled cycle of a statement that takes duration seconds
+        on the patched timer.
+        """
+
+        @profiled
+        def import_cycle():
+            with self.engine.connect() as connection:
+                connection.execute(text("SELECT 1"))
+            self.clock += duration
+            return "imported"
+
+        with (
+            patch.object(profiler, "timer", lambda: self.clock),
+            patch.dict(
+                config.config["profiler"],
+                {"enabled": True, "threshold": 10.0, "cprofile": True},
+            ),
+        ):
+            return import_cycle()
+
+    def test_slow_cycle_dumps_profile(self):
+        assert self.cycle(12.0) == "imported"
+        dumped = sorted(os.listdir(config.config["profiler"]["directory"]))
+        assert [name.split(".", 1)[1] for name in dumped] == [
+            "collapsed",
+            "pstats",
+            "sql.txt",
+        ]
+        assert all(name.startswith("import_cycle-") for name in dumped)
+        sql = os.path.join(config.config["profiler"]["directory"], dumped[2])
+        with open(sql) as sql_file:
+            assert sql_file.readline() == "1 statements in 0.000s\n"
+            sql_file.readline()
+            assert sql_file.readline().rstrip().endswith("SELECT 1")
+
+    def test_fast_cycle_is_not_dumped(self):
+        assert self.cycle(9.0) == "imported"
+        assert not os.path.exists(config.config["profiler"]["directory"])
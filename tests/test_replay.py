@@ -0,0 +1,97 @@
+import gzip
+import os
+import unittest
+from datetime import timedelta
+from unittest.mock import DEFAULT, MagicMock, patch
+
+import msgspec
+
+from ivao_tracker.config.loader import config
+from ivao_tracker.model.json import JsonSnapshot
+from ivao_tracker.service import events, ivao
+from ivao_tracker.service.live import live_state
+from ivao_tracker.service.replay import read_checkpoint, replay
+
+
+class TestReplay(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        with open("tests/mock_data/snapshot.json", "rb") as snapshot_json:
+            cls.snapshot = snapshot_json.read()
+
+    def write_snapshots(self, directory, n):
+        """
+        Writes n snapshots 15s apart, named in reverse order and every
+        second one gzipped. Returns their updatedAt values.
+        """
+        snapshot = msgspec.json.decode(self.snapshot, type=JsonSnapshot)
+        os.makedirs(directory)
+        times = []
+        for i in range(n):
+            updated_at = snapshot.updatedAt + timedelta(seconds=15 * i)
+            raw = msgspec.json.encode(
+                msgspec.structs.replace(snapshot, updatedAt=updated_at)
+            )
+            name = os.path.join(directory, "{:d}.json".format(n - i))
+            if i % 2:
+                with gzip.open(name + ".gz", "wb") as snapshot_file:
+                    snapshot_file.write(raw)
+            else:
+                with open(name, "wb") as snapshot_file:
+                    snapshot_file.write(raw)
+            times.append(updated_at)
+        return times
+
+    def test_replay_in_order_and_resume(self):
+        times = self.write_snapshots("snapshots", 3)
+        imported = []
+        failing = {times[1]}
+
+        def import_snapshot(json_snapshot, *args, **kwargs):
+            if json_snapshot.updatedAt in failing:
+                return False
+            imported.append(json_snapshot.updatedAt)
+            return True
+
+        with patch(
+            "ivao_tracker.service.replay.import_snapshot", import_snapshot
+        ):
+            assert not replay("snapshots", 1, "replay.checkpoint")
+            assert imported == times[:1]
+            assert read_checkpoint("replay.checkpoint") == times[0]
+
+            # resumes after the checkpoint
+            failing.clear()
+            assert replay("snapshots", 1, "replay.checkpoint")
+            assert imported == times
+            assert read_checkpoint("replay.checkpoint") == times[2]
+
+    def test_replay_does_not_publish(self):
+        with open("snapshot.json", "wb") as snapshot_json:
+            snapshot_json.write(self.snapshot)
+        traffic = live_state.traffic
+        publisher = MagicMock()
+
+        with (
+            patch.multiple(
+                ivao,
+                Session=DEFAULT,
+                get_engine=DEFAULT,
+                ensure_db_partitions=DEFAULT,
+                json_to_sql_snapshot=DEFAULT,
+                TrafficRollup=DEFAULT,
+                reconcile_pilots=MagicMock(return_value=[]),
+                get_sharded_importer=MagicMock(return_value=None),
+                save_importer_state=DEFAULT,
+                write_keyframe=DEFAULT,
+                invalidate_tiles=DEFAULT,
+            ) as stubs,
+            patch.object(events, "event_publisher", publisher),
+            patch.dict(config.config["events"], {"enabled": True}),
+        ):
+            assert replay(".", workers=1)
+
+        stubs["Session"].return_value.commit.assert_called_once()
+        stubs["save_importer_state"].assert_not_called()
+        publisher.publish.assert_not_called()
+        assert live_state.traffic is traffic
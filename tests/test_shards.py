@@ -0,0 +1,118 @@
+import unittest
+from collections import namedtuple
+from unittest.mock import MagicMock, patch
+
+import msgspec
+
+from ivao_tracker.model.json import JsonSnapshot
+from ivao_tracker.service import ivao
+from ivao_tracker.service.shards import (
+    XID_PATTERN,
+    ShardedImporter,
+    ShardError,
+    prepared_xid,
+)
+from ivao_tracker.service.traffic import TrafficRollup
+
+Pilot = namedtuple("Pilot", ["id"])
+
+
+class StubImporter(ShardedImporter):
+    """
+    Returns the given results instead of running the shards.
+    """
+
+    def __init__(self, results):
+        self.nr_of_shards = len(results)
+        self.results = results
+        self.jobs = []
+
+    def map(self, worker, jobs):
+        self.jobs = jobs
+        return self.results
+
+
+class TestShardedImporter(unittest.TestCase):
+    def test_split_and_map(self):
+        importer = ShardedImporter(2)
+        try:
+            shards = importer.split([Pilot(i) for i in range(5)])
+            assert [[p.id for p in shard] for shard in shards] == [
+                [0, 2, 4],
+                [1, 3],
+            ]
+            results = importer.map(len, [[1, 2], None])
+            assert results[0] == 2
+            assert isinstance(results[1], TypeError)
+        finally:
+            importer.shutdown()
+
+    def test_xid(self):
+        xid = prepared_xid(42, "traffic")
+        assert XID_PATTERN.match(xid).group(1) == "42"
+        assert XID_PATTERN.match(prepared_xid(42, 3))
+        assert not XID_PATTERN.match("ivao_tracker-1-x'; DROP")
+
+
+class TestImportShardedSnapshot(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        with open("tests/mock_data/snapshot.json", "rb") as snapshot_json:
+            cls.snapshot = msgspec.json.decode(
+                snapshot_json.read(), type=JsonSnapshot
+            )
+
+    def import_snapshot(self, importer, error, **stubs):
+        """
+        Imports the snapshot with stubbed database calls, which raises
+        error. Returns the stubs.
+        """
+        session = MagicMock()
+        session.exec.return_value.all.return_value = []
+        stubs = {
+            "prepare_shared_rows": MagicMock(),
+            "json_to_sql_snapshot": MagicMock(return_value=MagicMock(id=42)),
+            "Session": MagicMock(),
+            "get_engine": MagicMock(),
+            "prepare_transaction": MagicMock(),
+            "rollback_prepared": MagicMock(),
+            "delete_snapshot": MagicMock(),
+            "commit_prepared": MagicMock(return_value=[]),
+            **stubs,
+        }
+        with patch.multiple(ivao, **stubs):
+            with self.assertRaises(error):
+                ivao.import_sharded_snapshot(
+                    importer, session, self.snapshot, {}
+                )
+        return stubs
+
+    def test_failed_shard(self):
+        result = ivao.ShardResult(TrafficRollup().export(), {})
+        importer = StubImporter([result, RuntimeError("shard failed")])
+        stubs = self.import_snapshot(importer, ShardError)
+        # only the prepared shard is rolled back
+        stubs["rollback_prepared"].assert_called_once_with(
+            [prepared_xid(42, 0)]
+        )
+        stubs["delete_snapshot"].assert_called_once_with(42)
+        stubs["commit_prepared"].assert_not_called()
+        assert [job.xid for job in importer.jobs] == [
+            prepared_xid(42, 0),
+            prepared_xid(42, 1),
+        ]
+
+    def test_failed_traffic(self):
+        result = ivao.ShardResult(TrafficRollup().export(), {})
+        importer = StubImporter([result, result])
+        stubs = self.import_snapshot(
+            importer,
+            RuntimeError,
+            prepare_transaction=MagicMock(side_effect=RuntimeError("down")),
+        )
+        # the shards are rolled back if the traffic cannot be prepared
+        stubs["rollback_prepared"].assert_called_once_with(
+            [prepared_xid(42, 0), prepared_xid(42, 1)]
+        )
+        stubs["delete_snapshot"].assert_called_once_with(42)
+        stubs["commit_prepared"].assert_not_called()
@@ -0,0 +1,45 @@
+import unittest
+
+import numpy
+
+from ivao_tracker.util.geo import haversine_nm_array
+from ivao_tracker.util.spatial import GridIndex
+
+
+class TestGridIndex(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        rng = numpy.random.default_rng(42)
+        cls.lats = rng.uniform(-89, 89, 5000)
+        cls.lons = rng.uniform(-180, 180, 5000)
+        cls.ids = numpy.arange(5000)
+        cls.index = GridIndex(cls.ids, cls.lats, cls.lons, cell_size=2.0)
+
+    def test_bbox(self):
+        expected = self.ids[
+            (self.lats >= 40)
+            & (self.lats <= 55)
+            & (self.lons >= -10)
+            & (self.lons <= 20)
+        ]
+        result = self.index.bbox(-10, 40, 20, 55)
+        assert sorted(result) == sorted(expected)
+
+    def test_bbox_across_antimeridian(self):
+        expected = self.ids[
+            (self.lats >= -20)
+            & (self.lats <= 10)
+            & ((self.lons >= 170) | (self.lons <= -170))
+        ]
+        result = self.index.bbox(170, -20, -170, 10)
+        assert sorted(result) == sorted(expected)
+
+    def test_radius_and_nearest(self):
+        distances = haversine_nm_array(50.0, 179.0, self.lats, self.lons)
+
+        ids, result_distances = self.index.radius(50.0, 179.0, 600)
+        assert sorted(ids) == sorted(self.ids[distances <= 600])
+        assert list(result_distances) == sorted(result_distances)
+
+        ids, _ = self.index.nearest(50.0, 179.0, k=5)
+        assert list(ids) == list(self.ids[numpy.argsort(distances)[:5]])
@@ -0,0 +1,140 @@
+import datetime
+import unittest
+from unittest.mock import DEFAULT, MagicMock, patch
+
+import msgspec
+
+from ivao_tracker.config.loader import config
+from ivao_tracker.model.json import JsonSnapshot
+from ivao_tracker.service import ivao
+from ivao_tracker.service.spool import SnapshotSpool, drain_spool
+
+
+class TestSnapshotSpool(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        with open("tests/mock_data/snapshot.json", "rb") as snapshot_json:
+            cls.snapshot = msgspec.json.decode(
+                snapshot_json.read(), type=JsonSnapshot
+            )
+
+    def snapshots(self, n):
+        return [
+            msgspec.structs.replace(
+                self.snapshot,
+                updatedAt=self.snapshot.updatedAt
+                + datetime.timedelta(seconds=15 * i),
+            )
+            for i in range(n)
+        ]
+
+    def test_append_and_drain_in_order(self):
+        spool = SnapshotSpool("spool")
+        snapshots = self.snapshots(4)
+        for snapshot in reversed(snapshots):
+            assert spool.append(snapshot)
+        assert not spool.append(snapshots[0])
+        assert spool.read(spool.pending()[0]) == snapshots[0]
+
+        imported = []
+
+        def import_snapshot(json_snapshot, publish=True):
+            # the database goes down after two snapshots
+            if len(imported) == 2:
+                return False
+            imported.append(json_snapshot.updatedAt)
+            return True
+
+        assert drain_spool(spool, import_snapshot, lambda: False, 10) == 2
+        assert imported == [s.updatedAt for s in snapshots[:2]]
+        assert len(spool) == 2
+
+    def test_reject_when_healthy(self):
+        spool = SnapshotSpool("spool")
+        for snapshot in self.snapshots(2):
+            spool.append(snapshot)
+
+        def import_snapshot(json_snapshot, publish=True):
+            return json_snapshot.updatedAt != self.snapshot.updatedAt
+
+        assert drain_spool(spool, import_snapshot, lambda: True, 10) == 1
+        assert len(spool) == 0
+        assert len(spool.rejected()) == 1
+
+    def test_drain_in_batches(self):
+        spool = SnapshotSpool("spool")
+        snapshots = self.snapshots(5)
+        for snapshot in snapshots:
+            spool.append(snapshot)
+        broken = snapshots[3].updatedAt
+        batches = []
+        imported = []
+
+        def import_batch(json_snapshots):
+            if any(s.updatedAt == broken for s in json_snapshots):
+                return False
+            batches.append([s.updatedAt for s in json_snapshots])
+            return True
+
+        def import_snapshot(json_snapshot, publish=True):
+            if json_snapshot.updatedAt == broken:
+                return False
+            imported.append(json_snapshot.updatedAt)
+            return True
+
+        with patch.dict(config.config["spool"], {"batch_size": 2}):
+            assert (
+                drain_spool(
+                    spool, import_snapshot, lambda: True, 10, import_batch
+                )
+                == 4
+            )
+        assert batches == [[s.updatedAt for s in snapshots[:2]]]
+        # the failed batch is retried one by one, the last one is alone
+        assert imported == [snapshots[2].updatedAt, snapshots[4].updatedAt]
+        assert len(spool) == 0
+        assert len(spool.rejected()) == 1
+
+    def test_spooled_snapshot_is_not_spooled_again(self):
+        spool = SnapshotSpool("spool")
+        first, second = self.snapshots(2)
+        fetched = [first, first, second, second]
+        database_up = []
+        imported = []
+
+        def import_snapshot(json_snapshot, publish=True):
+            # the database is back for the first snapshot only
+            if not database_up or json_snapshot.updatedAt != first.updatedAt:
+                return False
+            ivao.last_snapshot = json_snapshot.updatedAt
+            imported.append(json_snapshot.updatedAt)
+            return True
+
+        with (
+            patch.multiple(
+                ivao,
+                read_ivao_snapshot=MagicMock(
+                    side_effect=lambda: fetched.pop(0)
+                ),
+                get_spool=MagicMock(return_value=spool),
+                import_snapshot=import_snapshot,
+                import_snapshots=MagicMock(return_value=False),
+                database_is_healthy=MagicMock(return_value=False),
+                publish_snapshot=DEFAULT,
+                last_snapshot=first.updatedAt - datetime.timedelta(1),
+                last_import_duration=0.0,
+            ) as stubs,
+            patch.dict(config.config["spool"], {"batch_size": 1}),
+        ):
+            ivao.import_ivao_snapshot()
+            ivao.import_ivao_snapshot()
+            assert len(spool) == 1
+            stubs["publish_snapshot"].assert_called_once_with(first)
+
+            # the drain imports the first snapshot only
+            database_up.append(True)
+            ivao.import_ivao_snapshot()
+            ivao.import_ivao_snapshot()
+            assert imported == [first.updatedAt]
+            assert len(spool) == 1
+            assert stubs["publish_snapshot"].call_count == 2
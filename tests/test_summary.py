@@ -0,0 +1,110 @@
+import datetime
+import unittest
+from unittest.mock import MagicMock
+
+import msgspec
+
+from ivao_tracker.model.constants import State
+from ivao_tracker.model.json import JsonSnapshot
+from ivao_tracker.service.summary import (
+    create_flight_summary,
+    finalize_flight_summary,
+    naive_utc,
+    track_flight_summary,
+    update_flight_summary,
+)
+
+
+class TestFlightSummary(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        with open("tests/mock_data/snapshot.json", "rb") as snapshot_json:
+            cls.pilot = msgspec.json.decode(
+                snapshot_json.read(), type=JsonSnapshot
+            ).clients.pilots[0]
+
+    def moved(self, seconds, latitude_delta, altitude, state):
+        """
+        Returns the pilot with a track seconds after the mock track.
+        """
+        lt = self.pilot.lastTrack
+        return msgspec.structs.replace(
+            self.pilot,
+            lastTrack=msgspec.structs.replace(
+                lt,
+                timestamp=lt.timestamp + datetime.timedelta(seconds=seconds),
+                latitude=lt.latitude + latitude_delta,
+                altitude=altitude,
+                state=state,
+            ),
+        )
+
+    def stored_summary(self):
+        """
+        Returns the summary of the mock pilot as read from the database,
+        with naive UTC timestamps.
+        """
+        summary = create_flight_summary(self.pilot)
+        summary.firstTimestamp = naive_utc(summary.firstTimestamp)
+        summary.lastTimestamp = naive_utc(summary.lastTimestamp)
+        summary.lastState = State.EN_ROUTE
+        return summary
+
+    def test_create(self):
+        summary = create_flight_summary(self.pilot)
+        lt = self.pilot.lastTrack
+        assert summary.pilotSessionId == self.pilot.id
+        assert summary.trackCount == 1
+        assert summary.minAltitude == summary.maxAltitude == lt.altitude
+        assert summary.lastState == State(lt.state)
+        assert summary.originId == self.pilot.flightPlan.departureId
+
+    def test_accumulate_into_stored_summary(self):
+        summary = self.stored_summary()
+        altitude = self.pilot.lastTrack.altitude
+        update_flight_summary(
+            summary, self.moved(60, 1.0, altitude + 1000, "Approach")
+        )
+        assert summary.trackCount == 2
+        # the time since the last track is counted for its state
+        assert summary.enRouteTime == 60
+        assert summary.approachTime == 0
+        assert summary.lastState == State.APPROACH
+        # one degree of latitude is 60nm
+        assert abs(summary.distance - 60.0) < 0.1
+        assert summary.maxAltitude == altitude + 1000
+        assert summary.minAltitude == altitude
+
+        update_flight_summary(
+            summary, self.moved(90, 1.0, altitude + 1000, "Approach")
+        )
+        assert summary.trackCount == 3
+        assert summary.approachTime == 30
+
+    def test_same_timestamp_is_ignored(self):
+        summary = self.stored_summary()
+        update_flight_summary(summary, self.pilot)
+        update_flight_summary(summary, self.moved(-15, 1.0, 0, "Boarding"))
+        assert summary.trackCount == 1
+        assert summary.distance == 0.0
+        assert summary.enRouteTime == 0
+
+    def test_track_and_finalize(self):
+        session = MagicMock()
+        session.get.return_value = None
+        summaries = {}
+        track_flight_summary(session, summaries, self.pilot)
+        summary = summaries[self.pilot.id]
+        session.add.assert_called_once_with(summary)
+
+        finalize_flight_summary(summaries, self.pilot.id)
+        assert summary.isFinal
+        # a continued session is not final anymore
+        track_flight_summary(
+            session, summaries, self.moved(15, 0.0, 0, "En Route")
+        )
+        assert summaries[self.pilot.id] is summary
+        assert not summary.isFinal
+        assert summary.trackCount == 2
+        session.add.assert_called_once()
+        finalize_flight_summary(summaries, 42)
@@ -0,0 +1,150 @@
+import tempfile
+import unittest
+
+import msgspec
+
+from ivao_tracker.model.json import JsonSnapshot
+from ivao_tracker.service.http import Request
+from ivao_tracker.service.live import live_state
+from ivao_tracker.service.tiles import TileCache, TileKey, tiles_endpoint
+from ivao_tracker.util.mvt import encode_points, project, tile_bounds
+
+
+def read_varint(data, pos):
+    value = shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        shift += 7
+        if byte < 0x80:
+            return value, pos
+
+
+def read_message(data):
+    """
+    Returns the fields of a protobuf message as (field, value) pairs.
+    """
+    fields = []
+    pos = 0
+    while pos < len(data):
+        key, pos = read_varint(data, pos)
+        if key & 7 == 2:
+            length, pos = read_varint(data, pos)
+            end = pos + length
+            fields.append((key >> 3, data[pos:end]))
+            pos = end
+        elif key & 7 == 1:
+            end = pos + 8
+            fields.append((key >> 3, data[pos:end]))
+            pos = end
+        else:
+            value, pos = read_varint(data, pos)
+            fields.append((key >> 3, value))
+    return fields
+
+
+def read_packed(data):
+    values, pos = [], 0
+    while pos < len(data):
+        value, pos = read_varint(data, pos)
+        values.append(value)
+    return values
+
+
+def decode_points(tile):
+    """
+    Returns the layer name and the features (id, x, y, properties).
+    """
+    [(layer_field, layer)] = read_message(tile)
+    assert layer_field == 3
+    fields = read_message(layer)
+    keys = [v.decode() for f, v in fields if f == 3]
+    values = []
+    for _, value in (f for f in fields if f[0] == 4):
+        [(kind, raw)] = read_message(value)
+        values.append(raw.decode() if kind == 1 else raw)
+    features = []
+    for _, feature in (f for f in fields if f[0] == 2):
+        feature_fields = dict(read_message(feature))
+        tags = read_packed(feature_fields[2])
+        command, px, py = read_packed(feature_fields[4])
+        assert command == 9 and feature_fields[3] == 1
+        features.append(
+            (
+                feature_fields[1],
+                (px >> 1) ^ -(px & 1),
+                (py >> 1) ^ -(py & 1),
+                {keys[k]: values[v] for k, v in zip(tags[::2], tags[1::2])},
+            )
+        )
+    name = dict((f, v) for f, v in fields if f == 1)[1].decode()
+    return name, features
+
+
+class TestTiles(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        with open("tests/mock_data/snapshot.json", "rb") as snapshot_json:
+            cls.snapshot = msgspec.json.decode(
+                snapshot_json.read(), type=JsonSnapshot
+            )
+
+    def test_encode_points(self):
+        tile = encode_points(
+            "pilots",
+            [
+                (1, 10, 4095, {"callsign": "DLH1", "altitude": 3000}),
+                (2, 0, 7, {"callsign": "AFR2", "onGround": True}),
+            ],
+        )
+        name, features = decode_points(tile)
+        assert name == "pilots"
+        assert features == [
+            (1, 10, 4095, {"callsign": "DLH1", "altitude": 3000}),
+            # True is not merged with the integer value 1
+            (2, 0, 7, {"callsign": "AFR2", "onGround": 1}),
+        ]
+
+    def test_project_into_tile(self):
+        min_lon, min_lat, max_lon, max_lat = tile_bounds(3, 4, 2)
+        assert (min_lon, max_lon) == (0.0, 45.0)
+        px, py = project(
+            [max_lat - 1e-9, min_lat + 1e-9], [min_lon, max_lon], 3, 4, 2
+        )
+        assert list(px) == [0, 4096]
+        assert list(py) == [0, 4095]
+
+    def test_cache_invalidates_affected_buckets(self):
+        with tempfile.TemporaryDirectory() as path:
+            cache = TileCache(max_entries=2, path=path)
+            old = TileKey("density", 3, 4, 2, 10, 11)
+            new = TileKey("density", 3, 4, 2, 12, 12)
+            live = TileKey("live", 3, 4, 2, 500, 500)
+            cache.put(old, b"old")
+            cache.put(new, b"new")
+            cache.put(live, b"live")
+            # evicted from memory, but still on disk
+            assert len(cache) == 2
+            assert cache.get(old) == b"old"
+
+            assert cache.invalidate({12}) == 1
+            assert cache.get(new) is None
+            assert cache.get(live) is None
+            assert cache.get(old) == b"old"
+
+    def test_live_tile_is_served_from_cache(self):
+        snapshot = self.snapshot
+        live_state.update(snapshot)
+        request = Request("/tiles/live/0/0/0.mvt", {}, {})
+
+        response = tiles_endpoint(request)
+        assert response.status == 200
+        _, features = decode_points(response.body)
+        assert sorted(f[0] for f in features) == sorted(
+            p.id for p in snapshot.clients.pilots
+        )
+        assert tiles_endpoint(request).body is response.body
+
+        with self.assertRaises(ValueError):
+            tiles_endpoint(Request("/tiles/live/1/2/0.mvt", {}, {}))
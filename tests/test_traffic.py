@@ -0,0 +1,136 @@
+import unittest
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+from sqlalchemy.dialects import postgresql
+
+from ivao_tracker.model.constants import Continent
+from ivao_tracker.service import traffic
+from ivao_tracker.service.traffic import (
+    BACKFILL_DELETE_QUERY,
+    BACKFILL_QUERY,
+    TrafficRollup,
+    backfill_airport_traffic,
+    hour_range,
+)
+
+HOUR = datetime(2024, 2, 11, 1, 0)
+EDDF = SimpleNamespace(
+    code="EDDF", continent=Continent.EUROPE, iso_country="DE"
+)
+KJFK = SimpleNamespace(
+    code="KJFK", continent=Continent.NORTH_AMERICA, iso_country="US"
+)
+
+
+def pilot_session(*flightplans):
+    return SimpleNamespace(
+        flightplans=[
+            SimpleNamespace(
+                createdAt=HOUR,
+                revision=revision,
+                departure=departure,
+                arrival=arrival,
+            )
+            for revision, (departure, arrival) in enumerate(flightplans)
+        ]
+    )
+
+
+class TestTrafficRollup(unittest.TestCase):
+    def test_count_latest_flightplan(self):
+        rollup = TrafficRollup()
+        # the revised flight plan diverts to EDDF
+        diverted = pilot_session((EDDF, KJFK), (EDDF, EDDF))
+        rollup.departure(diverted, HOUR + timedelta(minutes=5))
+        rollup.arrival(diverted, HOUR + timedelta(minutes=55))
+        rollup.arrival(
+            pilot_session((KJFK, EDDF)), HOUR + timedelta(minutes=70)
+        )
+        # no flight plan or no timestamp
+        rollup.departure(pilot_session(), HOUR)
+        rollup.departure(pilot_session((KJFK, EDDF)), None)
+
+        assert dict(rollup.counts) == {
+            ("EDDF", HOUR): [1, 1],
+            ("EDDF", HOUR + timedelta(hours=1)): [0, 1],
+        }
+        assert rollup.airports == {"EDDF": EDDF}
+
+    def test_checkpoint_restore(self):
+        rollup = TrafficRollup()
+        rollup.departure(pilot_session((EDDF, KJFK)), HOUR)
+        checkpoint = rollup.checkpoint()
+        rollup.arrival(pilot_session((EDDF, KJFK)), HOUR)
+
+        rollup.restore(checkpoint)
+        assert dict(rollup.counts) == {("EDDF", HOUR): [1, 0]}
+        assert rollup.airports == {"EDDF": EDDF}
+        # the restored counts are not shared with the checkpoint
+        rollup.departure(pilot_session((EDDF, KJFK)), HOUR)
+        rollup.departure(pilot_session((KJFK, EDDF)), HOUR)
+        assert checkpoint[0] == {("EDDF", HOUR): [1, 0]}
+        assert rollup.counts[("KJFK", HOUR)] == [1, 0]
+
+    def test_merge_exported(self):
+        worker = TrafficRollup()
+        worker.departure(pilot_session((EDDF, KJFK)), HOUR)
+        worker.arrival(pilot_session((EDDF, KJFK)), HOUR)
+        rollup = TrafficRollup()
+        rollup.departure(pilot_session((EDDF, KJFK)), HOUR)
+
+        rollup.merge(worker.export())
+        assert dict(rollup.counts) == {
+            ("EDDF", HOUR): [2, 0],
+            ("KJFK", HOUR): [0, 1],
+        }
+        assert rollup.airports["KJFK"] == (Continent.NORTH_AMERICA, "US")
+
+    def test_flush_adds_counts(self):
+        rollup = TrafficRollup()
+        session = MagicMock()
+        rollup.flush(session)
+        session.exec.assert_not_called()
+
+        rollup.departure(pilot_session((EDDF, KJFK)), HOUR)
+        rollup.flush(session)
+        stmt = session.exec.call_args.args[0]
+        compiled = stmt.compile(dialect=postgresql.dialect())
+        assert "ON CONFLICT" in str(compiled)
+        assert "airporttraffichourly.departures +" in str(compiled)
+        assert compiled.params["airportCode_m0"] == "EDDF"
+        assert compiled.params["departures_m0"] == 1
+        assert compiled.params["isoCountry_m0"] == "DE"
+        assert not rollup.counts
+
+
+class TestBackfill(unittest.TestCase):
+    def test_hour_range(self):
+        assert hour_range(HOUR, HOUR + timedelta(hours=2)) == (
+            HOUR,
+            HOUR + timedelta(hours=2),
+        )
+        assert hour_range(
+            HOUR + timedelta(minutes=20), HOUR + timedelta(minutes=80)
+        ) == (HOUR, HOUR + timedelta(hours=2))
+
+    def test_backfill_replaces_whole_hours(self):
+        with (
+            patch.object(traffic, "Session") as session_class,
+            patch.object(traffic, "get_engine"),
+        ):
+            session = session_class.return_value.__enter__.return_value
+            session.exec.return_value.rowcount = 3
+            backfill_airport_traffic(
+                HOUR + timedelta(minutes=20), HOUR + timedelta(minutes=80)
+            )
+
+        (delete, delete_kwargs), (insert, insert_kwargs) = [
+            (c.args[0].text, c.kwargs) for c in session.exec.call_args_list
+        ]
+        assert delete == BACKFILL_DELETE_QUERY
+        assert insert == BACKFILL_QUERY
+        params = {"start": HOUR, "end": HOUR + timedelta(hours=2)}
+        assert delete_kwargs["params"] == insert_kwargs["params"] == params
+        session.commit.assert_called_once()
@@ -0,0 +1,55 @@
+import datetime
+import unittest
+
+import msgspec
+
+from ivao_tracker.model.json import JsonSnapshot
+from ivao_tracker.service.events import SnapshotDiff
+from ivao_tracker.service.warmstart import (
+    ImporterState,
+    read_importer_state,
+    write_importer_state,
+)
+
+
+class TestImporterState(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        with open("tests/mock_data/snapshot.json", "rb") as snapshot_json:
+            cls.snapshot = msgspec.json.decode(
+                snapshot_json.read(), type=JsonSnapshot
+            )
+
+    def test_restored_baseline_yields_same_events(self):
+        first, second = self.snapshot.clients.pilots
+        changed = msgspec.structs.replace(
+            first,
+            lastTrack=msgspec.structs.replace(
+                first.lastTrack, state="Approach"
+            ),
+        )
+        next_snapshot = msgspec.structs.replace(
+            self.snapshot,
+            updatedAt=self.snapshot.updatedAt + datetime.timedelta(seconds=15),
+            clients=msgspec.structs.replace(
+                self.snapshot.clients, pilots=[changed]
+            ),
+        )
+        diff = SnapshotDiff()
+        diff.diff(self.snapshot)
+        state = ImporterState(
+            42, self.snapshot.updatedAt, {"SBGR": "SBGR"}, diff.export()
+        )
+        write_importer_state("importer.state", state)
+        restored = read_importer_state("importer.state")
+        assert restored == state
+
+        restored_diff = SnapshotDiff()
+        restored_diff.restore(restored.pilots)
+        assert restored_diff.diff(next_snapshot) == diff.diff(next_snapshot)
+
+    def test_unreadable_state(self):
+        assert read_importer_state("missing.state") is None
+        with open("broken.state", "wb") as state_file:
+            state_file.write(b"\x93\x01")
+        assert read_importer_state("broken.state") is None